@@ -1,40 +1,157 @@
-from flask import Flask, render_template, url_for, request, redirect, flash, after_this_request
-import flask_excel as excel
+from flask import Flask, render_template, url_for, request, redirect, flash, after_this_request, jsonify, Response, stream_with_context, g, send_file, abort, session
+from werkzeug.security import safe_join
+from jinja2 import FileSystemBytecodeCache
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy import desc
+from sqlalchemy import update, insert, delete, select, func, case
+from sqlalchemy.dialects.sqlite import insert as upsert
+from sqlalchemy.orm import joinedload
+from sqlalchemy.exc import IntegrityError
 from flask_login import UserMixin, LoginManager, login_user, login_required, logout_user, current_user
-from werkzeug.security import generate_password_hash, check_password_hash
-from datetime import datetime
-from time import sleep
+from datetime import datetime, date, timedelta
+import os
 import random
+import click
 import string
+import atexit
+from functools import partial
+import zlib
+import mimetypes
+from hashlib import sha256
+from time import monotonic, perf_counter
+from urllib.request import urlopen
+from threading import Thread, Lock
 import drivers
 import serial
 import adafruit_fingerprint
-import RPi.GPIO as GPIO
+from scanner import Scanner
+from readers import Reader, ReaderRegistry
+from roster import RosterIndex, RosterEntry, RosterCache
+from outbox import OutboxWorker
+import migrations
+import storage
+from tables import Column, datatable
+import export
+from archive import Archive
+from slots import SlotAllocator, span
+from metrics import Metrics
+from auth import Identity, IdentityCache, PasswordPolicy
+from pagecache import PageCache, page_etag
+from assets import Assets, gzip_bytes, build as build_bundles
+from events import EventBus
 app = Flask(__name__)
-excel.init_excel(app)
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///attendance.db'
+# ATTENDANCE_DATABASE points the app (and its tests) at another database
+app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('ATTENDANCE_DATABASE', 'sqlite:///attendance.db')
 app.config['SECRET_KEY'] = 'g1mo9je(e9jo0uv+(8(^1fl31dd%$5rldf04zm$^20am)z=c(h'
 db = SQLAlchemy(app)
 
-##### DATETIME NOW #####
-now = datetime.now()
+# Compiled templates are kept in instance/jinja, so a restarted worker does not
+# compile every page again on its first requests
+os.makedirs(os.path.join(app.instance_path, 'jinja'), exist_ok=True)
+app.jinja_options = dict(app.jinja_options, bytecode_cache=FileSystemBytecodeCache(os.path.join(app.instance_path, 'jinja')))
+
+##### METRICS #####
+# Latency of each stage of the scan and enroll paths, of the sensor commands,
+# SQL statements, LCD and GSM, and of every route, served in Prometheus text
+# format at /metrics to the addresses in METRICS_ALLOW and logged-in users
+app.config.setdefault('METRICS_ALLOW', ['127.0.0.1', '::1'])
+# where `flask metrics` finds the running app
+app.config.setdefault('METRICS_URL', 'http://127.0.0.1:5000')
+metrics = Metrics()
+metrics.describe('attendance_stage_seconds', 'Time per stage of the scan and enroll paths.')
+metrics.describe('attendance_sensor_command_seconds', 'Time per fingerprint sensor command.')
+metrics.describe('attendance_db_seconds', 'Time per SQL statement.')
+metrics.describe('attendance_lcd_seconds', 'Time per LCD screen drawn and held.')
+metrics.describe('attendance_http_request_seconds', 'Time per HTTP request.')
+metrics.describe('attendance_http_requests_total', 'HTTP requests by status code.')
+metrics.describe('attendance_scans_total', 'Fingerprint scans by result.')
+metrics.describe('attendance_enrollments_total', 'Fingerprint enrollments by result.')
+
+##### HARDWARE #####
+# Serial ports, GPIO and the LCD are opened on first use, not at import, so CLI
+# commands and worker starts do not probe hardware (or fail without it).
+# HARDWARE_BACKEND 'simulator' (or ATTENDANCE_HARDWARE=simulator) runs the same
+# drivers against the fakes in drivers/ instead of the devices.
+app.config.setdefault('HARDWARE_BACKEND', os.environ.get('ATTENDANCE_HARDWARE', 'device'))
+hardware = drivers.Hardware()
+simulator = drivers.Simulator() if app.config['HARDWARE_BACKEND'] == 'simulator' else None
+
+##### STORAGE #####
+with app.app_context():
+    storage.configure(db.engine)
+    storage.instrument(db.engine, metrics.recorder('attendance_db_seconds', 'statement'))
+commits = storage.GroupCommit(app, db, observe=lambda seconds: metrics.observe('attendance_stage_seconds', seconds, stage='db_commit'))
+atexit.register(commits.flush)
 
 ##### FINGERPRINT ######
-uart = serial.Serial("/dev/ttyAMA0", baudrate=57600, timeout=1)
-finger = adafruit_fingerprint.Adafruit_Fingerprint(uart)
+app.config.setdefault('FINGERPRINT_BAUDRATE', 115200)
+app.config.setdefault('FINGERPRINT_PACKET_SIZE', 256)
+# None tries the sensor's high-speed search once and falls back when it is not supported
+app.config.setdefault('FINGERPRINT_FAST_SEARCH', None)
+# One entry per door: name, serial port and button pin (None to poll the sensor
+# without a button). The first reader is the one students are enrolled on.
+app.config.setdefault('FINGERPRINT_READERS', [
+    {'name': 'door', 'port': '/dev/ttyAMA0', 'button': 12},  # Change this to the GPIO pin you're using
+])
+
+def open_reader(name, port, button=None):
+    device = simulator.sensor(port).port if simulator is not None else port
+    uart = serial.Serial(device, baudrate=57600, timeout=1)
+    finger = drivers.connect(uart, (app.config['FINGERPRINT_BAUDRATE'], 57600))
+    link = drivers.negotiate(finger, uart, app.config['FINGERPRINT_BAUDRATE'], app.config['FINGERPRINT_PACKET_SIZE'])
+    capture = drivers.CaptureEngine(finger, observe=metrics.recorder('attendance_sensor_command_seconds', 'command', reader=name), fast_search=app.config['FINGERPRINT_FAST_SEARCH'])
+    return Reader(name, port, capture, button=button, link=link)
+
+# The primary reader has to be there, the others are skipped when they do not
+# answer. Every reader gets its button set up and its scanner worker.
+def open_readers():
+    registry = ReaderRegistry()
+    for number, config in enumerate(app.config['FINGERPRINT_READERS']):
+        try:
+            registry.add(open_reader(**config))
+        except Exception as e:
+            if number == 0:
+                raise
+            print("Error:", str(e))
+    for reader in registry:
+        if reader.button is not None:
+            GPIO.setup(reader.button, GPIO.IN, pull_up_down=GPIO.PUD_DOWN)
+        attach_scanner(reader)
+    return registry
+
+readers = hardware.add('readers', open_readers)
+capture = hardware.add('capture', lambda: readers.primary.capture)
+finger = hardware.add('finger', lambda: capture.finger)
 
 ##### LCD #####
-display = drivers.Lcd()
+# the detected I2C address is kept in instance/lcd-address
+if simulator is not None:
+    lcd_factory = lambda: drivers.BufferedLcd(addr=0x27, bus=simulator.smbus)
+else:
+    lcd_factory = partial(drivers.BufferedLcd, address_cache=os.path.join(app.instance_path, 'lcd-address'))
+display = drivers.DisplayService(lcd_factory=lcd_factory, observe=metrics.recorder('attendance_lcd_seconds', 'phase'))
+
+##### ROSTERS #####
+rosters = RosterCache()
+# attendance rows marked present whose write is still queued, so a roster
+# rebuilt before the commit does not take the student for absent
+pending_present = set()
 
 ##### GSM #####
-sms = None
+modem = hardware.add('modem', lambda: drivers.GsmModem(simulator.modem.port if simulator is not None else '/dev/ttyUSB0', baudrate=9600))
+
+def send_sms(number, body):
+    with metrics.timer('attendance_stage_seconds', stage='gsm_send'):
+        modem.send_sms(number, body)
 
 ##### BUTTON ######
-GPIO.setmode(GPIO.BOARD)
-BUTTON_PIN = 12  # Change this to the GPIO pin you're using
-GPIO.setup(BUTTON_PIN, GPIO.IN, pull_up_down=GPIO.PUD_DOWN)
+def open_gpio():
+    if simulator is not None:
+        return simulator.gpio
+    import RPi.GPIO as GPIO
+    GPIO.setmode(GPIO.BOARD)
+    return GPIO
+
+GPIO = hardware.add('gpio', open_gpio)
 
 class Teacher(db.Model, UserMixin):
     __tablename__ = 'teacher'
@@ -47,7 +164,11 @@ class Teacher(db.Model, UserMixin):
     teacher_id = db.Column(db.String(255), unique=True, nullable=False)
     username = db.Column(db.String(255), unique=True, nullable=False)
     password = db.Column(db.String(255), nullable=False)
-    date_added = db.Column(db.DateTime, default=now)
+    date_added = db.Column(db.DateTime, default=datetime.now)
+
+    @property
+    def fullname(self):
+        return self.firstname + ' ' + self.lastname
 
     def __repr__(self):
         return '<Teacher %r>' % self.id
@@ -60,14 +181,21 @@ class Course(db.Model, UserMixin):
     course_code = db.Column(db.String(255), nullable=False)
     course_description = db.Column(db.Text)
     course_units = db.Column(db.Integer)
-    course_teacher = db.Column(db.String(255))
-    date_added = db.Column(db.DateTime, default=now)
+    teacher_id = db.Column(db.Integer, db.ForeignKey('teacher.id'), index=True)
+    date_added = db.Column(db.DateTime, default=datetime.now)
+
+    teacher = db.relationship('Teacher')
+
+    @property
+    def course_teacher(self):
+        return self.teacher.fullname if self.teacher else None
 
     def __repr__(self):
         return '<Courses %r>' % self.id
     
 class Student(db.Model, UserMixin):
     __tablename__ = 'student'
+    __table_args__ = (db.Index('ix_student_course_finger', 'course_id', 'fingerprint_id'),)
     id = db.Column(db.Integer, primary_key=True)
 
     fingerprint_id = db.Column(db.Integer, nullable=False)
@@ -76,38 +204,244 @@ class Student(db.Model, UserMixin):
     middlename = db.Column(db.String(255))
     student_id = db.Column(db.String(255), unique=True, nullable=False)
     parent_phone = db.Column(db.String(255), nullable=False)
-    teacher_name = db.Column(db.String(255), nullable=False)
-    course_name = db.Column(db.String(255), nullable=False)
-    date_added = db.Column(db.DateTime, default=now)
+    course_id = db.Column(db.Integer, db.ForeignKey('course.id'), nullable=False)
+    date_added = db.Column(db.DateTime, default=datetime.now)
+
+    course = db.relationship('Course')
+
+    @property
+    def fullname(self):
+        return self.firstname + ' ' + self.lastname
+
+    @property
+    def course_name(self):
+        return self.course.course_name
+
+    @property
+    def teacher_name(self):
+        return self.course.course_teacher
 
     def __repr__(self):
         return '<Student %r>' % self.id
 
+# One row per student per attendance session. date_timein is the session's
+# opened_at until the student is marked present.
 class AttendanceHistory(db.Model, UserMixin):
     __tablename__ = 'attendacehistory'
+    __table_args__ = (
+        db.UniqueConstraint('session_id', 'student_id'),
+        db.Index('ix_history_session_status', 'session_id', 'status'),
+        db.Index('ix_history_session_timein', 'session_id', 'date_timein'),
+    )
     id = db.Column(db.Integer, primary_key=True)
 
-    student_id = db.Column(db.Integer, db.ForeignKey('student.id'), nullable=False)
-    student_name = db.Column(db.String(1000), nullable=False)
-    course = db.Column(db.String(255), nullable=False)
-    course_teacher = db.Column(db.String(255), nullable=False)
-    status = db.Column(db.String(255), default='Absent')
-    date_timein = db.Column(db.DateTime, default=now)
-    
+    session_id = db.Column(db.Integer, db.ForeignKey('attendancesession.id'), nullable=False)
+    student_id = db.Column(db.Integer, db.ForeignKey('student.id'), nullable=False, index=True)
+    status = db.Column(db.String(16), default='Absent')
+    date_timein = db.Column(db.DateTime, default=datetime.now)
+
+    session = db.relationship('AttendanceSession')
+    student = db.relationship('Student')
+
+    @property
+    def student_name(self):
+        return self.student.fullname
+
+    @property
+    def course(self):
+        return self.session.course.course_name
+
+    @property
+    def course_teacher(self):
+        return self.session.course.course_teacher
+
     def __repr__(self):
         return '<History %r>' % self.id
+
+# One attendance taking of a course on a day
+class AttendanceSession(db.Model):
+    __tablename__ = 'attendancesession'
+    __table_args__ = (db.UniqueConstraint('course_id', 'date'),)
+    id = db.Column(db.Integer, primary_key=True)
+
+    course_id = db.Column(db.Integer, db.ForeignKey('course.id'), nullable=False)
+    date = db.Column(db.Date, nullable=False)
+    opened_at = db.Column(db.DateTime, nullable=False, default=datetime.now)
+
+    course = db.relationship('Course')
+
+    def __repr__(self):
+        return '<Session %r>' % self.id
     
+# Attendance counts per course per day and per student per term, kept current by
+# open_session / mark_present and rebuilt from the history by `flask rebuildstats`
+class CourseDayStats(db.Model):
+    __tablename__ = 'coursedaystats'
+    course_id = db.Column(db.Integer, db.ForeignKey('course.id'), primary_key=True)
+    date = db.Column(db.Date, primary_key=True)
+
+    total = db.Column(db.Integer, nullable=False, default=0)
+    present = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return '<CourseDayStats %r %r>' % (self.course_id, self.date)
+
+class StudentTermStats(db.Model):
+    __tablename__ = 'studenttermstats'
+    student_id = db.Column(db.Integer, db.ForeignKey('student.id'), primary_key=True)
+    term = db.Column(db.String(16), primary_key=True)
+
+    sessions = db.Column(db.Integer, nullable=False, default=0)
+    present = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return '<StudentTermStats %r %r>' % (self.student_id, self.term)
+
+# Backup of a student's sensor template: zlib-compressed, with the sha256 of the raw bytes
+class FingerprintTemplate(db.Model):
+    __tablename__ = 'fingerprinttemplate'
+    student_id = db.Column(db.Integer, db.ForeignKey('student.id'), primary_key=True)
+
+    data = db.Column(db.LargeBinary, nullable=False)
+    checksum = db.Column(db.String(64), nullable=False)
+    saved_at = db.Column(db.DateTime, default=datetime.now)
+
+    def __repr__(self):
+        return '<FingerprintTemplate %r>' % self.student_id
+
+# Version of the data behind the cached pages, one row per scope
+class DataVersion(db.Model):
+    __tablename__ = 'dataversion'
+    scope = db.Column(db.String(64), primary_key=True)
+
+    version = db.Column(db.Integer, nullable=False, default=1)
+    changed_at = db.Column(db.DateTime, nullable=False, default=datetime.now)
+
+    def __repr__(self):
+        return '<DataVersion %r>' % self.scope
+
+# Contiguous range of sensor slots holding a course's students
+class FingerprintRange(db.Model):
+    __tablename__ = 'fingerprintrange'
+    course_id = db.Column(db.Integer, db.ForeignKey('course.id'), primary_key=True)
+
+    start = db.Column(db.Integer, nullable=False)
+    count = db.Column(db.Integer, nullable=False)
+
+    def __repr__(self):
+        return '<FingerprintRange %r>' % self.course_id
+
+# Free-slot bitmap of the fingerprint sensor library, one row
+class FingerprintSlots(db.Model):
+    __tablename__ = 'fingerprintslots'
+    id = db.Column(db.Integer, primary_key=True)
+
+    capacity = db.Column(db.Integer, nullable=False)
+    bitmap = db.Column(db.LargeBinary, nullable=False)
+    reconciled_at = db.Column(db.DateTime)
+
+    def __repr__(self):
+        return '<FingerprintSlots %r>' % self.capacity
+
+class SmsOutbox(db.Model):
+    __tablename__ = 'smsoutbox'
+    id = db.Column(db.Integer, primary_key=True)
+
+    phone = db.Column(db.String(255), nullable=False)
+    body = db.Column(db.Text, nullable=False)
+    status = db.Column(db.String(32), default='pending', index=True)
+    attempts = db.Column(db.Integer, default=0)
+    next_attempt = db.Column(db.DateTime, default=datetime.now)
+    created = db.Column(db.DateTime, default=datetime.now)
+    sent_at = db.Column(db.DateTime)
+    last_error = db.Column(db.String(255))
+
+    def __repr__(self):
+        return '<Sms %r>' % self.id
+
 @app.cli.command('createdb')
 def db_create():
+    storage.enable_incremental_vacuum(db.engine)
     db.create_all()
+    migrations.stamp(db)
     print('Database created!')
+@app.cli.command('upgradedb')
+def db_upgrade():
+    applied = migrations.upgrade(db)
+    for version, name, counts in applied:
+        print('Applied migration %d (%s)' % (version, name))
+        for key, value in counts.items():
+            print('  %s: %s' % (key, value))
+    if CourseDayStats.query.first() is None:
+        days, terms = rebuild_stats()
+        print('Built statistics: %d course days, %d student terms' % (days, terms))
+    if storage.enable_incremental_vacuum(db.engine):
+        print('Enabled incremental vacuum')
+    print('Database is at version %d' % migrations.LATEST)
+@app.cli.command('rebuildstats')
+def db_rebuild_stats():
+    days, terms = rebuild_stats()
+    print('Rebuilt %d course days and %d student terms' % (days, terms))
+@app.cli.command('archive')
+@click.option('--before', type=date.fromisoformat, help='Archive sessions before this day (default: start of the oldest kept term).')
+def db_archive(before):
+    moved = archive_history(before)
+    for term, count in moved.items():
+        print('Archived %d rows of term %s' % (count, term))
+    print('History before %s is archived in %s' % (before or hot_boundary(), archive.directory))
+@app.cli.command('reconcile-fingerprints')
+@click.option('--clean', is_flag=True, help='Delete templates that no student uses.')
+def db_reconcile_fingerprints(clean):
+    report = reconcile_fingerprints(clean)
+    for key, value in report.items():
+        print('%s: %s' % (key, value))
+@app.cli.command('compact-fingerprints')
+def db_compact_fingerprints():
+    with ranges_lock:
+        layout = compact_fingerprints()
+    if layout is None:
+        print('The course ranges do not fit in the sensor library')
+        return
+    for course_id, (start, count) in sorted(layout.items(), key=lambda item: item[1]):
+        print('Course %d: slots %d-%d' % (course_id, start, start + count - 1))
+@app.cli.command('backup-templates')
+@click.option('--all', 'everything', is_flag=True, help='Download every template again, not only the missing ones.')
+def db_backup_templates(everything):
+    started = monotonic()
+    saved, failed = backup_templates(missing_only=not everything)
+    print('Backed up %d templates (%d failed) in %.1f s' % (saved, failed, monotonic() - started))
+@app.cli.command('restore-templates')
+@click.option('--reader', 'name', help='Reader to write the templates to (default: the primary reader).')
+def db_restore_templates(name):
+    reader = readers.get(name)
+    if reader is None:
+        raise click.BadParameter('unknown reader %s' % name, param_hint='--reader')
+    report = restore_templates(reader.capture)
+    print('Restored %(restored)d templates (%(failed)d failed, %(corrupt)d corrupt) in %(seconds).1f s' % report)
+@app.cli.command('metrics')
+@click.option('--url', help='Address of the running app (default: METRICS_URL).')
+@click.option('--lcd', is_flag=True, help='Also show the slowest stages on the LCD.')
+def db_metrics(url, lcd):
+    # the counters live in the server process, not in this one
+    url = (url or app.config['METRICS_URL']).rstrip('/') + '/metrics/summary' + ('?lcd=1' if lcd else '')
+    with urlopen(url, timeout=10) as response:
+        print(response.read().decode(), end='')
+@app.cli.command('password-cost')
+def db_password_cost():
+    if app.config['PASSWORD_HASH_METHOD']:
+        print('PASSWORD_HASH_METHOD is set to %s' % app.config['PASSWORD_HASH_METHOD'])
+        return
+    method = passwords.calibrate()
+    started = perf_counter()
+    passwords.hash('benchmark')
+    print('New passwords use %s (%.0f ms per hash); older hashes are replaced at login' % (method, (perf_counter() - started) * 1000))
 @app.cli.command('dropdb')
 def db_drop():
     db.drop_all()
     print('Database dropped!')
 @app.cli.command('create-admin')
 def db_seed():
-    hashed_password = generate_password_hash('admin')
+    hashed_password = passwords.hash('admin')
     user1 = Teacher(lastname='Account', firstname='Admin', gender='Neutral', teacher_id='00000000', username='admin', password=hashed_password)
     db.session.add(user1)
     db.session.commit()
@@ -116,9 +450,29 @@ def db_seed():
 login_manager = LoginManager()
 login_manager.init_app(app)
 
+# Password hashes use PASSWORD_HASH_METHOD, or PBKDF2 with as many iterations as
+# take PASSWORD_HASH_SECONDS on this Pi (benchmarked once, kept in
+# instance/password-cost, `flask password-cost` measures again). Older hashes
+# are replaced on the next login.
+app.config.setdefault('PASSWORD_HASH_METHOD', None)
+app.config.setdefault('PASSWORD_HASH_SECONDS', 0.25)
+app.config.setdefault('PASSWORD_MIN_ITERATIONS', 100000)
+passwords = PasswordPolicy(app.config['PASSWORD_HASH_METHOD'], app.config['PASSWORD_HASH_SECONDS'],
+                           app.config['PASSWORD_MIN_ITERATIONS'], os.path.join(app.instance_path, 'password-cost'))
+
+# Teachers of logged-in sessions are kept LOGIN_CACHE_SECONDS instead of being
+# queried on every request; the teacher routes drop changed ones
+app.config.setdefault('LOGIN_CACHE_SECONDS', 300)
+
+def load_identity(user_id):
+    teacher = db.session.get(Teacher, user_id)
+    return Identity(teacher) if teacher is not None else None
+
+identities = IdentityCache(load_identity, ttl=app.config['LOGIN_CACHE_SECONDS'])
+
 @login_manager.user_loader
 def load_user(user_id):
-    return Teacher.query.get(int(user_id))
+    return identities.get(int(user_id))
 
 @login_manager.unauthorized_handler
 def unauthorized_callback():
@@ -137,44 +491,237 @@ def index():
         password = request.form.get('password')
 
         user = Teacher.query.filter_by(username=username.lower()).first()
+        matches, rehashed = passwords.verify(user.password, password) if user else (False, None)
 
-        if user and check_password_hash(user.password, password):
+        if matches:
+            if rehashed:
+                user.password = rehashed
+                db.session.commit()
 
             if user.username == 'admin':
                 login_user(user)
                 next_page = request.args.get('next')
-                display.lcd_clear()
-                display.lcd_display_string("Logging in...", 1)
-                sleep(2)
-                display.lcd_clear()
+                display.show("Logging in...", duration=2)
+                display.clear()
                 return redirect(next_page or url_for('admin'))
             else:
                 login_user(user)
                 next_page = request.args.get('next')
-                display.lcd_clear()
-                display.lcd_display_string("Logging in...", 1)
-                sleep(2)
-                display.lcd_clear()
+                display.show("Logging in...", duration=2)
+                display.clear()
                 return redirect(next_page or url_for('dashboard'))
         else:
             flash('Please check your login details and try again.')
             return redirect(url_for('index'))
                 
-    display.lcd_display_string("Student Attendance", 1)
-    display.lcd_display_string("System", 2)
-    display.lcd_display_string("Please login", 4)
+    display.show("Student Attendance", "System", "", "Please login", priority=drivers.PRIORITY_LOW, key='banner', ttl=5)
     return render_template("login.html")
 
 @app.route('/logout')
 @login_required
 def logout():
     logout_user()
-    display.lcd_clear()
-    display.lcd_display_string("Logging out...", 1)
-    sleep(2)
-    display.lcd_clear()
+    display.show("Logging out...", duration=2)
+    display.clear()
     return redirect(url_for('index'))
 
+##### PAGE CACHE #####
+# Pages carry an ETag made from the versions of the data they show, scopes
+# 'teacher:<id>' and 'course:<id>', bumped in the same transaction as every
+# write. 'global' is bumped by bulk changes (archive, rebuilt statistics) and
+# is part of every page. A repeated view costs one version lookup and gets a
+# 304, or the rendered page from the cache when the browser has none.
+pages = PageCache()
+# templates and code of this deployment, so an upgrade does not serve old pages
+def deployed_at():
+    folder = os.path.join(app.root_path, app.template_folder)
+    times = [os.path.getmtime(os.path.join(root, name)) for root, dirs, names in os.walk(folder) for name in names]
+    return max(times + [os.path.getmtime(__file__)])
+
+PAGE_SALT = deployed_at()
+
+# stage new versions for the courses and teachers (the courses' teachers too)
+def bump_versions(courses=(), teachers=(), everything=False, session=None):
+    session = session or db.session
+    courses = {int(course_id) for course_id in courses if course_id is not None}
+    teachers = {int(teacher_id) for teacher_id in teachers if teacher_id is not None}
+    if courses:
+        teachers.update(teacher_id for (teacher_id,) in session.query(Course.teacher_id).filter(Course.id.in_(courses)) if teacher_id is not None)
+    scopes = ['course:%d' % course_id for course_id in courses] + ['teacher:%d' % teacher_id for teacher_id in teachers]
+    if everything:
+        scopes.append('global')
+    if not scopes:
+        return
+    statement = upsert(DataVersion).values([dict(scope=scope, version=1, changed_at=datetime.now()) for scope in scopes])
+    session.execute(statement.on_conflict_do_update(index_elements=['scope'], set_=dict(version=DataVersion.version + 1, changed_at=statement.excluded.changed_at)))
+
+# ({scope: version}, time of the latest change) of the scopes and 'global'
+def data_versions(*scopes):
+    scopes = ('global',) + scopes
+    versions = dict.fromkeys(scopes, 0)
+    modified = None
+    for scope, version, changed_at in db.session.query(DataVersion.scope, DataVersion.version, DataVersion.changed_at).filter(DataVersion.scope.in_(scopes)):
+        versions[scope] = version
+        modified = max(modified, changed_at) if modified else changed_at
+    return versions, modified
+
+# The page `key` of the current user, rendered by render() only when neither the
+# browser (If-None-Match) nor the cache has it at the current data versions.
+# Today's date is part of the key: the pages show today's counts.
+def cached_page(key, scopes, render):
+    # a page showing a flashed message is for this response only
+    if session.get('_flashes'):
+        return Response(render(), mimetype='text/html')
+    versions, modified = data_versions(*scopes)
+    etag = page_etag((key, current_user.get_id(), date.today().isoformat(), PAGE_SALT, asset_stamp()), versions)
+    # weak: the compression below weakens the ETag of a gzipped page
+    if request.if_none_match.contains_weak(etag):
+        pages.not_modified += 1
+        response = Response(status=304)
+    else:
+        body = pages.get(etag)
+        if body is None:
+            body = render()
+            pages.put(etag, body)
+        response = Response(body, mimetype='text/html')
+        # compressed once and kept with the page, not again by compress_response
+        data = response.get_data()
+        response.vary.add('Accept-Encoding')
+        if request.accept_encodings['gzip'] and len(data) >= app.config['COMPRESS_MIN_SIZE']:
+            response.set_data(pages.compressed(etag, lambda: gzip_bytes(data, app.config['COMPRESS_LEVEL'])))
+            response.headers['Content-Encoding'] = 'gzip'
+    response.set_etag(etag, weak='Content-Encoding' in response.headers)
+    if modified is not None:
+        response.last_modified = modified
+    # the browser keeps the page but asks every time
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
+
+##### STATIC ASSETS #####
+# `flask build-assets` bundles the stylesheets and scripts into static/dist,
+# minified, named after their content and compressed ahead of time. Built files
+# are served as .br or .gz to browsers that take them and cached for a year:
+# a new build has new names. Without a build the templates load the sources.
+app.config.setdefault('ASSET_BUNDLES', True)
+# HTML and JSON responses larger than this are gzipped on the way out
+app.config.setdefault('COMPRESS_MIN_SIZE', 512)
+app.config.setdefault('COMPRESS_LEVEL', 6)
+COMPRESS_MIMETYPES = {'text/html', 'text/plain', 'text/csv', 'application/json'}
+assets = Assets(app.static_folder)
+
+def asset_stamp():
+    return assets.stamp() if app.config['ASSET_BUNDLES'] else None
+
+@app.template_global()
+def asset_urls(bundle):
+    return [url_for('static', filename=filename) for filename in assets.files(bundle, app.config['ASSET_BUNDLES'])]
+
+def serve_static(filename):
+    if not assets.is_built(filename):
+        return app.send_static_file(filename)
+    path = safe_join(app.static_folder, filename)
+    if path is None or not os.path.isfile(path):
+        abort(404)
+    mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    encodings = request.accept_encodings
+    for encoding, suffix in (('br', '.br'), ('gzip', '.gz')):
+        if encodings[encoding] and os.path.isfile(path + suffix):
+            response = send_file(path + suffix, mimetype=mimetype, max_age=31536000)
+            response.headers['Content-Encoding'] = encoding
+            break
+    else:
+        response = send_file(path, mimetype=mimetype, max_age=31536000)
+    response.vary.add('Accept-Encoding')
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+app.view_functions['static'] = serve_static
+
+@app.after_request
+def compress_response(response):
+    if (response.direct_passthrough or response.is_streamed or response.status_code != 200
+            or 'Content-Encoding' in response.headers or response.mimetype not in COMPRESS_MIMETYPES):
+        return response
+    response.vary.add('Accept-Encoding')
+    if not request.accept_encodings['gzip']:
+        return response
+    data = response.get_data()
+    if len(data) < app.config['COMPRESS_MIN_SIZE']:
+        return response
+    response.set_data(gzip_bytes(data, app.config['COMPRESS_LEVEL']))
+    response.headers['Content-Encoding'] = 'gzip'
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
+
+@app.cli.command('build-assets')
+def build_assets():
+    manifest = build_bundles(app.static_folder, os.path.join(app.root_path, app.template_folder))
+    folder = os.path.join(app.static_folder, 'dist')
+    for bundle, (filename,) in sorted(manifest['bundles'].items()):
+        path = os.path.join(app.static_folder, filename)
+        sizes = ['%d bytes' % os.path.getsize(path)]
+        for suffix in ('.gz', '.br'):
+            if os.path.isfile(path + suffix):
+                sizes.append('%s %d' % (suffix, os.path.getsize(path + suffix)))
+        click.echo('%-10s %s  %s' % (bundle, filename, ', '.join(sizes)))
+    click.echo('%d files in %s' % (len(os.listdir(folder)), folder))
+
+##### LIVE EVENTS #####
+# Scans, enrollments and deletions are published to the pages open on them as
+# Server-Sent Events at /events: small JSON deltas the tables apply in place
+# instead of the page being loaded again. Events are published after their
+# transaction commits; EVENTS_REPLAY of them are kept for reconnecting browsers.
+app.config.setdefault('EVENTS_REPLAY', 256)
+app.config.setdefault('EVENTS_KEEPALIVE', 15)
+events = EventBus(replay=app.config['EVENTS_REPLAY'])
+
+# to the subscribers of the course, of its teacher, and the admin's
+def publish(name, data, course_id, teacher_id=None):
+    scopes = ['global', 'course:%d' % course_id]
+    if teacher_id is not None:
+        scopes.append('teacher:%d' % teacher_id)
+    events.publish(name, data, scopes)
+
+# today's (present, total) of a course, from the rollups
+def todays_counts(course_id):
+    row = db.session.query(CourseDayStats.present, CourseDayStats.total).filter_by(course_id=course_id, date=date.today()).first()
+    return tuple(row) if row else (0, 0)
+
+# a student added, updated or deleted, with the course's counts for today
+def publish_student(action, student, course_id):
+    teacher_id = db.session.query(Course.teacher_id).filter_by(id=course_id).scalar()
+    present, total = todays_counts(course_id)
+    publish('student', {'action': action, 'id': student.id, 'student_id': student.student_id, 'course_id': course_id, 'present': present, 'total': total}, course_id, teacher_id)
+
+# ?course=<id> narrows a teacher's stream to one of their courses
+@app.route('/events')
+@login_required
+def live_events():
+    if current_user.username == 'admin':
+        scopes = ['global']
+    else:
+        scopes = ['teacher:%d' % current_user.id]
+        course_id = request.args.get('course', type=int)
+        if course_id is not None:
+            if db.session.query(Course.teacher_id).filter_by(id=course_id).scalar() != current_user.id:
+                return jsonify({'error': 'unknown course'}), 404
+            scopes = ['course:%d' % course_id]
+    stream = events.stream(scopes, request.headers.get('Last-Event-ID'), keepalive=app.config['EVENTS_KEEPALIVE'])
+    response = Response(stream, mimetype='text/event-stream')
+    response.cache_control.no_cache = True
+    # nginx would otherwise hold the events back to fill its buffer
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+@app.route('/events/status')
+@login_required
+def events_status():
+    return jsonify(events.stats())
+
 ################ TEACHER DASHBOARD ################
 @app.route('/dashboard')
 @login_required
@@ -182,15 +729,12 @@ def dashboard():
     if current_user.username == 'admin':
             return redirect(url_for('admin'))
     else:
-        courses = Course.query.filter_by(course_teacher=current_user.firstname+' '+current_user.lastname)
-        students = Student.query.filter_by(teacher_name=current_user.firstname+' '+current_user.lastname).order_by(desc(Student.date_added)).all()
-        histories = AttendanceHistory.query.filter_by(course_teacher=current_user.firstname+' '+current_user.lastname).order_by(desc(AttendanceHistory.date_timein)).all()
-        display.lcd_clear()
-        display.lcd_display_string("Student Attendance", 1)
-        display.lcd_display_string("System", 2)
-        display.lcd_display_string("Welcome Teacher", 3)
-        display.lcd_display_string(f"{current_user.firstname + ' ' + current_user.lastname}", 4)
-        return render_template("dashboard.html", fullname=current_user.firstname+' '+current_user.lastname, id=current_user.id, courses=courses, students=students, histories=histories)
+        display.show("Student Attendance", "System", "Welcome Teacher", f"{current_user.firstname + ' ' + current_user.lastname}", priority=drivers.PRIORITY_LOW, key='banner', ttl=5)
+        def render():
+            courses = Course.query.filter_by(teacher_id=current_user.id)
+            summary = course_summary(current_user.id)
+            return render_template("dashboard.html", fullname=current_user.firstname+' '+current_user.lastname, id=current_user.id, courses=courses, summary=summary)
+        return cached_page('dashboard', ['teacher:%d' % current_user.id], render)
 
 @app.route('/attendance/<code>')
 @login_required
@@ -198,156 +742,842 @@ def attendance_scan(code):
     if current_user.username == 'admin':
         return redirect(url_for('admin'))
     else:
-        courses = Course.query.filter_by(course_teacher=current_user.firstname+' '+current_user.lastname)
-        histories = AttendanceHistory.query.filter_by(course_teacher=current_user.firstname+' '+current_user.lastname)
-        
         course_query = Course.query.filter_by(course_code=code).first()
-                
-        if course_query:
-            coursename = course_query.course_name
-            studentquery = Student.query.filter_by(course_name=coursename)
-
-            today = now
-
-            total_students = studentquery.count()
-            check_present = AttendanceHistory.query.filter_by(course=coursename, date_timein=today, status='Present').count() == total_students
-
-            if not check_present:
-                for student in studentquery:
-                    student_id = student.student_id
-                    fullname = f"{student.firstname} {student.lastname}"
-                    course = student.course_name
-                    course_teacher = student.teacher_name
-
-                    attendance = AttendanceHistory(
-                        student_id=student_id,
-                        student_name=fullname,
-                        course=course,
-                        course_teacher=course_teacher,
-                        status='Absent'
-                    )
-
-                    db.session.add(attendance)
-                    db.session.commit()
-            else:
-                display.lcd_clear()
-                display.lcd_display_string("All Students", 1)
-                display.lcd_display_string("are present.", 2)
-                sleep(2)
-                GPIO.cleanup()
-                return redirect(url_for('index'))
-
-        display.lcd_clear()
-        display.lcd_display_string("Press button to", 1)
-        display.lcd_display_string("take attendance", 2)
-        sleep(2)
-        while True:
-            try:
-                GPIO.wait_for_edge(BUTTON_PIN, GPIO.FALLING)
-                display.lcd_clear()
-                display.lcd_display_string("Button pressed.", 2)
-                sleep(2)
-                if studentquery.count() > 0:
-                    if get_fingerprint():
-                        students = studentquery.filter_by(fingerprint_id=finger.finger_id).first()
-                        number = students.parent_phone
-                        studentid = students.student_id
-                        fullname = students.firstname+' '+students.lastname
-                        course = students.course_name
-                        course_teacher = students.teacher_name
-                        attendance = AttendanceHistory.query.filter_by(student_id=studentid, student_name=fullname, course=course, course_teacher=course_teacher, date_timein=today).first()
-
-                        if attendance:
-                            attendance.status = 'Present'
-
-                            db.session.commit()
-
-                            if open_serial_port():
-                                try:
-                                    response = send_at_command('AT\r')
-                                    print("AT Command response:", response)
-
-                                    response = send_at_command('AT+CMGF=1\r')
-                                    print("CMGF response:", response)
-
-                                    response = send_at_command(f'AT+CMGS="{number}"\r')
-                                    print("CMGS response:", response)
-
-                                    response = send_at_command(f'Your child, {fullname}, has entered their {course} class. The time is {attendance.date_timein}. \x1A')
-                                    print("Sending SMS response:", response)
-
-                                except Exception as e:
-                                    print("Error:", str(e))
-
-                                finally:
-                                    sms.close()
-                                    print("Serial port is closed.")
-                                    display.lcd_display_string("SMS Sent", 1)
-                                    sleep(1)
-                        else:
-                            print("Cannot proceed as the serial port is not open.")
-
-                        display.lcd_clear()
-                    return redirect(url_for('attendance_scan', code=code))
-                else:
-                    display.lcd_clear()
-                    display.lcd_display_string("No student found.", 1)
-                    sleep(2)
-                    return redirect(url_for('attendance_scan', code=code))
-            except KeyboardInterrupt:
-                GPIO.cleanup()
-                sys.exit()
-
-        return render_template("attendance.html", courses=courses, histories=histories)
-def open_serial_port():
-    global sms
+
+        if course_query is None:
+            return redirect(url_for('error404'))
+
+        coursename = course_query.course_name
+
+        with metrics.timer('attendance_stage_seconds', stage='open_session'):
+            open_session(course_query)
+            roster = todays_roster(course_query.id)
+
+        if roster.all_present():
+            reader = readers.serving(code)
+            if reader is not None:
+                reader.scanner.stop()
+            display.show("All Students", "are present.", duration=2)
+            return redirect(url_for('index'))
+
+        name = request.args.get('reader')
+        reader = readers.assign(code, name)
+        if reader is None and name and readers.get(name) is None:
+            return redirect(url_for('error404'))
+        if reader is None:
+            flash('Every fingerprint reader is taking attendance for another course. Stop one first.')
+            return redirect(url_for('dashboard'))
+
+        if reader.scanner.status()['course'] != code:
+            reader.scanner.start(code, course_id=course_query.id, course_name=coursename, total=roster.total)
+            display.show("Press button to" if reader.button is not None else "Place finger to", "take attendance", duration=2)
+
+        def render():
+            courses = Course.query.filter_by(teacher_id=current_user.id)
+            histories = teacher_histories(current_user.id)
+            return render_template("attendance.html", fullname=current_user.firstname+' '+current_user.lastname, courses=courses, histories=histories, course=course_query, reader=reader.name)
+        return cached_page(('attendance', code, reader.name), ['teacher:%d' % current_user.id, 'course:%d' % course_query.id], render)
+
+# Attendance rows of a teacher's courses, students loaded in the same query
+def teacher_histories(teacher_id):
+    return AttendanceHistory.query.join(AttendanceSession).join(Course) \
+        .filter(Course.teacher_id == teacher_id).options(joinedload(AttendanceHistory.student))
+
+@app.route('/scanner/status')
+@login_required
+def scanner_status():
+    reader = readers.get(request.args.get('reader'))
+    if reader is None:
+        return jsonify({'error': 'unknown reader'}), 404
+    return jsonify(dict(reader.status(), writes=commits.stats()))
+
+@app.route('/scanner/stop', methods=["POST"])
+@login_required
+def scanner_stop():
+    reader = readers.get(request.args.get('reader'))
+    if reader is None:
+        return jsonify({'error': 'unknown reader'}), 404
+    if reader.scanner.stop():
+        display.clear()
+    return jsonify(reader.scanner.status())
+
+@app.route('/readers/status')
+@login_required
+def readers_status():
+    return jsonify({'readers': readers.status(), 'writes': commits.stats(), 'hardware': hardware.status()})
+
+# Open today's session of a course: one session row plus an Absent row for every
+# student, inserted in bulk and committed once. Opening it again only adds rows
+# for students enrolled since, so a reload is a no-op.
+def open_session(course):
+    today = date.today()
+    attendance_session = AttendanceSession.query.filter_by(course_id=course.id, date=today).first()
+    created = attendance_session is None
+    if created:
+        try:
+            attendance_session = AttendanceSession(course_id=course.id, date=today, opened_at=datetime.now())
+            db.session.add(attendance_session)
+            db.session.flush()
+        except IntegrityError:
+            db.session.rollback()
+            attendance_session = AttendanceSession.query.filter_by(course_id=course.id, date=today).one()
+            created = False
+
+    existing = {student_id for (student_id,) in db.session.query(AttendanceHistory.student_id).filter_by(session_id=attendance_session.id)}
+    rows = [
+        dict(session_id=attendance_session.id, student_id=student_id, status='Absent', date_timein=attendance_session.opened_at)
+        for (student_id,) in db.session.query(Student.id).filter_by(course_id=course.id)
+        if student_id not in existing
+    ]
+    if rows:
+        db.session.execute(insert(AttendanceHistory), rows)
+        count_absent(course.id, attendance_session.date, [row['student_id'] for row in rows])
+    if created or rows:
+        bump_versions(courses=[course.id])
+        db.session.commit()
+    if rows:
+        rosters.invalidate(course.id)
+    return attendance_session
+
+# Roster of a course for today's session, built once and reused for every scan
+def build_roster(course_id):
+    today = date.today()
+    course = db.session.get(Course, course_id)
+    attendance_session = AttendanceSession.query.filter_by(course_id=course_id, date=today).first()
+    rows = {}
+    if attendance_session is not None:
+        for history_id, student_id, status, date_timein in db.session.query(AttendanceHistory.id, AttendanceHistory.student_id, AttendanceHistory.status, AttendanceHistory.date_timein).filter_by(session_id=attendance_session.id):
+            rows[student_id] = (history_id, status, date_timein)
+
+    roster = RosterIndex(course_id, day=today, teacher=course.teacher_id)
+    for student in Student.query.filter_by(course_id=course_id):
+        history_id, status, date_timein = rows.get(student.id, (None, None, None))
+        entry = RosterEntry(0, student.fingerprint_id, student.student_id, student.fullname, student.parent_phone, course.course_name, course.course_teacher, history_id, date_timein, student.id)
+        roster.add(entry, present=status == 'Present' or history_id in pending_present)
+    return roster
+
+# Cached roster, rebuilt once the day it was built for is over
+def todays_roster(course_id):
+    roster = rosters.get(course_id, build_roster)
+    if roster.day != date.today():
+        rosters.invalidate(course_id)
+        roster = rosters.get(course_id, build_roster)
+    return roster
+
+# Called by a reader's scanner worker (inside the app context) for every matched
+# finger. Writes of all readers go through the one GroupCommit writer.
+def mark_present(reader, code, finger_id):
+    status = reader.scanner.status()
+    if status['course'] != code:
+        return None
+    with metrics.timer('attendance_stage_seconds', stage='roster_lookup'):
+        roster = todays_roster(status['course_id'])
+        entry = roster.lookup(finger_id)
+    if entry is None or entry.history_id is None:
+        display.show("No student found.", duration=2, priority=drivers.PRIORITY_HIGH)
+        return None
+
+    number = entry.parent_phone
+    fullname = entry.name
+    student = {'student_id': entry.student_id, 'name': fullname, 'present': roster.count_present(), 'total': roster.total}
+
+    # mark() also settles two readers of the same course scanning one student
+    if not roster.mark(entry):
+        display.show("Already present", fullname, duration=1, priority=drivers.PRIORITY_HIGH)
+        return student
+
+    # The status change and the parent SMS are written in one transaction, shared
+    # with the other scans of the burst. Only the write that turns the row to
+    # Present sends the SMS, so a scan queued twice (the roster rebuilt in
+    # between) is written once.
+    now = datetime.now()
+    body = f'Your child, {fullname}, has entered their {entry.course} class. The time is {now:%Y-%m-%d %H:%M}. '
+    written = []
+    def write(session):
+        # a batch that failed is written again, write by write
+        written.clear()
+        result = session.execute(update(AttendanceHistory).where(AttendanceHistory.id == entry.history_id, AttendanceHistory.status != 'Present').values(status='Present', date_timein=now))
+        if not result.rowcount:
+            return
+        count_present(roster.course, roster.day, entry.pk, session)
+        session.add(SmsOutbox(phone=number, body=body))
+        bump_versions(courses=[roster.course], session=session)
+        written.append(True)
+    present = roster.count_present()
+    event = {'course_id': roster.course, 'history_id': entry.history_id, 'student': entry.pk, 'student_id': entry.student_id,
+             'name': fullname, 'status': 'Present', 'date_timein': timestamp(now), 'present': present, 'total': roster.total}
+    def done(ok):
+        pending_present.discard(entry.history_id)
+        if not ok:
+            rosters.invalidate(roster.course)
+        elif written:
+            outbox.notify()
+            publish('present', event, roster.course, roster.teacher)
+    pending_present.add(entry.history_id)
+    commits.add(write, done)
+    student['present'] = present
+
+    display.clear()
+    return student
+
+##### ROLLUPS #####
+# Terms follow the school year: first semester August-December, second
+# January-May, summer June-July. "2023-2" is the second semester of 2023-2024.
+def term_of(day):
+    if day.month >= 8:
+        return '%d-1' % day.year
+    if day.month <= 5:
+        return '%d-2' % (day.year - 1)
+    return '%d-S' % (day.year - 1)
+
+def term_start(day):
+    if day.month >= 8:
+        return date(day.year, 8, 1)
+    if day.month <= 5:
+        return date(day.year, 1, 1)
+    return date(day.year, 6, 1)
+
+def term_range(term):
+    year, part = term.split('-')
+    year = int(year)
+    if part == '1':
+        return date(year, 8, 1), date(year, 12, 31)
+    if part == '2':
+        return date(year + 1, 1, 1), date(year + 1, 5, 31)
+    return date(year + 1, 6, 1), date(year + 1, 7, 31)
+
+def bump(model, keys, counts):
+    statement = upsert(model)
+    return statement.on_conflict_do_update(index_elements=keys, set_={name: getattr(model, name) + statement.excluded[name] for name in counts})
+
+# New Absent rows of a session: one more student on the course day, one more session per student
+def count_absent(course_id, day, student_ids, session=None):
+    session = session or db.session
+    term = term_of(day)
+    session.execute(bump(CourseDayStats, ['course_id', 'date'], ['total', 'present']), [dict(course_id=course_id, date=day, total=len(student_ids), present=0)])
+    session.execute(bump(StudentTermStats, ['student_id', 'term'], ['sessions', 'present']), [dict(student_id=student_id, term=term, sessions=1, present=0) for student_id in student_ids])
+
+# An Absent row flipped to Present
+def count_present(course_id, day, student_id, session=None):
+    session = session or db.session
+    session.execute(bump(CourseDayStats, ['course_id', 'date'], ['total', 'present']), [dict(course_id=course_id, date=day, total=0, present=1)])
+    session.execute(bump(StudentTermStats, ['student_id', 'term'], ['sessions', 'present']), [dict(student_id=student_id, term=term_of(day), sessions=0, present=1)])
+
+def history_counts(*filters):
+    present = func.sum(case((AttendanceHistory.status == 'Present', 1), else_=0))
+    return select(func.count(AttendanceHistory.id), present).select_from(AttendanceHistory).join(AttendanceSession).where(*filters)
+
+# Course days recounted from the history, after its students changed. Archived
+# days are no longer in the history and keep their counts.
+def recount_course(course_id):
+    hot_days = db.session.query(AttendanceSession.date).filter_by(course_id=course_id)
+    db.session.execute(delete(CourseDayStats).where(CourseDayStats.course_id == course_id, CourseDayStats.date.in_(hot_days.scalar_subquery())))
+    days = history_counts(AttendanceSession.course_id == course_id) \
+        .add_columns(AttendanceSession.course_id, AttendanceSession.date).group_by(AttendanceSession.date)
+    db.session.execute(insert(CourseDayStats).from_select(['total', 'present', 'course_id', 'date'], days))
+
+def rebuild_stats():
+    db.session.execute(delete(CourseDayStats))
+    db.session.execute(delete(StudentTermStats))
+    days = history_counts().add_columns(AttendanceSession.course_id, AttendanceSession.date) \
+        .group_by(AttendanceSession.course_id, AttendanceSession.date)
+    db.session.execute(insert(CourseDayStats).from_select(['total', 'present', 'course_id', 'date'], days))
+
+    # months map onto terms, so the history is grouped by student and month first
+    month = func.strftime('%Y-%m', AttendanceSession.date)
+    terms = {}
+    for total, present, student_id, year_month in db.session.execute(history_counts().add_columns(AttendanceHistory.student_id, month).group_by(AttendanceHistory.student_id, month)):
+        key = (student_id, term_of(date.fromisoformat(year_month + '-01')))
+        sessions, present_before = terms.get(key, (0, 0))
+        terms[key] = (sessions + total, present_before + present)
+
+    # archived terms, for the courses and students that still exist
+    course_ids = {course_id for (course_id,) in db.session.query(Course.id)}
+    student_ids = {student_id for (student_id,) in db.session.query(Student.id)}
+    days = {}
+    for row in archive.read():
+        present = int(row['status'] == 'Present')
+        if row['course_id'] in course_ids:
+            total_before, present_before = days.get((row['course_id'], row['date']), (0, 0))
+            days[(row['course_id'], row['date'])] = (total_before + 1, present_before + present)
+        if row['student_pk'] in student_ids:
+            key = (row['student_pk'], term_of(row['date']))
+            sessions, present_before = terms.get(key, (0, 0))
+            terms[key] = (sessions + 1, present_before + present)
+    if days:
+        db.session.execute(bump(CourseDayStats, ['course_id', 'date'], ['total', 'present']), [dict(course_id=course_id, date=day, total=total, present=present) for (course_id, day), (total, present) in days.items()])
+    if terms:
+        db.session.execute(insert(StudentTermStats), [dict(student_id=student_id, term=term, sessions=sessions, present=present) for (student_id, term), (sessions, present) in terms.items()])
+    bump_versions(everything=True)
+    db.session.commit()
+    return db.session.query(CourseDayStats).count(), len(terms)
+
+# Today's and this term's attendance of a teacher's courses, from the rollups
+def course_summary(teacher_id):
+    today = date.today()
+    courses = Course.query.filter_by(teacher_id=teacher_id).order_by(Course.course_name).all()
+    ids = [course.id for course in courses]
+    todays = {course_id: (total, present) for course_id, total, present in db.session.query(CourseDayStats.course_id, CourseDayStats.total, CourseDayStats.present).filter(CourseDayStats.course_id.in_(ids), CourseDayStats.date == today)}
+    terms = {course_id: (total, present) for course_id, total, present in db.session.query(CourseDayStats.course_id, func.sum(CourseDayStats.total), func.sum(CourseDayStats.present)).filter(CourseDayStats.course_id.in_(ids), CourseDayStats.date >= term_start(today)).group_by(CourseDayStats.course_id)}
+    summary = []
+    for course in courses:
+        total, present = todays.get(course.id, (0, 0))
+        term_total, term_present = terms.get(course.id, (0, 0))
+        summary.append({
+            'course': course,
+            'present': present,
+            'total': total,
+            'term_rate': round(100.0 * term_present / term_total) if term_total else None,
+        })
+    return summary
+
+##### ARCHIVE #####
+# History of past terms moves out of attendacehistory into gzipped per-term files,
+# the hot table keeps the last ARCHIVE_KEEP_TERMS terms (1: only the current one).
+app.config.setdefault('ARCHIVE_KEEP_TERMS', 1)
+archive = Archive(os.path.join(app.instance_path, 'archive'))
+
+ARCHIVE_COLUMNS = [
+    AttendanceHistory.id,
+    Student.id.label('student_pk'),
+    Student.student_id,
+    (Student.firstname + ' ' + Student.lastname).label('student_name'),
+    Course.id.label('course_id'),
+    Course.course_name.label('course'),
+    Course.teacher_id,
+    (Teacher.firstname + ' ' + Teacher.lastname).label('course_teacher'),
+    AttendanceHistory.status,
+    AttendanceSession.date,
+    AttendanceHistory.date_timein,
+]
+
+# first day that stays in the hot table
+def hot_boundary(today=None):
+    boundary = term_start(today or date.today())
+    for i in range(app.config['ARCHIVE_KEEP_TERMS'] - 1):
+        boundary = term_start(boundary - timedelta(days=1))
+    return boundary
+
+# Move sessions before `before` into the archive, one term per transaction. The
+# archive file is synced before the rows are deleted; rows already archived by an
+# interrupted run are skipped.
+def archive_history(before=None):
+    before = before or hot_boundary()
+    days = [day for (day,) in db.session.query(AttendanceSession.date).filter(AttendanceSession.date < before).distinct()]
+    moved = {}
+    for term in sorted({term_of(day) for day in days}):
+        first, last = term_range(term)
+        in_term = (AttendanceSession.date >= first, AttendanceSession.date <= last, AttendanceSession.date < before)
+        statement = select(*ARCHIVE_COLUMNS).select_from(AttendanceHistory).join(AttendanceSession) \
+            .join(Course).join(Student, Student.id == AttendanceHistory.student_id) \
+            .outerjoin(Teacher, Teacher.id == Course.teacher_id) \
+            .where(*in_term).order_by(AttendanceSession.date, AttendanceHistory.id)
+        archived = archive.ids(term)
+        moved[term] = archive.store(term, (row for row in db.session.execute(statement).mappings() if row['id'] not in archived))
+
+        sessions = select(AttendanceSession.id).where(*in_term)
+        db.session.execute(delete(AttendanceHistory).where(AttendanceHistory.session_id.in_(sessions)))
+        db.session.execute(delete(AttendanceSession).where(*in_term))
+        bump_versions(everything=True)
+        db.session.commit()
+    return moved
+
+# archived terms that overlap the requested days
+def archived_terms(start=None, end=None):
+    terms = []
+    for term in archive.terms():
+        first, last = term_range(term)
+        if (start is None or last >= start) and (end is None or first <= end):
+            terms.append(term)
+    return terms
+
+# Export rows from the archive and the hot table, oldest first, in HISTORY_COLUMNS order
+def history_rows(statement, teacher_id=None, course_id=None, status=None, start=None, end=None):
+    for row in archive.read(archived_terms(start, end), teacher_id, course_id, status, start, end):
+        yield row['student_id'], row['student_name'], row['course'], row['course_teacher'], row['status'], row['date_timein']
+    yield from export.stream_rows(db.session, statement)
+
+##### FINGERPRINT SLOTS #####
+slots = None
+slots_lock = Lock()
+
+# Allocator loaded from its table, or built by reconciling with the sensor the
+# first time (or from the students when the sensor cannot be read)
+def fingerprint_slots():
+    global slots
+    with slots_lock:
+        if slots is None:
+            row = db.session.get(FingerprintSlots, 1)
+            if row is not None:
+                slots = SlotAllocator.from_bytes(row.capacity, row.bitmap)
+        if slots is not None:
+            return slots
     try:
-        sms = serial.Serial('/dev/ttyUSB0', baudrate=9600, timeout=1)
-        if sms.is_open:
-            print("Serial port is open.")
-            return True
-        else:
-            print("Serial port could not be opened.")
-            return False
+        reconcile_fingerprints()
     except Exception as e:
         print("Error:", str(e))
+        with slots_lock:
+            if slots is None:
+                slots = SlotAllocator(DEFAULT_LIBRARY_SIZE, [fingerprint_id for (fingerprint_id,) in db.session.query(Student.fingerprint_id)])
+                save_slots()
+    return slots
+
+# library size of the R307/AS608 sensors, used until the sensor has been read
+DEFAULT_LIBRARY_SIZE = 162
+
+# stage the bitmap in the current transaction
+def save_slots(reconciled=False):
+    row = db.session.get(FingerprintSlots, 1)
+    if row is None:
+        row = FingerprintSlots(id=1, capacity=slots.capacity, bitmap=slots.to_bytes())
+        db.session.add(row)
+    row.capacity = slots.capacity
+    row.bitmap = slots.to_bytes()
+    if reconciled:
+        row.reconciled_at = datetime.now()
+
+# Delete a slot's template on every reader, so a reused slot never matches the
+# old finger on one of them. The result is the primary reader's.
+def delete_template(slot):
+    result = capture.delete(slot)
+    for reader in readers:
+        if reader is not readers.primary and reader.capture.delete(slot) != adafruit_fingerprint.OK:
+            print("Error:", 'could not delete slot %d on reader %s' % (slot, reader.name))
+    return result
+
+# Copy the template the primary reader holds in `location` onto every other
+# reader. Returns False when one of them did not take it.
+def copy_template(location, data=None):
+    others = [reader for reader in readers if reader is not readers.primary]
+    if not others:
+        return True
+    data = data or capture.download(location)
+    if data is None:
+        print("Error:", 'no template in slot %d to copy' % location)
+        return False
+    copied = True
+    for reader in others:
+        if reader.capture.upload(location, data) != adafruit_fingerprint.OK:
+            print("Error:", 'could not write slot %d on reader %s' % (location, reader.name))
+            copied = False
+    return copied
+
+# delete a student's template, the slot is only freed once the sensor confirmed it
+def delete_fingerprint(fingerprint_id):
+    if not fingerprint_id:
+        return False
+    if delete_template(fingerprint_id) != adafruit_fingerprint.OK:
         return False
+    fingerprint_slots().release(fingerprint_id)
+    save_slots()
+    return True
 
-def send_at_command(command):
-    sms.write(command.encode())
-    sleep(0.5)
-    response = sms.readlines()
-    return b"".join(response).decode()
-
-def get_fingerprint():
-    display.lcd_clear()
-    display.lcd_display_string("Place finger", 1)
-    while finger.get_image() != adafruit_fingerprint.OK:
-        pass
-    display.lcd_clear()
-    display.lcd_display_string("Templating", 1)
-    if finger.image_2_tz(1) != adafruit_fingerprint.OK:
-        display.lcd_clear()
-        display.lcd_display_string("Not found.", 1)
-        sleep(1)
+# Compare the sensor's template index with the students' fingerprint ids.
+# Orphaned templates (on the sensor, no student) stay reserved unless clean is
+# set; dangling students (no template) are only reported, they need re-enrolling.
+def reconcile_fingerprints(clean=False):
+    global slots
+    capacity, templates = capture.library()
+    students = dict(db.session.query(Student.fingerprint_id, Student.student_id))
+    orphaned = sorted(templates - set(students))
+    dangling = sorted(student_id for fingerprint_id, student_id in students.items() if fingerprint_id not in templates)
+    deleted = []
+    if clean:
+        for slot in orphaned:
+            if delete_template(slot) == adafruit_fingerprint.OK:
+                templates.discard(slot)
+                deleted.append(slot)
+    with slots_lock:
+        slots = SlotAllocator(capacity, templates | set(students))
+        save_slots(reconciled=True)
+        db.session.commit()
+    return {
+        'capacity': capacity,
+        'templates': len(templates),
+        'students': len(students),
+        'free': slots.free_count(),
+        'orphaned_templates': orphaned,
+        'deleted_templates': deleted,
+        'dangling_students': dangling,
+    }
+
+##### TEMPLATE BACKUP #####
+# download a student's template from the sensor (unless given) into the session
+def backup_template(student, data=None):
+    data = data or capture.download(student.fingerprint_id)
+    if not data:
         return False
-    display.lcd_clear()
-    display.lcd_display_string("Searching", 1)
-    if finger.finger_search() != adafruit_fingerprint.OK:
-        display.lcd_clear()
-        display.lcd_display_string("Not found.", 1)
-        sleep(1)
+    row = db.session.get(FingerprintTemplate, student.id) or FingerprintTemplate(student_id=student.id)
+    row.data = zlib.compress(data, 9)
+    row.checksum = sha256(data).hexdigest()
+    row.saved_at = datetime.now()
+    db.session.add(row)
+    return True
+
+def backup_templates(missing_only=True):
+    query = Student.query
+    if missing_only:
+        query = query.outerjoin(FingerprintTemplate).filter(FingerprintTemplate.student_id.is_(None))
+    saved = failed = 0
+    for student in query.all():
+        if backup_template(student):
+            saved += 1
+        else:
+            failed += 1
+    db.session.commit()
+    return saved, failed
+
+def backup_new_templates():
+    backup_templates(missing_only=True)
+
+# raw template bytes, ValueError when the backup does not match its checksum
+def template_data(row):
+    try:
+        data = zlib.decompress(row.data)
+    except zlib.error as e:
+        raise ValueError(str(e))
+    if sha256(data).hexdigest() != row.checksum:
+        raise ValueError('checksum mismatch')
+    return data
+
+# Write every backed up template into its student's slot, e.g. on a replacement
+# sensor or an extra reader, then rebuild the slot bitmap from what the primary
+# sensor now holds
+def restore_templates(target=None):
+    target = target or readers.primary.capture
+    started = monotonic()
+    restored = failed = corrupt = 0
+    rows = db.session.query(FingerprintTemplate, Student.fingerprint_id).join(Student).order_by(Student.fingerprint_id)
+    for row, fingerprint_id in rows.all():
+        try:
+            data = template_data(row)
+        except ValueError as e:
+            print("Error:", str(e))
+            corrupt += 1
+            continue
+        if target.upload(fingerprint_id, data) == adafruit_fingerprint.OK:
+            restored += 1
+        else:
+            failed += 1
+    # a target of its own (a spare sensor) does not open the readers to compare
+    if hardware.created('readers') and target is readers.primary.capture:
+        reconcile_fingerprints()
+    return {'restored': restored, 'failed': failed, 'corrupt': corrupt, 'seconds': monotonic() - started}
+
+##### COURSE RANGES #####
+# Each course's students sit in one contiguous range of sensor slots, so a scan
+# searches only that range instead of the whole library. A course gets
+# FINGERPRINT_COURSE_SLOTS slots at first; a full range grows in place, moves to
+# a free run twice its size, or all ranges are packed again. Courses without a
+# range (no room left for one) are searched in full.
+app.config.setdefault('FINGERPRINT_COURSE_SLOTS', 8)
+course_ranges = None
+ranges_lock = Lock()
+
+def fingerprint_ranges():
+    global course_ranges
+    if course_ranges is None:
+        course_ranges = {row.course_id: (row.start, row.count) for row in FingerprintRange.query}
+    return course_ranges
+
+# (start, count) pages a scan of the course searches, None for the whole library
+def search_pages(course_id):
+    return fingerprint_ranges().get(course_id)
+
+# stage a course's range (None drops it) in the current transaction
+def set_range(course_id, pages):
+    global course_ranges
+    row = db.session.get(FingerprintRange, course_id)
+    ranges = dict(fingerprint_ranges())
+    if pages is None:
+        if row is not None:
+            db.session.delete(row)
+        ranges.pop(course_id, None)
+    else:
+        if row is None:
+            row = FingerprintRange(course_id=course_id)
+            db.session.add(row)
+        row.start, row.count = pages
+        ranges[course_id] = pages
+    course_ranges = ranges
+
+# slots inside the ranges of the other courses
+def taken_by_others(course_id):
+    taken = 0
+    for other, (start, count) in fingerprint_ranges().items():
+        if other != course_id:
+            taken |= span(start, start + count)
+    return taken
+
+def course_students(course_id):
+    return Student.query.filter(Student.course_id == course_id, Student.fingerprint_id > 0).order_by(Student.fingerprint_id).all()
+
+# Free slot for a new student of the course, staged with the changed ranges.
+# None when the library is full.
+def allocate_fingerprint(course_id):
+    allocator = fingerprint_slots()
+    with ranges_lock:
+        pages = fingerprint_ranges().get(course_id)
+        if pages is not None:
+            slot = allocator.allocate(pages[0], pages[0] + pages[1])
+            if slot is not None:
+                return slot
+        pages = grow_range(course_id, pages)
+        if pages is not None:
+            return allocator.allocate(pages[0], pages[0] + pages[1])
+        # no room for a range: any slot the other ranges do not use, searched in full
+        slot = allocator.allocate(taken=taken_by_others(course_id))
+        if slot is not None:
+            set_range(course_id, None)
+        return slot
+
+# A range with room for at least one more student: the current one extended in
+# place, a free run elsewhere the course's templates move to, or the course's
+# range after packing all of them. None when the library has no room.
+def grow_range(course_id, pages):
+    allocator = fingerprint_slots()
+    students = course_students(course_id)
+    taken = taken_by_others(course_id)
+    size = max(app.config['FINGERPRINT_COURSE_SLOTS'], 2 * len(students), 2 * pages[1] if pages else 0)
+    if pages is not None and pages[0] + size <= allocator.capacity:
+        start, count = pages
+        if not span(start + count, start + size) & (taken | allocator.used):
+            set_range(course_id, (start, size))
+            return start, size
+    for length in (size, len(students) + 1):
+        start = allocator.find_run(length, taken)
+        if start is None:
+            continue
+        if not move_templates([(student, start + number) for number, student in enumerate(students)]):
+            return None
+        set_range(course_id, (start, length))
+        return start, length
+    ranges = compact_fingerprints(course_id)
+    return ranges.get(course_id) if ranges else None
+
+# Copy templates into new slots on every reader and point the students at them.
+# Every template is read (and backed up) before any is written, so the moves may
+# overlap; if writing fails half way, restore-templates puts them back.
+def move_templates(moves):
+    moves = [(student, slot) for student, slot in moves if student.fingerprint_id != slot]
+    if not moves:
+        return True
+    allocator = fingerprint_slots()
+    primary = readers.primary.capture
+    with primary.lock:
+        data = {}
+        for student, slot in moves:
+            template = primary.download(student.fingerprint_id)
+            if template is None:
+                row = db.session.get(FingerprintTemplate, student.id)
+                try:
+                    template = template_data(row) if row is not None else None
+                except ValueError as e:
+                    print("Error:", str(e))
+            if template is None:
+                print("Error:", 'no template for student %s' % student.student_id)
+                return False
+            data[student.id] = template
+            backup_template(student, template)
+        db.session.commit()
+        for reader in readers:
+            for student, slot in moves:
+                if reader.capture.upload(slot, data[student.id]) != adafruit_fingerprint.OK:
+                    print("Error:", 'could not write slot %d on reader %s' % (slot, reader.name))
+                    if reader is readers.primary:
+                        return False
+        vacated = {student.fingerprint_id for student, slot in moves} - {slot for student, slot in moves}
+        for reader in readers:
+            for slot in vacated:
+                reader.capture.delete(slot)
+    courses = set()
+    for student, slot in moves:
+        courses.add(student.course_id)
+        allocator.release(student.fingerprint_id)
+    for student, slot in moves:
+        allocator.reserve(slot)
+        student.fingerprint_id = slot
+    save_slots()
+    rosters.invalidate(*courses)
+    return True
+
+# Pack the ranges of all courses from the first slot, each with room for
+# FINGERPRINT_COURSE_SLOTS more students (twice that for `grow`), moving the
+# templates into them. Slots of templates no student owns are left alone.
+# Returns the new ranges, None when they do not fit or templates could not move.
+def compact_fingerprints(grow=None):
+    allocator = fingerprint_slots()
+    students = {}
+    for student in Student.query.filter(Student.fingerprint_id > 0).order_by(Student.fingerprint_id):
+        students.setdefault(student.course_id, []).append(student)
+    courses = set(students) | set(fingerprint_ranges()) | ({grow} if grow is not None else set())
+    owned = sum(1 << student.fingerprint_id for rows in students.values() for student in rows)
+    orphans = allocator.used & ~owned
+    def plan(headroom):
+        layout = {}
+        taken = orphans
+        for course_id in sorted(courses, key=lambda course_id: -len(students.get(course_id, []))):
+            count = len(students.get(course_id, []))
+            size = max(count + 2 * headroom, count + 1) if course_id == grow else count + headroom
+            if size == 0:
+                continue
+            start = SlotAllocator(allocator.capacity, taken, allocator.first).find_run(size)
+            if start is None:
+                return None
+            layout[course_id] = (start, size)
+            taken |= span(start, start + size)
+        return layout
+    # less room to spare per course until everything fits
+    headroom = app.config['FINGERPRINT_COURSE_SLOTS']
+    layout = plan(headroom)
+    while layout is None and headroom:
+        headroom //= 2
+        layout = plan(headroom)
+    if layout is None:
+        return None
+    moves = [(student, layout[course_id][0] + number) for course_id, rows in students.items() for number, student in enumerate(rows)]
+    if not move_templates(moves):
+        return None
+    for course_id in courses:
+        set_range(course_id, layout.get(course_id))
+    db.session.commit()
+    return layout
+
+@app.route('/fingerprints/reconcile', methods=["POST"])
+@login_required
+def fingerprints_reconcile():
+    if current_user.username != 'admin':
+        return redirect(url_for('index'))
+    return jsonify(reconcile_fingerprints(request.args.get('clean') == '1'))
+
+def reconcile_at_startup():
+    with app.app_context():
+        try:
+            reconcile_fingerprints()
+        except Exception as e:
+            print("Error:", str(e))
+
+startup = Thread(target=reconcile_at_startup, name='fingerprint-reconcile', daemon=True)
+
+outbox = OutboxWorker(app, db, SmsOutbox, send_sms, unconfirmed=(drivers.SendUnconfirmed,))
+# maintenance does not open the readers just to find out they are idle
+maintenance = storage.Maintenance(app, db, idle=lambda: not hardware.created('readers') or readers.idle(), jobs=[(archive_history, 86400), (backup_new_templates, 86400)])
+
+@app.before_request
+def start_timer():
+    g.started = perf_counter()
+
+@app.after_request
+def record_request(response):
+    if 'started' in g:
+        endpoint = request.endpoint or 'unmatched'
+        metrics.observe('attendance_http_request_seconds', perf_counter() - g.started, endpoint=endpoint)
+        metrics.inc('attendance_http_requests_total', endpoint=endpoint, status=response.status_code)
+    return response
+
+@app.before_request
+def start_workers():
+    outbox.start()
+    maintenance.start()
+    if startup.ident is None:
+        with slots_lock:
+            if startup.ident is None:
+                startup.start()
+
+# simulator only: a student puts `person`'s finger on a reader and presses its button
+@app.route('/simulator/touch', methods=["POST"])
+@login_required
+def simulator_touch():
+    reader = readers.get(request.values.get('reader'))
+    if simulator is None or reader is None:
+        return jsonify({'error': 'no simulated reader'}), 404
+    simulator.touch(reader.port, request.values.get('person', 'student'), button=reader.button)
+    return jsonify(simulator.stats())
+
+def metrics_allowed():
+    return request.remote_addr in app.config['METRICS_ALLOW'] or current_user.is_authenticated
+
+@app.route('/metrics')
+def metrics_export():
+    if not metrics_allowed():
+        return login_manager.unauthorized()
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+# p50/p95 per stage as a text table; ?lcd=1 also puts the slowest stages on the LCD
+@app.route('/metrics/summary')
+def metrics_summary():
+    if not metrics_allowed():
+        return login_manager.unauthorized()
+    rows = []
+    for name, labels, count, p50, p95 in metrics.summary():
+        if name == 'attendance_http_request_seconds':
+            label = 'http ' + labels['endpoint']
+        else:
+            label = ' '.join(str(value) for key, value in sorted(labels.items()) if key != 'reader')
+            label = '%s %s' % (name[len('attendance_'):-len('_seconds')], label)
+        rows.append((label, count, p50 * 1000, p95 * 1000))
+    lines = ['%-40s %7s %9s %9s' % ('stage', 'count', 'p50 ms', 'p95 ms')]
+    lines += ['%-40s %7d %9.1f %9.1f' % row for row in rows]
+    if request.args.get('lcd'):
+        stages = [row for row in rows if row[0].startswith('stage ')]
+        slowest = sorted(stages, key=lambda row: row[3], reverse=True)[:4]
+        display.show(*['%-10.10s%4.0f/%5.0f' % (row[0][len('stage '):], row[2], row[3]) for row in slowest], duration=5, key='metrics')
+    return Response('\n'.join(lines) + '\n', mimetype='text/plain')
+
+@app.route('/outbox/status')
+@login_required
+def outbox_status():
+    return jsonify(outbox.stats())
+
+# a reader without a button keeps polling, so its timeouts are not shown.
+# pages limits the search to a course's range of slots.
+def get_fingerprint(reader, cancelled=None, pages=None):
+    if reader.button is not None:
+        display.show("Place finger")
+    started = perf_counter()
+    i = reader.capture.identify(cancelled, progress=lambda phase: display.show("Templating" if phase == 'template' else "Searching", key='scan'), pages=pages)
+    result = {adafruit_fingerprint.OK: 'match', drivers.TIMEOUT: 'timeout', drivers.CANCELLED: 'cancelled'}.get(i, 'not_found')
+    metrics.observe('attendance_stage_seconds', perf_counter() - started, stage='identify')
+    metrics.inc('attendance_scans_total', result=result, reader=reader.name)
+    if i == drivers.CANCELLED:
+        display.clear()
+        return False
+    if i == drivers.TIMEOUT:
+        if reader.button is not None:
+            display.show("No finger.", duration=1, priority=drivers.PRIORITY_HIGH)
+        return False
+    if i != adafruit_fingerprint.OK:
+        display.show("Not found.", duration=1, priority=drivers.PRIORITY_HIGH)
         return False
 
-    display.lcd_clear()
-    display.lcd_display_string("Success", 1)
+    display.show("Success", priority=drivers.PRIORITY_HIGH)
     return True
 
+##### SCANNER #####
+def wait_for_button(reader, timeout):
+    if reader.button is None:
+        return True
+    return GPIO.wait_for_edge(reader.button, GPIO.FALLING, timeout=int(timeout * 1000)) is not None
+
+def capture_fingerprint(reader, cancelled):
+    if reader.button is not None:
+        reader.capture.wake()
+        display.show("", "Button pressed.", duration=2)
+    # the scanner worker only has the app context around on_match
+    with app.app_context():
+        pages = search_pages(reader.scanner.status().get('course_id'))
+    if get_fingerprint(reader, cancelled, pages):
+        return reader.capture.finger.finger_id
+    return None
+
+# one scanner worker per reader
+def attach_scanner(reader):
+    reader.scanner = Scanner(partial(wait_for_button, reader), partial(capture_fingerprint, reader), partial(mark_present, reader), context=app.app_context)
+
 @app.route('/students/add', methods=["POST", "GET"])
 @login_required
 def students_add():
-    MAX_FINGERPRINT_ID = 162
-    courses = Course.query.filter_by(course_teacher=current_user.firstname+' '+current_user.lastname)
+    courses = Course.query.filter_by(teacher_id=current_user.id)
 
     if current_user.username == 'admin':
             return redirect(url_for('admin'))
@@ -357,7 +1587,7 @@ def students_add():
             lastname = request.form.get('lastname')
             firstname = request.form.get('firstname')
             middlename = request.form.get('middlename')
-            course = request.form.get('course_name')
+            course = request.form.get('course_id', type=int)
             parentphone = request.form.get('parentphone')
 
             #Checking
@@ -365,147 +1595,125 @@ def students_add():
             
             if student_check:
                 flash('Student Exists. Try again.')
-                display.lcd_clear()
-                display.lcd_display_string("Student Exists", 1)
-                display.lcd_display_string("Try again.", 2)
-                sleep(2)
+                display.show("Student Exists", "Try again.", duration=2)
                 return redirect(url_for('students_add'))
 
-            # Check if the fingerprint_id is available
-            available_fingerprint = None
-            existing_students = Student.query.all()
-            all_fingerprint_ids = set(student.fingerprint_id for student in existing_students)
-
-            for i in range(1, MAX_FINGERPRINT_ID + 1):
-                if i not in all_fingerprint_ids:
-                    available_fingerprint = i
-                    break
+            # Take a free fingerprint slot in the course's range
+            available_fingerprint = allocate_fingerprint(course)
 
             if available_fingerprint is None:
                 return "No available fingerprint_id, cannot add a new student."
 
             # Commit Data into Database
-            new_student = Student(lastname=lastname, firstname=firstname, middlename=middlename, course_name=course, student_id=studentid, teacher_name=current_user.firstname+' '+current_user.lastname, parent_phone=parentphone, fingerprint_id=available_fingerprint)
+            new_student = Student(lastname=lastname, firstname=firstname, middlename=middlename, course_id=course, student_id=studentid, parent_phone=parentphone, fingerprint_id=available_fingerprint)
 
             db.session.add(new_student)
+            save_slots()
+            bump_versions(courses=[course])
             db.session.commit()
+            rosters.invalidate(course)
 
-            # Query into Students and get ID
-            query = Student.query.filter_by(student_id=studentid).first()
-
-            location = query.fingerprint_id
+            location = new_student.fingerprint_id
             
             # Wait for a finger to be read
-            enroll(location)
-            sleep(2)
-            display.lcd_clear()
+            started = perf_counter()
+            enrolled = enroll(location)
+            metrics.observe('attendance_stage_seconds', perf_counter() - started, stage='enroll')
+            metrics.inc('attendance_enrollments_total', result='ok' if enrolled else 'failed')
+            if not enrolled:
+                db.session.delete(new_student)
+                slots.release(location)
+                save_slots()
+                bump_versions(courses=[course])
+                db.session.commit()
+                flash('Fingerprint enrollment failed. Try again.')
+                return redirect(url_for('students_add'))
+            display.clear()
+
+            # Keep a copy of the template for restoring onto a replacement sensor
+            try:
+                with metrics.timer('attendance_stage_seconds', stage='template_backup'):
+                    backup_template(new_student)
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                print("Error:", str(e))
 
+            publish_student('added', new_student, course)
             return redirect(url_for('index'))
             
-        display.lcd_clear()
-        display.lcd_display_string("Student Attendance", 1)
-        display.lcd_display_string("System", 2)
-        display.lcd_display_string("Students Add", 4)
+        display.show("Student Attendance", "System", "", "Students Add", priority=drivers.PRIORITY_LOW, key='banner', ttl=5)
         return render_template("students-add.html", courses=courses)
 
 #Fingerprint Enroll
-def enroll(location):
-    for fingerimg in range(1, 3):
-        if fingerimg == 1:
-            display.lcd_clear()
-            display.lcd_display_string("Place finger", 1)
-        else:
-            display.lcd_clear()
-            display.lcd_display_string("Place again", 1)
-
-        while True:
-            i = finger.get_image()
-            if i == adafruit_fingerprint.OK:
-                display.lcd_clear()
-                display.lcd_display_string("Image taken", 1)
-                break
-            if i == adafruit_fingerprint.NOFINGER:
-                display.lcd_clear()
-                display.lcd_display_string("Place finger", 1)
-            elif i == adafruit_fingerprint.IMAGEFAIL:
-                display.lcd_clear()
-                display.lcd_display_string("Imaging error", 1)
-            else:
-                display.lcd_clear()
-                display.lcd_display_string("Other error", 1)
-            # Add a delay here to allow the user to see the error message
-            sleep(2)
-            display.lcd_clear()
-
-        display.lcd_display_string("Templating...", 1)
-        while True:
-            i = finger.image_2_tz(fingerimg)
-            if i == adafruit_fingerprint.OK:
-                display.lcd_clear()
-                display.lcd_display_string("Templated", 1)
-                break
+ENROLL_ATTEMPTS = 3
+
+def enroll(location, cancelled=None):
+    with capture.lock:
+        for fingerimg in range(1, 3):
+            if fingerimg == 1:
+                display.show("Place finger", key='enroll')
             else:
+                display.show("Place again", key='enroll')
+
+            capture.wake()
+            for attempt in range(ENROLL_ATTEMPTS):
+                i = capture.wait_image(cancelled)
+                if i in (drivers.TIMEOUT, drivers.CANCELLED):
+                    display.show("No finger.", duration=2)
+                    return False
+                display.show("Image taken", key='enroll')
+
+                display.show("Templating...", key='enroll')
+                i = capture.template(fingerimg)
+                if i == adafruit_fingerprint.OK:
+                    display.show("Templated", key='enroll')
+                    break
                 if i == adafruit_fingerprint.IMAGEMESS:
-                    display.lcd_clear()
-                    display.lcd_display_string("Image too messy", 1)
+                    display.show("Image too messy", duration=2)
                 elif i == adafruit_fingerprint.FEATUREFAIL:
-                    display.lcd_clear()
-                    display.lcd_display_string("Could not identify features", 1)
+                    display.show("Could not identify features", duration=2)
                 elif i == adafruit_fingerprint.INVALIDIMAGE:
-                    display.lcd_clear()
-                    display.lcd_display_string("Image invalid", 1)
+                    display.show("Image invalid", duration=2)
                 else:
-                    display.lcd_clear()
-                    display.lcd_display_string("Other error", 1)
-                # Add a delay here to allow the user to see the error message
-                sleep(2)
-                display.lcd_clear()
-
-        if fingerimg == 1:
-            display.lcd_clear()
-            display.lcd_display_string("Remove finger", 1)
-            sleep(1)
-            while i != adafruit_fingerprint.NOFINGER:
-                i = finger.get_image()
-    
-    display.lcd_clear()
-    display.lcd_display_string("Creating model...", 1)
-    while True:
-        i = finger.create_model()
+                    display.show("Other error", duration=2)
+                # A new image is needed before templating again
+                display.show("Place finger", key='enroll')
+                capture.wait_removed(cancelled)
+                capture.wake()
+            else:
+                return False
+
+            if fingerimg == 1:
+                display.show("Remove finger", duration=1)
+                if capture.wait_removed(cancelled) != adafruit_fingerprint.NOFINGER:
+                    return False
+        
+        display.show("Creating model...")
+        i = capture.create_model()
         if i == adafruit_fingerprint.OK:
-            display.lcd_clear()
-            display.lcd_display_string("Fingerprint", 1)
-            display.lcd_display_string("Created", 2)
-            break
-        elif i == adafruit_fingerprint.ENROLLMISMATCH:
-            display.lcd_clear()
-            display.lcd_display_string("Prints did not match", 1)
+            display.show("Fingerprint", "Created")
         else:
-            display.lcd_clear()
-            display.lcd_display_string("Other error", 1)
-        
-        # Add a delay here to allow the user to see the error message
-        sleep(2)
-        display.lcd_clear()
-
-    display.lcd_display_string("Adding Student", 1)
-    i = finger.store_model(location)
-    if i == adafruit_fingerprint.OK:
-        display.lcd_clear()
-        display.lcd_display_string("Student Added", 1)
-    else:
-        if i == adafruit_fingerprint.BADLOCATION:
-            display.lcd_clear()
-            display.lcd_display_string("Bad storage location", 1)
-        elif i == adafruit_fingerprint.FLASHERR:
-            display.lcd_clear()
-            display.lcd_display_string("Flash storage error", 1)
+            if i == adafruit_fingerprint.ENROLLMISMATCH:
+                display.show("Prints did not match", duration=2)
+            else:
+                display.show("Other error", duration=2)
+            return False
+
+        display.show("Adding Student")
+        i = capture.store(location)
+        if i == adafruit_fingerprint.OK:
+            # the other readers recognise the student too
+            copy_template(location)
+            display.show("Student Added", duration=2)
         else:
-            display.lcd_clear()
-            display.lcd_display_string("Other error", 1)
-        # Add a delay here to allow the user to see the error message
-        sleep(2)
-        display.lcd_clear()
+            if i == adafruit_fingerprint.BADLOCATION:
+                display.show("Bad storage location", duration=2)
+            elif i == adafruit_fingerprint.FLASHERR:
+                display.show("Flash storage error", duration=2)
+            else:
+                display.show("Other error", duration=2)
+            return False
 
     return True
 
@@ -519,21 +1727,39 @@ def students_update(id):
             return redirect(url_for('admin'))
     else:
         if request.method == "POST":
+            old_course = student.course_id
+            new_course = request.form.get('course_id', type=int)
+
+            # the template follows the student into the new course's range. With
+            # no slot left the student would keep one the new course's scans do
+            # not search, so the move is refused.
+            if new_course != old_course and student.fingerprint_id:
+                slot = allocate_fingerprint(new_course)
+                if slot is None:
+                    db.session.rollback()
+                    flash('No fingerprint slot is free for that course. The student was not moved.')
+                    display.show("No free slot", "Try again.", duration=2)
+                    return redirect(url_for('students_update', id=student.id))
+                if not move_templates([(student, slot)]):
+                    slots.release(slot)
+                    set_range(new_course, None)
+
             student.student_id = request.form.get('studentid')
             student.lastname = request.form.get('lastname')
             student.firstname = request.form.get('firstname')
             student.middlename = request.form.get('middlename')
-            student.course_name = request.form.get('coursename')
+            student.course_id = new_course
             student.parent_phone = request.form.get('parentphone')
 
+            bump_versions(courses=[old_course, student.course_id])
             db.session.commit()
+            rosters.invalidate(old_course, student.course_id)
+            for course_id in {old_course, student.course_id}:
+                publish_student('updated', student, course_id)
 
             return redirect(url_for('index'))
             
-        display.lcd_clear()
-        display.lcd_display_string("Student Attendance", 1)
-        display.lcd_display_string("System", 2)
-        display.lcd_display_string("Students Update", 4)
+        display.show("Student Attendance", "System", "", "Students Update", priority=drivers.PRIORITY_LOW, key='banner', ttl=5)
         return render_template("students-update.html", courses=courses, student=student)
 
 
@@ -544,32 +1770,24 @@ def students_delete(id):
     if current_user.username == 'admin':
         return redirect(url_for('admin'))
     else:
-        display.lcd_clear()
-        display.lcd_display_string("Deleting Student", 1)
-        display.lcd_display_string(f"{ student.firstname+' '+student.lastname }", 2)
-        sleep(2)
-
-        if finger.delete_model(student.fingerprint_id) == adafruit_fingerprint.OK:
-            display.lcd_clear()
-            display.lcd_display_string("Student Fingerprint", 1)
-            display.lcd_display_string("Deleted...", 2)
-            sleep(2)
-
-        history = None
-
-        if student:
-            history = AttendanceHistory.query.filter_by(student_id=student.student_id).first()
+        display.show("Deleting Student", f"{ student.firstname+' '+student.lastname }", duration=2)
 
-        if history:
-            db.session.delete(history)
+        if delete_fingerprint(student.fingerprint_id):
+            display.show("Student Fingerprint", "Deleted...", duration=2)
 
+        db.session.execute(delete(AttendanceHistory).where(AttendanceHistory.student_id == student.id))
+        db.session.execute(delete(StudentTermStats).where(StudentTermStats.student_id == student.id))
+        db.session.execute(delete(FingerprintTemplate).where(FingerprintTemplate.student_id == student.id))
         db.session.delete(student)
+        db.session.flush()
+        recount_course(student.course_id)
+        bump_versions(courses=[student.course_id])
 
-        display.lcd_clear()
-        display.lcd_display_string("Student Deleted...", 1)
-        sleep(2)
+        display.show("Student Deleted...", duration=2)
 
         db.session.commit()
+        rosters.invalidate(student.course_id)
+        publish_student('deleted', student, student.course_id)
 
         return redirect(url_for('index'))
 
@@ -580,35 +1798,147 @@ def students_delete(id):
 @app.route('/clear-fingerprint')
 @login_required
 def clear_fingerprint():
+    for reader in readers:
+        if reader is not readers.primary and reader.capture.finger.empty_library() != adafruit_fingerprint.OK:
+            print("Error:", 'could not empty reader %s' % reader.name)
     if finger.empty_library() == adafruit_fingerprint.OK:
-        display.lcd_clear()
-        display.lcd_display_string("Library empty!", 1)
-        sleep(2)
-        display.lcd_clear()
-        return redirect(url_for('students_list'))
+        display.show("Library empty!", duration=2)
+        display.clear()
+        reconcile_fingerprints()
+        return redirect(url_for('index'))
     else:
-        display.lcd_clear()
+        display.clear()
         print("Failed to empty library")
-        sleep(2)
-        display.lcd_clear()
 ################ ADMIN DASHBOARD ################
 @app.route('/admin')
 @login_required
 def admin():
     if current_user.username == 'admin':
-        teacher = Teacher.query.filter(Teacher.username!='admin').all()
-        course = Course.query.all()
-        student = Student.query.all()
-
-        display.lcd_display_string("Student Attendance", 1)
-        display.lcd_display_string("System", 2)
-        display.lcd_display_string("", 3)
-        display.lcd_display_string("Welcome Admin", 4)
+        display.show("Student Attendance", "System", "", "Welcome Admin", priority=drivers.PRIORITY_LOW, key='banner', ttl=5)
 
-        return render_template("admin.html", fullname=current_user.firstname, teacher=teacher, course=course, student=student)
+        return cached_page('admin', ['teacher:%d' % current_user.id], lambda: render_template("admin.html", fullname=current_user.firstname))
     else:
         return redirect(url_for('index'))
 
+################ TABLE DATA ################
+# JSON pages for the dataTables on the dashboard and admin pages
+
+def timestamp(value):
+    return value.strftime('%Y-%m-%d %H:%M:%S')
+
+HISTORY_COLUMNS = [
+    Column('student_id', Student.student_id),
+    Column('student_name', Student.firstname + ' ' + Student.lastname),
+    Column('course', Course.course_name),
+    Column('course_teacher', Teacher.firstname + ' ' + Teacher.lastname),
+    Column('status', AttendanceHistory.status),
+    Column('date_timein', AttendanceHistory.date_timein, format=timestamp),
+]
+
+STUDENT_COLUMNS = [
+    Column('student_id', Student.student_id),
+    Column('lastname', Student.lastname),
+    Column('firstname', Student.firstname),
+    Column('parent_phone', Student.parent_phone),
+    Column('course_name', Course.course_name),
+]
+
+TEACHER_COLUMNS = [
+    Column('teacher_id', Teacher.teacher_id),
+    Column('lastname', Teacher.lastname),
+    Column('firstname', Teacher.firstname),
+    Column('username', Teacher.username),
+]
+
+COURSE_COLUMNS = [
+    Column('course_name', Course.course_name),
+    Column('course_code', Course.course_code),
+    Column('course_units', Course.course_units),
+    Column('course_teacher', Teacher.firstname + ' ' + Teacher.lastname),
+]
+
+@app.route('/dashboard/histories')
+@login_required
+def dashboard_histories():
+    base = select(AttendanceHistory.id).join(AttendanceSession).join(Course).join(Student, Student.id == AttendanceHistory.student_id) \
+        .join(Teacher, Teacher.id == Course.teacher_id).where(Course.teacher_id == current_user.id)
+    return jsonify(datatable(db.session, base, AttendanceHistory.id, HISTORY_COLUMNS, request.args))
+
+@app.route('/dashboard/students')
+@login_required
+def dashboard_students():
+    base = select(Student.id).join(Course).where(Course.teacher_id == current_user.id)
+    return jsonify(datatable(db.session, base, Student.id, STUDENT_COLUMNS, request.args))
+
+@app.route('/admin/teachers')
+@login_required
+def admin_teachers():
+    if current_user.username != 'admin':
+        return redirect(url_for('index'))
+    base = select(Teacher.id).where(Teacher.username != 'admin')
+    return jsonify(datatable(db.session, base, Teacher.id, TEACHER_COLUMNS, request.args))
+
+@app.route('/admin/courses')
+@login_required
+def admin_courses():
+    if current_user.username != 'admin':
+        return redirect(url_for('index'))
+    base = select(Course.id).outerjoin(Teacher, Teacher.id == Course.teacher_id)
+    return jsonify(datatable(db.session, base, Course.id, COURSE_COLUMNS, request.args))
+
+@app.route('/admin/students')
+@login_required
+def admin_students():
+    if current_user.username != 'admin':
+        return redirect(url_for('index'))
+    base = select(Student.id).join(Course)
+    return jsonify(datatable(db.session, base, Student.id, STUDENT_COLUMNS, request.args))
+
+################ EXPORT ################
+# Attendance history as CSV or XLSX, streamed while it is read from the database.
+#   /download?format=xlsx&start=2023-08-01&end=2023-08-31&course=4&status=Present
+# Teachers export their own courses, admin everyone's or /download/<teacher id>.
+@app.route('/download', defaults={'id': None})
+@app.route('/download/<int:id>')
+@login_required
+def download(id):
+    if current_user.username == 'admin':
+        teacher_id = id
+    elif id in (None, current_user.id):
+        teacher_id = current_user.id
+    else:
+        return redirect(url_for('error404'))
+
+    file_format = request.args.get('format', 'csv')
+    if file_format not in export.FORMATS:
+        file_format = 'csv'
+    start = request.args.get('start', type=date.fromisoformat)
+    end = request.args.get('end', type=date.fromisoformat)
+    course_id = request.args.get('course', type=int)
+    status = request.args.get('status')
+
+    statement = select(*[column.expression for column in HISTORY_COLUMNS]).select_from(AttendanceHistory) \
+        .join(AttendanceSession).join(Course).join(Student, Student.id == AttendanceHistory.student_id) \
+        .outerjoin(Teacher, Teacher.id == Course.teacher_id)
+    if teacher_id is not None:
+        statement = statement.where(Course.teacher_id == teacher_id)
+    if start:
+        statement = statement.where(AttendanceSession.date >= start)
+    if end:
+        statement = statement.where(AttendanceSession.date <= end)
+    if course_id:
+        statement = statement.where(Course.id == course_id)
+    if status:
+        statement = statement.where(AttendanceHistory.status == status)
+    statement = statement.order_by(AttendanceSession.date, AttendanceHistory.session_id, AttendanceHistory.id)
+
+    header = ['Student ID', 'Student Name', 'Course Name', 'Course Teacher', 'Status', 'Time In']
+    writer, mimetype = export.FORMATS[file_format]
+    rows = history_rows(statement, teacher_id, course_id, status, start, end)
+    filename = 'attendance-%s.%s' % (date.today().isoformat(), file_format)
+    return Response(stream_with_context(writer(header, rows)), mimetype=mimetype,
+                    headers={'Content-Disposition': 'attachment; filename=%s' % filename})
+
 ################ COURSES ################
 @app.route('/courses/add', methods=["POST", "GET"])
 @login_required
@@ -622,39 +1952,29 @@ def addcourse():
                 course_code = request.form.get('coursecode')
                 course_description = request.form.get('coursedescription')
                 course_units = request.form.get('courseunits')
-                course_teacher = request.form.get('courseteacher')
+                course_teacher = request.form.get('courseteacher', type=int)
                 #Checking
                 course_check = Course.query.filter_by(course_code=course_code).first()
                 
                 if course_check:
                     flash('Course Exists. Try again.')
-                    display.lcd_clear()
-                    display.lcd_display_string("Course Exists", 1)
-                    display.lcd_display_string("Try again.", 2)
-                    sleep(2)
+                    display.show("Course Exists", "Try again.", duration=2)
                     return redirect(url_for('courses_add'))
-                new_course = Course(course_name=course_name, course_code=course_code, course_description=course_description, course_units=course_units, course_teacher=course_teacher)
+                new_course = Course(course_name=course_name, course_code=course_code, course_description=course_description, course_units=course_units, teacher_id=course_teacher)
 
-                display.lcd_clear()
-                display.lcd_display_string("Adding course...", 1)
-                sleep(2)
+                display.show("Adding course...", duration=2)
 
                 db.session.add(new_course)
+                bump_versions(teachers=[course_teacher])
                 db.session.commit()
 
-                display.lcd_clear()
-                display.lcd_display_string("Course Added", 1)
-                sleep(2)
+                display.show("Course Added", duration=2)
 
                 return redirect(url_for('admin'))
         else:
             flash('Add a Teacher First before proceeding to add course.')
         teachers = Teacher.query.filter(Teacher.username!='admin').all()
-        display.lcd_clear()
-        display.lcd_display_string("Student Attendance", 1)
-        display.lcd_display_string("System", 2)
-        display.lcd_display_string("", 3)
-        display.lcd_display_string("Add Course", 4)
+        display.show("Student Attendance", "System", "", "Add Course", priority=drivers.PRIORITY_LOW, key='banner', ttl=5)
         return render_template("courses-add.html", teachers=teachers, fullname=current_user.firstname+' '+current_user.lastname)
     else:
         return redirect(url_for('admin'))
@@ -669,28 +1989,38 @@ def deletecourse(id):
             abort(404)
 
         course_name = course.course_name
-        students = Student.query.filter_by(course_name=course_name).all()
 
-        display.lcd_clear()
-        display.lcd_display_string("Deleting Course", 1)
-        display.lcd_display_string(f"{course_name}", 2)
-        sleep(2)
-        
-        if students:
-            for student in students:
-                db.session.delete(student)
+        display.show("Deleting Course", f"{course_name}", duration=2)
 
+        for (fingerprint_id,) in db.session.query(Student.fingerprint_id).filter_by(course_id=course.id):
+            delete_fingerprint(fingerprint_id)
+
+        bump_versions(courses=[course.id])
+        delete_course_rows(course.id)
         db.session.delete(course)
 
-        display.lcd_clear()
-        display.lcd_display_string("Course Deleted...", 1)
-        sleep(2)
+        display.show("Course Deleted...", duration=2)
 
         db.session.commit()
+        rosters.invalidate(course.id)
+        publish('course', {'action': 'deleted', 'id': course.id}, course.id, course.teacher_id)
 
         return redirect(url_for('index'))
     return redirect(url_for('index'))
 
+# Attendance, sessions, students and slot range of a course, by index instead
+# of row by row
+def delete_course_rows(course_id):
+    set_range(course_id, None)
+    sessions = db.session.query(AttendanceSession.id).filter_by(course_id=course_id)
+    db.session.execute(delete(AttendanceHistory).where(AttendanceHistory.session_id.in_(sessions.scalar_subquery())))
+    db.session.execute(delete(AttendanceSession).where(AttendanceSession.course_id == course_id))
+    db.session.execute(delete(CourseDayStats).where(CourseDayStats.course_id == course_id))
+    students = db.session.query(Student.id).filter_by(course_id=course_id)
+    db.session.execute(delete(StudentTermStats).where(StudentTermStats.student_id.in_(students.scalar_subquery())))
+    db.session.execute(delete(FingerprintTemplate).where(FingerprintTemplate.student_id.in_(students.scalar_subquery())))
+    db.session.execute(delete(Student).where(Student.course_id == course_id))
+
 ################ TEACHERS ################
 @app.route('/teachers/add', methods=["POST", "GET"])
 @login_required
@@ -712,30 +2042,20 @@ def addteacher():
             
             if user:
                 flash('Teacher Exists. Try again.')
-                display.lcd_clear()
-                display.lcd_display_string("Teacher Exists", 1)
-                display.lcd_display_string("Try again.", 2)
-                sleep(2)
+                display.show("Teacher Exists", "Try again.", duration=2)
                 return redirect(url_for('addteacher'))
             
-            new_user = Teacher(teacher_id=teacher_id, lastname=lastname, firstname=firstname, middlename=middlename, gender=gender, username=username, password=generate_password_hash(password))
+            new_user = Teacher(teacher_id=teacher_id, lastname=lastname, firstname=firstname, middlename=middlename, gender=gender, username=username, password=passwords.hash(password))
             
-            display.lcd_clear()
-            display.lcd_display_string("Adding Teacher...", 1)
-            sleep(2)
+            display.show("Adding Teacher...", duration=2)
 
             db.session.add(new_user)
             db.session.commit()
             
-            display.lcd_clear()
-            display.lcd_display_string("Teacher Added", 1)
-            sleep(2)
+            display.show("Teacher Added", duration=2)
             
             return redirect(url_for('index'))
-        display.lcd_clear()
-        display.lcd_display_string("Student Attendance", 1)
-        display.lcd_display_string("System", 2)
-        display.lcd_display_string("Add Teacher", 4)
+        display.show("Student Attendance", "System", "", "Add Teacher", priority=drivers.PRIORITY_LOW, key='banner', ttl=5)
         return render_template("addteacher.html", fullname=current_user.firstname+' '+current_user.lastname)
     return redirect(url_for('index'))
 
@@ -752,24 +2072,19 @@ def updateteacher(id):
             teacher.middlename = request.form['middlename']
             teacher.gender = request.form['gender']
             teacher.username = teacher.lastname.lower() + teacher.firstname[0].lower() + random_numbers
-            teacher.password = generate_password_hash(request.form['password'])
+            teacher.password = passwords.hash(request.form['password'])
 
-            display.lcd_clear()
-            display.lcd_display_string("Updating Teacher", 1)
-            sleep(2)
+            display.show("Updating Teacher", duration=2)
 
+            bump_versions(teachers=[teacher.id])
             db.session.commit()
+            identities.invalidate(teacher.id)
 
-            display.lcd_clear()
-            display.lcd_display_string("Teacher Updated", 1)
-            sleep(2)
+            display.show("Teacher Updated", duration=2)
 
             return redirect(url_for('index'))
         else:
-            display.lcd_clear()
-            display.lcd_display_string("Student Attendance", 1)
-            display.lcd_display_string("System", 2)
-            display.lcd_display_string("Update Teacher", 4)
+            display.show("Student Attendance", "System", "", "Update Teacher", priority=drivers.PRIORITY_LOW, key='banner', ttl=5)
 
             return render_template("updateteacher.html", teacher=teacher)
     return redirect(url_for('index'))
@@ -783,43 +2098,33 @@ def deleteteacher(id):
             abort(404)  # Return 404 Not Found error page
         
         # Find all students associated with the teacher
-        teacher_name = teacher.firstname + ' ' + teacher.lastname
-        students = Student.query.filter_by(teacher_name=teacher_name).all()
-        courses = Course.query.filter_by(course_teacher=teacher_name).all()
+        courses = Course.query.filter_by(teacher_id=teacher.id).all()
+        fingerprint_ids = [fingerprint_id for (fingerprint_id,) in db.session.query(Student.fingerprint_id).join(Course).filter(Course.teacher_id == teacher.id)]
 
-        display.lcd_clear()
-        display.lcd_display_string("Deleting Teacher", 1)
-        display.lcd_display_string(f"{teacher.firstname+' '+teacher.lastname}", 2)
-        sleep(2)
+        display.show("Deleting Teacher", f"{teacher.fullname}", duration=2)
 
+        for fingerprint_id in fingerprint_ids:
+            # Delete the student's fingerprint ID
+            if delete_fingerprint(fingerprint_id):
+                display.show("Student Fingerprints", "Deleted...", duration=2, key='teacher-delete')
+
+        # Delete the students, their history and the courses from the database
         for course in courses:
+            delete_course_rows(course.id)
             db.session.delete(course)
-        
-        for student in students:
-            if student.fingerprint_id:
-                # Delete the student's fingerprint ID
-                if finger.delete_model(student.fingerprint_id) == adafruit_fingerprint.OK:
-                    display.lcd_clear()
-                    display.lcd_display_string("Student Fingerprints", 1)
-                    display.lcd_display_string("Deleted...", 2)
-                    sleep(2)
-
-            # Delete the student's history if it exists
-            history = History.query.filter_by(studentid=student.studentid).first()
-            if history:
-                db.session.delete(history)
-
-            # Delete the student from the database
-            db.session.delete(student)
-        
+
         # Delete the teacher from the database
+        bump_versions(teachers=[teacher.id])
         db.session.delete(teacher)
         
-        display.lcd_clear()
-        display.lcd_display_string("Teacher Deleted...", 1)
-        sleep(2)
+        display.show("Teacher Deleted...", duration=2)
 
         db.session.commit()
+        identities.invalidate(teacher.id)
+        rosters.clear()
+        for course in courses:
+            publish('course', {'action': 'deleted', 'id': course.id}, course.id, teacher.id)
+        events.publish('teacher', {'action': 'deleted', 'id': teacher.id}, ['global', 'teacher:%d' % teacher.id])
 
         return redirect(url_for('index'))
     
@@ -833,4 +2138,7 @@ def error404():
 #404 ERROR HANDLING
 @app.errorhandler(404)
 def page_not_found(error):
+    # a missing stylesheet or script is a plain 404, not a page to log in to
+    if request.endpoint == 'static':
+        return error
     return redirect(url_for('error404'))
\ No newline at end of file
@@ -0,0 +1,103 @@
+import csv
+import gzip
+import os
+import re
+import shutil
+from datetime import datetime, date
+
+# Cold storage for attendance history: one gzipped CSV per term under `directory`,
+# rows denormalized so they still read the same after students or courses are
+# deleted. Archiving a term again appends another gzip member to its file.
+
+FIELDS = ('id', 'student_pk', 'student_id', 'student_name', 'course_id', 'course', 'teacher_id', 'course_teacher',
+          'status', 'date', 'date_timein')
+
+TERM_FILE = re.compile(r'^attendance-(.+)\.csv\.gz$')
+
+
+def parse_row(row):
+    row['id'] = int(row['id'])
+    row['student_pk'] = int(row['student_pk'])
+    row['course_id'] = int(row['course_id']) if row['course_id'] else None
+    row['teacher_id'] = int(row['teacher_id']) if row['teacher_id'] else None
+    row['date'] = date.fromisoformat(row['date'])
+    row['date_timein'] = datetime.fromisoformat(row['date_timein']) if row['date_timein'] else None
+    return row
+
+
+class Archive:
+    def __init__(self, directory):
+        self.directory = directory
+
+    def path(self, term):
+        return os.path.join(self.directory, 'attendance-%s.csv.gz' % term)
+
+    def terms(self):
+        if not os.path.isdir(self.directory):
+            return []
+        return sorted(match.group(1) for match in map(TERM_FILE.match, os.listdir(self.directory)) if match)
+
+    def ids(self, term):
+        return {row['id'] for row in self.rows(term)}
+
+    # append rows (dicts with FIELDS) to a term and make sure they are on disk. The
+    # rows are streamed into a new gzip member in a .part file, then added to the
+    # term file in one go, so a term of any size is never held in memory and a
+    # failure leaves the term file as it was.
+    def store(self, term, rows):
+        os.makedirs(self.directory, exist_ok=True)
+        path = self.path(term)
+        part = path + '.part'
+        count = 0
+        try:
+            with gzip.open(part, 'wt', compresslevel=9, newline='') as archive_file:
+                writer = csv.DictWriter(archive_file, FIELDS, extrasaction='ignore')
+                if not os.path.exists(path):
+                    writer.writeheader()
+                for row in rows:
+                    row = dict(row)
+                    row['date'] = row['date'].isoformat()
+                    row['date_timein'] = row['date_timein'].isoformat(sep=' ') if row['date_timein'] else ''
+                    writer.writerow(row)
+                    count += 1
+            with open(path, 'ab') as raw, open(part, 'rb') as member:
+                size = raw.tell()
+                try:
+                    shutil.copyfileobj(member, raw)
+                    raw.flush()
+                    os.fsync(raw.fileno())
+                except BaseException:
+                    raw.truncate(size)
+                    raise
+        finally:
+            if os.path.exists(part):
+                os.remove(part)
+        return count
+
+    def rows(self, term):
+        if not os.path.exists(self.path(term)):
+            return
+        with gzip.open(self.path(term), 'rt', newline='') as archive_file:
+            for row in csv.DictReader(archive_file, FIELDS):
+                if row['id'] == 'id':
+                    continue
+                yield parse_row(row)
+
+    # rows of the given terms (all when None) that pass every filter
+    def read(self, terms=None, teacher_id=None, course_id=None, status=None, start=None, end=None):
+        for term in self.terms() if terms is None else terms:
+            for row in self.rows(term):
+                if teacher_id is not None and row['teacher_id'] != teacher_id:
+                    continue
+                if course_id is not None and row['course_id'] != course_id:
+                    continue
+                if status and row['status'] != status:
+                    continue
+                if start and row['date'] < start:
+                    continue
+                if end and row['date'] > end:
+                    continue
+                yield row
+
+    def sizes(self):
+        return {term: os.path.getsize(self.path(term)) for term in self.terms()}
@@ -0,0 +1,208 @@
+import gzip
+import json
+import os
+import re
+import shutil
+from hashlib import sha1
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Static files each page loads, bundled in this order. app.css and core.js are on
+# every page, tables.js only on the pages with a DataTable.
+BUNDLES = {
+    'app.css': [
+        'vendor/fontawesome-free/css/all.min.css',
+        'css/sb-admin-2.min.css',
+        'css/buttons.dataTables.min.css',
+    ],
+    'core.js': [
+        'vendor/jquery/jquery.min.js',
+        'vendor/bootstrap/js/bootstrap.bundle.min.js',
+        'vendor/jquery-easing/jquery.easing.min.js',
+        'js/sb-admin-2.min.js',
+    ],
+    'tables.js': [
+        'vendor/datatables/jquery.dataTables.min.js',
+        'vendor/datatables/dataTables.bootstrap4.min.js',
+        'js/demo/datatables-demo.js',
+        'js/live.js',
+        'js/dataTables.buttons.min.js',
+        'js/FileSaver.js',
+        'js/tableExport.js',
+    ],
+}
+
+FONTAWESOME = 'vendor/fontawesome-free/css/all.min.css'
+# worth compressing: everything but the fonts, which are compressed already
+COMPRESSIBLE = ('.css', '.js', '.svg', '.json', '.eot', '.ttf')
+
+ICON_RULE = re.compile(r'\.fa-([a-z0-9-]+):before\{content:"\\[0-9a-f]+"\}')
+ICON_NAME = re.compile(r'\bfa-([a-z0-9-]+)')
+URL = re.compile(r'url\(([^)]+)\)')
+# a /* */ comment (not a /*! licence) from the start of a line to the end of one
+BLOCK_COMMENT = re.compile(r'^[ \t]*/\*(?!!)[^*]*\*+(?:[^/*][^*]*\*+)*/[ \t]*$', re.M)
+SOURCE_MAP = re.compile(r'^\s*(//|/\*)# sourceMappingURL=.*$', re.M)
+
+
+def fingerprint(data):
+    return sha1(data).hexdigest()[:10]
+
+
+def fingerprinted(name, data):
+    base, extension = os.path.splitext(name)
+    return '%s.%s%s' % (base, fingerprint(data), extension)
+
+
+def gzip_bytes(data, level=9):
+    # mtime 0, so a rebuild of the same file gives the same .gz
+    return gzip.compress(data, compresslevel=level, mtime=0)
+
+
+# Font Awesome icon names used by the templates and scripts, so the 1400-odd
+# other `.fa-x:before` rules can be left out of the stylesheet
+def used_icons(folders):
+    names = set()
+    for folder in folders:
+        for root, dirs, files in os.walk(folder):
+            for name in files:
+                if name.endswith(('.html', '.js')) and not name.endswith('.min.js'):
+                    with open(os.path.join(root, name), encoding='utf-8', errors='ignore') as f:
+                        names.update(ICON_NAME.findall(f.read()))
+    return names
+
+
+def subset_icons(css, icons):
+    return ICON_RULE.sub(lambda match: match.group(0) if match.group(1) in icons else '', css)
+
+
+# Whitespace and comments only: indentation, blank lines, comment lines and
+# /* */ blocks that take whole lines. Lines stay lines, so automatic semicolon
+# insertion and the scripts' string literals are untouched. `/*!` licences stay.
+def minify_js(text):
+    text = BLOCK_COMMENT.sub('', text)
+    lines = (line.strip() for line in text.splitlines())
+    return '\n'.join(line for line in lines if line and not line.startswith('//'))
+
+
+def minify_css(text):
+    text = re.sub(r'/\*(?!!).*?\*/', '', text, flags=re.S)
+    text = re.sub(r'\s+', ' ', text)
+    return re.sub(r'\s*([{};:,>])\s*', r'\1', text).strip()
+
+
+def minify(name, text):
+    text = SOURCE_MAP.sub('', text)
+    if '.min.' in name:
+        return text.strip()
+    return minify_js(text) if name.endswith('.js') else minify_css(text)
+
+
+def write(path, data, compress=True):
+    with open(path, 'wb') as f:
+        f.write(data)
+    if compress and path.endswith(COMPRESSIBLE):
+        with open(path + '.gz', 'wb') as f:
+            f.write(gzip_bytes(data))
+        if brotli is not None:
+            with open(path + '.br', 'wb') as f:
+                f.write(brotli.compress(data, quality=11))
+
+
+# Builds static/<directory>: a minified, content-hashed file per bundle plus the
+# fonts and images the stylesheets point at, each next to its .gz (and .br with
+# the brotli package), and manifest.json naming the files of each bundle.
+# Returns the manifest.
+def build(static_folder, template_folder, directory='dist'):
+    output = os.path.join(static_folder, directory)
+    shutil.rmtree(output, ignore_errors=True)
+    os.makedirs(output)
+    icons = used_icons([template_folder, os.path.join(static_folder, 'js')])
+    manifest = {'bundles': {}, 'files': {}}
+
+    # a file a stylesheet points at, copied once under its hashed name
+    def copy(source):
+        if source not in manifest['files']:
+            with open(os.path.join(static_folder, source), 'rb') as f:
+                data = f.read()
+            target = fingerprinted(os.path.basename(source), data)
+            write(os.path.join(output, target), data)
+            manifest['files'][source] = target
+        return manifest['files'][source]
+
+    def rebase(name, css):
+        folder = os.path.dirname(name)
+
+        def replace(match):
+            url = match.group(1).strip('\'"')
+            if url.startswith(('data:', 'http:', 'https:', '/')):
+                return match.group(0)
+            path, suffix = re.match(r'([^?#]*)(.*)', url).groups()
+            return 'url(%s%s)' % (copy(os.path.normpath(os.path.join(folder, path)).replace(os.sep, '/')), suffix)
+        return URL.sub(replace, css)
+
+    for bundle, sources in BUNDLES.items():
+        parts = []
+        for name in sources:
+            with open(os.path.join(static_folder, name), encoding='utf-8') as f:
+                text = minify(name, f.read())
+            if name == FONTAWESOME:
+                text = subset_icons(text, icons)
+            if bundle.endswith('.css'):
+                text = rebase(name, text)
+            parts.append(text)
+        data = (';\n' if bundle.endswith('.js') else '\n').join(parts).encode()
+        target = fingerprinted(bundle, data)
+        write(os.path.join(output, target), data)
+        manifest['bundles'][bundle] = [directory + '/' + target]
+
+    with open(os.path.join(output, 'manifest.json'), 'w') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    return manifest
+
+
+# The files behind each bundle for the templates: the built ones while a
+# manifest exists, the sources otherwise (no build step run, or turned off).
+# The manifest is read again when a new build replaces it.
+class Assets:
+    def __init__(self, static_folder, directory='dist'):
+        self.static_folder = static_folder
+        self.directory = directory
+        self._manifest = None
+        self._mtime = None
+
+    @property
+    def path(self):
+        return os.path.join(self.static_folder, self.directory, 'manifest.json')
+
+    def manifest(self):
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            return None
+        if mtime != self._mtime:
+            try:
+                with open(self.path) as f:
+                    self._manifest = json.load(f)
+                self._mtime = mtime
+            except (OSError, ValueError) as e:
+                print("Error:", str(e))
+                return None
+        return self._manifest
+
+    def files(self, bundle, bundled=True):
+        manifest = self.manifest() if bundled else None
+        if manifest is not None and bundle in manifest['bundles']:
+            return manifest['bundles'][bundle]
+        return BUNDLES[bundle]
+
+    # a built file: named after its content, so it never changes under its name
+    def is_built(self, filename):
+        return filename.startswith(self.directory + '/')
+
+    # changes with every build, for caches of pages that name the files
+    def stamp(self):
+        self.manifest()
+        return self._mtime
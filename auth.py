@@ -0,0 +1,130 @@
+from collections import OrderedDict
+from hashlib import pbkdf2_hmac
+from threading import Lock
+from time import monotonic, perf_counter
+
+from flask_login import UserMixin
+from werkzeug.security import generate_password_hash, check_password_hash
+
+
+# What a request needs to know about the logged-in teacher, copied out of the
+# Teacher row so it can be shared between requests and threads
+class Identity(UserMixin):
+    def __init__(self, teacher):
+        self.id = teacher.id
+        self.username = teacher.username
+        self.teacher_id = teacher.teacher_id
+        self.lastname = teacher.lastname
+        self.firstname = teacher.firstname
+        self.middlename = teacher.middlename
+        self.gender = teacher.gender
+
+    @property
+    def fullname(self):
+        return self.firstname + ' ' + self.lastname
+
+
+# Logged-in identities by user id, so an authenticated request does not query
+# the teacher table. Entries live `ttl` seconds, which also bounds how long
+# another worker process serves a changed teacher; in this process the teacher
+# routes invalidate them. The least recently used entry goes past max_size.
+class IdentityCache:
+    def __init__(self, load, ttl=300, max_size=128):
+        self.load = load
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, user_id):
+        now = monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(user_id)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+        identity = self.load(user_id)
+        if identity is not None:
+            with self._lock:
+                self._entries[user_id] = (now + self.ttl, identity)
+                self._entries.move_to_end(user_id)
+                while len(self._entries) > self.max_size:
+                    self._entries.popitem(last=False)
+        return identity
+
+    def invalidate(self, user_id=None):
+        with self._lock:
+            if user_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(user_id, None)
+
+    def stats(self):
+        return {'entries': len(self._entries), 'hits': self.hits, 'misses': self.misses}
+
+
+# PBKDF2 iterations that take about `seconds` on this CPU, rounded to 10000
+def benchmark_iterations(seconds, minimum, sample=20000):
+    started = perf_counter()
+    pbkdf2_hmac('sha256', b'benchmark', b'0123456789abcdef', sample)
+    rate = sample / (perf_counter() - started)
+    return max(minimum, int(round(rate * seconds, -4)))
+
+
+# Password hashing with a work factor fitted to the hardware. The method is
+# PASSWORD_HASH_METHOD when given, otherwise PBKDF2 with the iterations
+# benchmarked once and kept in `cache_path`, so every process agrees on it.
+# verify() hands back a new hash when a stored one was made under another
+# method, for the caller to save: rehashing needs the plain password, which
+# only a login has.
+class PasswordPolicy:
+    def __init__(self, method=None, seconds=0.25, minimum=100000, cache_path=None):
+        self._method = method
+        self.seconds = seconds
+        self.minimum = minimum
+        self.cache_path = cache_path
+        self._lock = Lock()
+
+    @property
+    def method(self):
+        if self._method is None:
+            with self._lock:
+                if self._method is None:
+                    self._method = self._cached() or self.calibrate()
+        return self._method
+
+    def _cached(self):
+        if self.cache_path is None:
+            return None
+        try:
+            with open(self.cache_path) as f:
+                return f.read().strip() or None
+        except OSError:
+            return None
+
+    # benchmark again and keep the result
+    def calibrate(self):
+        method = 'pbkdf2:sha256:%d' % benchmark_iterations(self.seconds, self.minimum)
+        if self.cache_path is not None:
+            try:
+                with open(self.cache_path, 'w') as f:
+                    f.write(method + '\n')
+            except OSError as e:
+                print("Error:", str(e))
+        self._method = method
+        return method
+
+    def hash(self, password):
+        return generate_password_hash(password, method=self.method)
+
+    # (matches, new hash or None)
+    def verify(self, stored, password):
+        if not check_password_hash(stored, password):
+            return False, None
+        if stored.split('$', 1)[0] != self.method:
+            return True, self.hash(password)
+        return True, None
@@ -0,0 +1,172 @@
+# Dashboard query timings on a synthetic multi-year history, before and after moving
+# past terms to the per-term archive. The schema mirrors app.py's tables and
+# indexes; the queries are the ones behind the dashboard history table (count +
+# first page for a teacher) and the attendance page's per-course present count.
+#
+#   python benchmarks/archive_timing.py [years]
+import os
+import sys
+import tempfile
+from datetime import date, datetime, timedelta
+from time import perf_counter
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from sqlalchemy import create_engine, text  # noqa: E402
+
+from archive import Archive  # noqa: E402
+
+SCHEMA = """
+CREATE TABLE teacher (id INTEGER PRIMARY KEY, firstname VARCHAR(255), lastname VARCHAR(255));
+CREATE TABLE course (id INTEGER PRIMARY KEY, course_name VARCHAR(255), teacher_id INTEGER REFERENCES teacher(id));
+CREATE INDEX ix_course_teacher_id ON course (teacher_id);
+CREATE TABLE student (id INTEGER PRIMARY KEY, student_id VARCHAR(255), firstname VARCHAR(255), lastname VARCHAR(255),
+                      course_id INTEGER REFERENCES course(id));
+CREATE TABLE attendancesession (id INTEGER PRIMARY KEY, course_id INTEGER, date DATE, opened_at DATETIME,
+                                UNIQUE (course_id, date));
+CREATE TABLE attendacehistory (id INTEGER PRIMARY KEY, session_id INTEGER, student_id INTEGER, status VARCHAR(16),
+                               date_timein DATETIME, UNIQUE (session_id, student_id));
+CREATE INDEX ix_history_session_status ON attendacehistory (session_id, status);
+CREATE INDEX ix_history_session_timein ON attendacehistory (session_id, date_timein);
+CREATE INDEX ix_attendacehistory_student_id ON attendacehistory (student_id);
+"""
+
+TEACHERS = 5
+COURSES_PER_TEACHER = 6
+STUDENTS_PER_COURSE = 40
+
+QUERIES = {
+    'history count': """
+        SELECT COUNT(*) FROM attendacehistory h JOIN attendancesession s ON s.id = h.session_id
+        JOIN course c ON c.id = s.course_id WHERE c.teacher_id = :teacher""",
+    'history first page': """
+        SELECT h.id, st.student_id, st.firstname || ' ' || st.lastname, c.course_name, h.status, h.date_timein
+        FROM attendacehistory h JOIN attendancesession s ON s.id = h.session_id
+        JOIN course c ON c.id = s.course_id JOIN student st ON st.id = h.student_id
+        WHERE c.teacher_id = :teacher ORDER BY h.date_timein DESC, h.id LIMIT 10""",
+    'history search': """
+        SELECT COUNT(*) FROM attendacehistory h JOIN attendancesession s ON s.id = h.session_id
+        JOIN course c ON c.id = s.course_id JOIN student st ON st.id = h.student_id
+        WHERE c.teacher_id = :teacher AND st.lastname LIKE '%7%'""",
+    'course present': """
+        SELECT COUNT(*) FROM attendacehistory h JOIN attendancesession s ON s.id = h.session_id
+        WHERE s.course_id = :course AND h.status = 'Present'""",
+}
+
+
+def term_of(day):
+    if day.month >= 8:
+        return '%d-1' % day.year
+    if day.month <= 5:
+        return '%d-2' % (day.year - 1)
+    return '%d-S' % (day.year - 1)
+
+
+def fill(conn, years, today):
+    conn.execute(text('INSERT INTO teacher VALUES (:id, :first, :last)'),
+                 [dict(id=t, first='Teacher', last=str(t)) for t in range(1, TEACHERS + 1)])
+    courses = [(c, 1 + (c - 1) // COURSES_PER_TEACHER) for c in range(1, TEACHERS * COURSES_PER_TEACHER + 1)]
+    conn.execute(text('INSERT INTO course VALUES (:id, :name, :teacher)'),
+                 [dict(id=c, name='Course %d' % c, teacher=t) for c, t in courses])
+    students = []
+    for c, t in courses:
+        for n in range(STUDENTS_PER_COURSE):
+            students.append(dict(id=len(students) + 1, code=str(1900000000 + len(students)), first='Student',
+                                 last=str(len(students)), course=c))
+    conn.execute(text('INSERT INTO student VALUES (:id, :code, :first, :last, :course)'), students)
+
+    # two sessions a week per course, skipping June and July
+    session_id = history_id = 0
+    day = today - timedelta(days=365 * years)
+    while day <= today:
+        if day.month not in (6, 7) and day.weekday() in (0, 2):
+            sessions, rows = [], []
+            for c, t in courses:
+                session_id += 1
+                opened = datetime(day.year, day.month, day.day, 7 + c % 8, 30)
+                sessions.append(dict(id=session_id, course=c, date=day, opened=opened))
+                for student in students[(c - 1) * STUDENTS_PER_COURSE:c * STUDENTS_PER_COURSE]:
+                    history_id += 1
+                    present = (history_id * 7) % 10 < 8
+                    rows.append(dict(id=history_id, session=session_id, student=student['id'],
+                                     status='Present' if present else 'Absent',
+                                     timein=opened + timedelta(minutes=history_id % 15) if present else opened))
+            conn.execute(text('INSERT INTO attendancesession VALUES (:id, :course, :date, :opened)'), sessions)
+            conn.execute(text('INSERT INTO attendacehistory VALUES (:id, :session, :student, :status, :timein)'), rows)
+        day += timedelta(days=1)
+    conn.execute(text('ANALYZE'))
+    return history_id
+
+
+def time_queries(engine, repeat=5):
+    results = {}
+    with engine.connect() as conn:
+        for name, sql in QUERIES.items():
+            best = None
+            for i in range(repeat):
+                started = perf_counter()
+                conn.execute(text(sql), dict(teacher=2, course=8)).all()
+                elapsed = perf_counter() - started
+                best = elapsed if best is None else min(best, elapsed)
+            results[name] = best
+    return results
+
+
+def archive_before(engine, archive, boundary):
+    started = perf_counter()
+    with engine.begin() as conn:
+        rows = conn.execute(text("""
+            SELECT h.id, st.id AS student_pk, st.student_id, st.firstname || ' ' || st.lastname AS student_name,
+                   c.id AS course_id, c.course_name AS course, c.teacher_id,
+                   t.firstname || ' ' || t.lastname AS course_teacher, h.status, s.date, h.date_timein
+            FROM attendacehistory h JOIN attendancesession s ON s.id = h.session_id
+            JOIN course c ON c.id = s.course_id JOIN student st ON st.id = h.student_id
+            LEFT JOIN teacher t ON t.id = c.teacher_id
+            WHERE s.date < :boundary ORDER BY s.date, h.id"""), dict(boundary=boundary)).mappings()
+        terms = {}
+        for row in rows:
+            row = dict(row)
+            row['date'] = date.fromisoformat(row['date'])
+            row['date_timein'] = datetime.fromisoformat(row['date_timein'])
+            terms.setdefault(term_of(row['date']), []).append(row)
+        moved = sum(archive.store(term, term_rows) for term, term_rows in terms.items())
+        conn.execute(text("""DELETE FROM attendacehistory WHERE session_id IN
+                             (SELECT id FROM attendancesession WHERE date < :boundary)"""), dict(boundary=boundary))
+        conn.execute(text('DELETE FROM attendancesession WHERE date < :boundary'), dict(boundary=boundary))
+    with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+        conn.execute(text('VACUUM'))
+        conn.execute(text('ANALYZE'))
+    return moved, perf_counter() - started
+
+
+def main():
+    years = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    today = date(2026, 10, 15)
+    boundary = date(2026, 8, 1)
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'attendance.db')
+        engine = create_engine('sqlite:///' + path)
+        with engine.begin() as conn:
+            for statement in SCHEMA.split(';'):
+                if statement.strip():
+                    conn.execute(text(statement))
+            total = fill(conn, years, today)
+        size_before = os.path.getsize(path)
+        before = time_queries(engine)
+
+        archive = Archive(os.path.join(directory, 'archive'))
+        moved, seconds = archive_before(engine, archive, boundary)
+        size_after = os.path.getsize(path)
+        after = time_queries(engine)
+
+        print('%d history rows over %d years, %d archived in %.1f s' % (total, years, moved, seconds))
+        print('database %.1f MB -> %.1f MB, archive %.1f MB in %d terms' % (
+            size_before / 1e6, size_after / 1e6, sum(archive.sizes().values()) / 1e6, len(archive.terms())))
+        print('%-20s %12s %12s' % ('query', 'before ms', 'after ms'))
+        for name in QUERIES:
+            print('%-20s %12.2f %12.2f' % (name, before[name] * 1000, after[name] * 1000))
+        engine.dispose()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+# Rows, bytes, time and peak memory of the attendance export: the streaming CSV/XLSX
+# writers against building the whole file in memory first, on a scratch SQLite
+# database filled with synthetic history rows.
+#
+#   python benchmarks/export_size.py [rows ...]
+import os
+import sys
+import tempfile
+import tracemalloc
+from datetime import datetime, timedelta
+from time import perf_counter
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from sqlalchemy import create_engine, MetaData, Table, Column, Integer, String, DateTime, select, insert  # noqa: E402
+from sqlalchemy.orm import Session  # noqa: E402
+
+import export  # noqa: E402
+
+HEADER = ['Student ID', 'Student Name', 'Course Name', 'Course Teacher', 'Status', 'Time In']
+
+metadata = MetaData()
+history = Table(
+    'history', metadata,
+    Column('id', Integer, primary_key=True),
+    Column('student_id', String(32)),
+    Column('student_name', String(255)),
+    Column('course', String(255)),
+    Column('course_teacher', String(255)),
+    Column('status', String(16)),
+    Column('date_timein', DateTime),
+)
+
+
+def fill(engine, count):
+    started = datetime(2023, 8, 15, 7, 30)
+    with engine.begin() as conn:
+        conn.execute(history.delete())
+        batch = []
+        for n in range(count):
+            batch.append({
+                'student_id': str(1900200000 + n % 400),
+                'student_name': 'Student %d Dela Cruz' % (n % 400),
+                'course': 'Comprog%d' % (n % 6),
+                'course_teacher': 'junell bojocan',
+                'status': 'Present' if n % 5 else 'Absent',
+                'date_timein': started + timedelta(minutes=n),
+            })
+            if len(batch) == 5000:
+                conn.execute(insert(history), batch)
+                batch = []
+        if batch:
+            conn.execute(insert(history), batch)
+
+
+def statement():
+    return select(history.c.student_id, history.c.student_name, history.c.course,
+                  history.c.course_teacher, history.c.status, history.c.date_timein).order_by(history.c.id)
+
+
+def streamed(session, writer):
+    total = chunks = 0
+    for chunk in writer(HEADER, export.stream_rows(session, statement())):
+        total += len(chunk)
+        chunks += 1
+    return total, chunks
+
+
+# what a pyexcel / tableExport style export does: every row, then the whole file
+def buffered(session, writer):
+    rows = session.execute(statement()).all()
+    data = b''.join(writer(HEADER, rows))
+    return len(data), 1
+
+
+def measure(engine, function, writer):
+    with Session(engine) as session:
+        tracemalloc.start()
+        started = perf_counter()
+        size, chunks = function(session, writer)
+        seconds = perf_counter() - started
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return size, chunks, seconds, peak
+
+
+def main():
+    counts = [int(arg) for arg in sys.argv[1:]] or [100, 10000, 100000]
+    with tempfile.TemporaryDirectory() as directory:
+        engine = create_engine('sqlite:///' + os.path.join(directory, 'export.db'))
+        metadata.create_all(engine)
+        print('%8s %-5s %-9s %12s %7s %9s %12s' % ('rows', 'fmt', 'mode', 'bytes', 'chunks', 'seconds', 'peak KiB'))
+        for count in counts:
+            fill(engine, count)
+            for name, (writer, mimetype) in export.FORMATS.items():
+                for mode, function in (('buffered', buffered), ('streamed', streamed)):
+                    size, chunks, seconds, peak = measure(engine, function, writer)
+                    print('%8d %-5s %-9s %12d %7d %9.2f %12.0f' % (count, name, mode, size, chunks, seconds, peak / 1024))
+        engine.dispose()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+# Per-SMS latency of the old sleep-and-readlines AT handling against GsmModem, both
+# talking to the pty fake modem.
+#
+#   python benchmarks/gsm_latency.py [messages]
+import sys
+from time import perf_counter, sleep
+
+import hardware_shims
+
+hardware_shims.install()
+
+import serial  # noqa: E402
+from drivers.gsm import GsmModem  # noqa: E402
+from drivers.fake_modem import FakeModem  # noqa: E402
+
+
+# the AT handling app.py used before the modem driver, one port open per message
+def legacy_send(port, number, body):
+    sms = serial.Serial(port, baudrate=9600, timeout=1)
+
+    def send_at_command(command):
+        sms.write(command.encode())
+        sleep(0.5)
+        return b"".join(sms.readlines()).decode()
+
+    try:
+        send_at_command('AT\r')
+        send_at_command('AT+CMGF=1\r')
+        send_at_command(f'AT+CMGS="{number}"\r')
+        send_at_command(f'{body} \x1A')
+    finally:
+        sms.close()
+
+
+def measure(send, count):
+    timings = []
+    for n in range(count):
+        started = perf_counter()
+        send('09170000000', 'Your child, Juan Dela Cruz, has entered their Comprog1 class. (%d)' % n)
+        timings.append(perf_counter() - started)
+    return timings
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    fake = FakeModem(reply_delay=0.02, send_delay=0.5)
+    before = measure(lambda number, body: legacy_send(fake.port, number, body), count)
+    modem = GsmModem(fake.port)
+    after = measure(modem.send_sms, count)
+    modem.close()
+    print("fake modem: %.0f ms per command, %.0f ms network time per SMS" % (fake.reply_delay * 1000, fake.send_delay * 1000))
+    print("%-12s %10s %10s %10s" % ("", "first s", "mean s", "total s"))
+    for name, timings in (("legacy", before), ("GsmModem", after)):
+        print("%-12s %10.2f %10.2f %10.2f" % (name, timings[0], sum(timings) / len(timings), sum(timings)))
+    print("messages received by fake modem:", len(fake.messages))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+# Bytes-on-bus benchmark for the LCD driver: the legacy per-nibble Lcd against
+# BufferedLcd, both talking to a fake SMBus that counts what would go over I2C.
+#
+#   python benchmarks/lcd_bus.py
+import hardware_shims
+
+hardware_shims.install()
+
+from drivers import i2c_dev  # noqa: E402
+from drivers.fake_smbus import FakeSMBus  # noqa: E402
+
+SCREENS = [
+    ("Student Attendance", "System", "", "Please login"),
+    ("Logging in...",),
+    (),
+    ("Student Attendance", "System", "Welcome Teacher", "Juan Dela Cruz"),
+    ("Press button to", "take attendance"),
+    ("", "Button pressed."),
+    ("Place finger",),
+    ("Templating",),
+    ("Searching",),
+    ("Success",),
+    ("SMS Sent",),
+    (),
+    ("Student Attendance", "System", "Welcome Teacher", "Juan Dela Cruz"),
+]
+
+LONG_NAME = "Maria Concepcion Dela Cruz-Villanueva"
+
+
+def render(lcd, lines):
+    lcd.lcd_clear()
+    for line, text in enumerate(lines, 1):
+        if text:
+            lcd.lcd_display_string(text, line)
+    if hasattr(lcd, 'lcd_flush'):
+        lcd.lcd_flush()
+
+
+def scroll(lcd, steps):
+    if hasattr(lcd, 'lcd_shift_display'):
+        lcd.lcd_clear()
+        lcd.lcd_display_long_string(LONG_NAME, 1)
+        lcd.lcd_flush()
+        for _ in range(steps):
+            lcd.lcd_shift_display(1)
+    else:
+        for step in range(steps):
+            lcd.lcd_display_string((LONG_NAME + ' ' + LONG_NAME)[step:step + 20], 1)
+
+
+def run(factory):
+    slept = [0.0]
+
+    def fake_sleep(seconds):
+        slept[0] += seconds
+
+    i2c_dev.sleep = fake_sleep
+    bus = FakeSMBus()
+    lcd = factory(addr=0x27, bus=bus)
+    custom = i2c_dev.CustomCharacters(lcd)
+    results = {}
+    for name, work in (
+        ('screens', lambda: [render(lcd, lines) for lines in SCREENS]),
+        ('custom chars x2', lambda: (custom.load_custom_characters_data(), custom.load_custom_characters_data())),
+        ('scroll 20 steps', lambda: scroll(lcd, 20)),
+    ):
+        bus.reset()
+        slept[0] = 0.0
+        work()
+        results[name] = (bus.bytes, bus.transactions, bus.wire_seconds() + slept[0])
+    return results
+
+
+def main():
+    before = run(i2c_dev.Lcd)
+    after = run(i2c_dev.BufferedLcd)
+    print("%-16s %22s %22s %14s" % ("workload", "Lcd bytes/txn", "BufferedLcd bytes/txn", "time ms"))
+    for name in before:
+        b, a = before[name], after[name]
+        print("%-16s %14d / %5d %14d / %5d %6.1f -> %5.1f" % (
+            name, b[0], b[1], a[0], a[1], b[2] * 1000, a[2] * 1000))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+# Bytes, requests and an estimated time-to-interactive of the login page and the
+# dashboard, loading the stylesheet and script sources uncompressed (before
+# `flask build-assets`) against the built bundles served precompressed with the
+# HTML gzipped (after). Everything goes through the Flask test client against
+# the app's own database, so server time is real; the network is a model of
+# slow classroom WiFi: BANDWIDTH bits/s, RTT per round of requests, CONNECTIONS
+# requests in flight. Only render-blocking files count (HTML, CSS, JS).
+#   cold    empty browser cache
+#   warm    a second visit: the sources are revalidated one request each (304),
+#           the built files are immutable and not asked for at all
+#
+#   python benchmarks/page_weight.py [bandwidth Mbit/s] [rtt ms]
+import gzip
+import math
+import os
+import re
+import sys
+from time import perf_counter
+
+import hardware_shims
+
+hardware_shims.install()
+os.environ.setdefault('ATTENDANCE_HARDWARE', 'simulator')
+
+import app as attendance  # noqa: E402
+from assets import build  # noqa: E402
+
+CONNECTIONS = 6
+TAG = re.compile(r'<(?:link[^>]*rel="stylesheet"|script)[^>]*>')
+URL = re.compile(r'(?:href|src)="([^"]+)"')
+
+
+def fetch(client, url, encodings, etag=None):
+    headers = {'Accept-Encoding': encodings} if encodings else {}
+    if etag:
+        headers['If-None-Match'] = etag
+    started = perf_counter()
+    response = client.get(url, headers=headers)
+    data = response.data
+    seconds = perf_counter() - started
+    response.close()
+    return response, len(data), seconds
+
+
+def page(client, url, encodings, bandwidth, rtt, warm):
+    response, size, server = fetch(client, url, encodings)
+    html = response.data
+    if response.headers.get('Content-Encoding') == 'gzip':
+        html = gzip.decompress(html)
+    assets = [URL.search(tag).group(1) for tag in TAG.findall(html.decode()) if URL.search(tag)]
+    requests, total, slowest = 1, size, server
+    fetched = []
+    for asset in assets:
+        first, asset_size, seconds = fetch(client, asset, encodings)
+        if warm:
+            if 'immutable' in first.headers.get('Cache-Control', ''):
+                continue
+            # the browser has it and asks whether it changed
+            first, asset_size, seconds = fetch(client, asset, encodings, first.headers.get('ETag'))
+        fetched.append(asset)
+        total += asset_size
+        slowest = max(slowest, seconds)
+    requests += len(fetched)
+    rounds = 1 + math.ceil(len(fetched) / CONNECTIONS)
+    tti = rounds * rtt + total * 8 / bandwidth + server + (slowest if fetched else 0)
+    return requests, total, tti
+
+
+def main():
+    bandwidth = float(sys.argv[1]) * 1e6 if len(sys.argv) > 1 else 2e6
+    rtt = float(sys.argv[2]) / 1000 if len(sys.argv) > 2 else 0.08
+    app = attendance.app
+    if app.config['ASSET_BUNDLES'] and attendance.assets.manifest() is None:
+        build(app.static_folder, os.path.join(app.root_path, app.template_folder))
+    with app.app_context():
+        # the admin is sent to /admin, the dashboard is a course teacher's
+        course = attendance.Course.query.filter(attendance.Course.teacher_id.isnot(None)).first()
+    if course is None:
+        sys.exit('needs a course with a teacher in the database')
+
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(course.teacher_id)
+        session['_fresh'] = True
+    print('%.1f Mbit/s, %d ms RTT, %d connections' % (bandwidth / 1e6, rtt * 1000, CONNECTIONS))
+    print('%-12s %-6s %-7s %9s %10s %9s' % ('page', 'visit', 'assets', 'requests', 'bytes', 'TTI ms'))
+    for name, url in (('login', '/'), ('dashboard', '/dashboard')):
+        for visit in ('cold', 'warm'):
+            for label, bundled, encodings in (('before', False, None), ('after', True, 'gzip, br')):
+                app.config['ASSET_BUNDLES'] = bundled
+                attendance.pages.clear()
+                if url == '/':
+                    # the login page redirects a logged-in teacher
+                    other = app.test_client()
+                    requests, size, tti = page(other, url, encodings, bandwidth, rtt, visit == 'warm')
+                else:
+                    requests, size, tti = page(client, url, encodings, bandwidth, rtt, visit == 'warm')
+                print('%-12s %-6s %-7s %9d %10d %9.0f' % (name, visit, label, requests, size, tti * 1000))
+    app.config['ASSET_BUNDLES'] = True
+
+
+if __name__ == '__main__':
+    main()
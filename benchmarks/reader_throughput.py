@@ -0,0 +1,101 @@
+# Scans per second with N simulated fingerprint readers, each with its own Scanner
+# worker, all writing through one GroupCommit into a scratch SQLite database.
+# "shared" puts every capture behind one lock, the way the single global sensor
+# serialised them; "per-reader" gives every reader its own, as ReaderRegistry does.
+#
+#   python benchmarks/reader_throughput.py [seconds] [readers ...]
+import os
+import sys
+import tempfile
+from datetime import datetime
+from threading import Lock
+from time import sleep, monotonic
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from flask import Flask  # noqa: E402
+from flask_sqlalchemy import SQLAlchemy  # noqa: E402
+from sqlalchemy import insert  # noqa: E402
+
+import storage  # noqa: E402
+from scanner import Scanner  # noqa: E402
+
+# GetImage + Image2Tz + Search on an R307 at 57600 baud
+SCAN_SECONDS = 0.35
+# time between two students at the same door
+GAP_SECONDS = 0.05
+
+
+def make_db(path):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + path
+    db = SQLAlchemy(app)
+
+    class Scan(db.Model):
+        id = db.Column(db.Integer, primary_key=True)
+        reader = db.Column(db.Integer)
+        finger_id = db.Column(db.Integer)
+        scanned_at = db.Column(db.DateTime)
+
+    with app.app_context():
+        storage.configure(db.engine)
+        db.create_all()
+    return app, db, Scan
+
+
+def run(readers, seconds, shared):
+    with tempfile.TemporaryDirectory() as directory:
+        app, db, Scan = make_db(os.path.join(directory, 'bench.db'))
+        commits = storage.GroupCommit(app, db)
+        global_lock = Lock()
+        scans = [0] * readers
+
+        def trigger(timeout):
+            sleep(GAP_SECONDS)
+            return True
+
+        def capture(number, lock, cancelled):
+            with lock:
+                sleep(SCAN_SECONDS)
+            return 1 + scans[number] % 40
+
+        def on_match(number, course, finger_id):
+            scans[number] += 1
+            now = datetime.now()
+            commits.add(lambda session: session.execute(insert(Scan).values(reader=number, finger_id=finger_id, scanned_at=now)))
+            return {'finger_id': finger_id}
+
+        workers = []
+        for number in range(readers):
+            lock = global_lock if shared else Lock()
+            workers.append(Scanner(trigger, lambda cancelled, number=number, lock=lock: capture(number, lock, cancelled),
+                                   lambda course, finger_id, number=number: on_match(number, course, finger_id),
+                                   poll_interval=0.01))
+        started = monotonic()
+        for number, worker in enumerate(workers):
+            worker.start('course-%d' % number)
+        sleep(seconds)
+        for worker in workers:
+            worker.stop()
+        elapsed = monotonic() - started
+        sleep(SCAN_SECONDS + 0.1)
+        commits.flush()
+        with app.app_context():
+            stored = db.session.query(Scan).count()
+            db.engine.dispose()
+        return sum(scans), stored, elapsed, commits.stats()
+
+
+def main():
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 5
+    counts = [int(arg) for arg in sys.argv[2:]] or [1, 2, 4, 8]
+    print('%7s %-10s %7s %7s %9s %8s %9s' % ('readers', 'sensors', 'scans', 'stored', 'scans/s', 'commits', 'rows/commit'))
+    for readers in counts:
+        for mode, shared in (('shared', True), ('per-reader', False)):
+            scans, stored, elapsed, stats = run(readers, seconds, shared)
+            print('%7d %-10s %7d %7d %9.1f %8d %9s' % (readers, mode, scans, stored, scans / elapsed,
+                                                      stats['commits'], stats['rows_per_commit']))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,198 @@
+# Scan pipeline micro-benchmarks on the simulated hardware (drivers/simulator.py):
+# per-stage and end-to-end latency per scanned student through adafruit_fingerprint
+# and CaptureEngine, at the sensor's default link and the negotiated one, plus
+# bytes per LCD update and the time per SMS. The fake sensor's processing delays
+# are fixed, so differences between runs come from the driver code and the link.
+#
+#   python benchmarks/scan_pipeline.py [students]
+import sys
+from statistics import median
+from threading import Event
+from time import perf_counter, sleep
+
+import hardware_shims
+
+hardware_shims.install()
+
+import adafruit_fingerprint  # noqa: E402
+import serial  # noqa: E402
+
+import drivers  # noqa: E402
+from drivers import i2c_dev  # noqa: E402
+from scanner import Scanner  # noqa: E402
+
+BUTTON = 12
+LIBRARY = 150
+TOUCH = 0.3
+
+LINKS = (('57600/32', 57600, 32), ('115200/256', 115200, 256))
+
+SCREENS = [
+    ("", "Button pressed."),
+    ("Place finger",),
+    ("Templating",),
+    ("Searching",),
+    ("Success",),
+    ("Student Attendance", "System", "Welcome Teacher", "Juan Dela Cruz"),
+]
+
+
+def open_capture(simulator, baudrate, packet_size):
+    sensor = simulator.sensor('reader-%d-%d' % (baudrate, packet_size))
+    for location in range(1, LIBRARY + 1):
+        sensor.enroll(location, 'student-%d' % location)
+    uart = serial.Serial(sensor.port, baudrate=57600, timeout=1)
+    finger = drivers.connect(uart, (57600,))
+    drivers.negotiate(finger, uart, baudrate, packet_size)
+    return sensor, drivers.CaptureEngine(finger)
+
+
+def timed(function, *args):
+    started = perf_counter()
+    result = function(*args)
+    return result, perf_counter() - started
+
+
+def wait_lifted(sensor):
+    while sensor._finger() is not None:
+        sleep(0.01)
+
+
+def stages(sensor, capture, students):
+    times = {'get_image': [], 'image_2_tz': [], 'search': [], 'identify': [],
+             'template download': [], 'template upload': []}
+    for number in range(1, students + 1):
+        person = 'student-%d' % (1 + (number * 37) % LIBRARY)
+        sensor.touch(person, seconds=TOUCH)
+        capture.wake()
+        times['get_image'].append(timed(capture.wait_image)[1])
+        times['image_2_tz'].append(timed(capture.template, 1)[1])
+        result, seconds = timed(capture.search)
+        assert result == adafruit_fingerprint.OK, result
+        times['search'].append(seconds)
+        wait_lifted(sensor)
+
+        sensor.touch(person, seconds=TOUCH)
+        result, seconds = timed(capture.identify)
+        assert result == adafruit_fingerprint.OK, result
+        times['identify'].append(seconds)
+        wait_lifted(sensor)
+
+        data, seconds = timed(capture.download, number)
+        times['template download'].append(seconds)
+        times['template upload'].append(timed(capture.upload, LIBRARY + 1, data)[1])
+    return times
+
+
+def enroll_times(sensor, capture, students):
+    times = []
+    for number in range(students):
+        person = 'new-%d' % number
+        sensor.touch(person, seconds=2 * TOUCH)
+        sensor.touch(person, seconds=2 * TOUCH, delay=3 * TOUCH)
+        started = perf_counter()
+        # the same calls as enroll() in app.py
+        capture.wake()
+        assert capture.wait_image() == adafruit_fingerprint.OK
+        assert capture.template(1) == adafruit_fingerprint.OK
+        capture.wait_removed()
+        capture.wake()
+        assert capture.wait_image() == adafruit_fingerprint.OK
+        assert capture.template(2) == adafruit_fingerprint.OK
+        assert capture.create_model() == adafruit_fingerprint.OK
+        assert capture.store(LIBRARY + 2) == adafruit_fingerprint.OK
+        times.append(perf_counter() - started)
+        wait_lifted(sensor)
+    return times
+
+
+# button press -> scanner worker -> identify -> roster hit, as the app wires it
+def end_to_end(simulator, sensor, capture, students):
+    gpio = simulator.gpio
+    matched = Event()
+    found = []
+
+    def on_match(course, finger_id):
+        found.append(finger_id)
+        matched.set()
+        return {'finger_id': finger_id}
+
+    def capture_finger(cancelled):
+        capture.wake()
+        if capture.identify(cancelled) == adafruit_fingerprint.OK:
+            return capture.finger.finger_id
+        return None
+
+    scanner = Scanner(lambda timeout: gpio.wait_for_edge(BUTTON, gpio.FALLING, timeout=int(timeout * 1000)) is not None,
+                      capture_finger, on_match, poll_interval=0.1)
+    scanner.start('bench')
+    times = []
+    for number in range(1, students + 1):
+        matched.clear()
+        started = perf_counter()
+        simulator.touch(sensor_port(simulator, sensor), 'student-%d' % number, button=BUTTON, seconds=TOUCH)
+        if matched.wait(5):
+            times.append(perf_counter() - started)
+        wait_lifted(sensor)
+    scanner.stop()
+    return times
+
+
+def sensor_port(simulator, sensor):
+    return next(port for port, candidate in simulator.sensors.items() if candidate is sensor)
+
+
+def lcd_bytes(simulator):
+    i2c_dev.sleep = lambda seconds: None
+    bus = simulator.smbus
+    display = drivers.DisplayService(lcd_factory=lambda: drivers.BufferedLcd(addr=0x27, bus=bus))
+    display.show('warm up')
+    display.wait_idle(5)
+    bus.reset()
+    for lines in SCREENS * 5:
+        display.show(*lines)
+        display.wait_idle(5)
+    return bus.bytes / display.shown if display.shown else 0, bus.transactions / display.shown if display.shown else 0
+
+
+def sms_times(simulator, count):
+    modem = drivers.GsmModem(simulator.modem.port, baudrate=9600)
+    times = []
+    for number in range(count):
+        times.append(timed(modem.send_sms, '0917000%04d' % number, 'Your child has entered their class.')[1])
+    modem.close()
+    return times
+
+
+def ms(values):
+    return '%8.1f' % (median(values) * 1000) if values else '%8s' % '-'
+
+
+def main():
+    if not hasattr(adafruit_fingerprint, 'Adafruit_Fingerprint'):
+        sys.exit('needs adafruit-circuitpython-fingerprint (requirements.txt)')
+    students = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    simulator = drivers.Simulator(modem_options={'send_delay': 0.2})
+    results = {}
+    for name, baudrate, packet_size in LINKS:
+        sensor, capture = open_capture(simulator, baudrate, packet_size)
+        times = stages(sensor, capture, students)
+        times['enroll'] = enroll_times(sensor, capture, max(1, students // 3))
+        times['press -> recorded'] = end_to_end(simulator, sensor, capture, students)
+        times['packets/match'] = capture.stats()['packets_per_match']
+        results[name] = times
+
+    print('median ms per student, %d students, library of %d' % (students, LIBRARY))
+    print('%-20s %12s %12s' % ('stage', LINKS[0][0], LINKS[1][0]))
+    for stage in results[LINKS[0][0]]:
+        if stage == 'packets/match':
+            continue
+        print('%-20s %12s %12s' % (stage, ms(results[LINKS[0][0]][stage]), ms(results[LINKS[1][0]][stage])))
+    print('%-20s %12s %12s' % ('packets/match', results[LINKS[0][0]]['packets/match'], results[LINKS[1][0]]['packets/match']))
+    per_update, transactions = lcd_bytes(simulator)
+    print('LCD update           %6.0f bytes in %.1f transactions' % (per_update, transactions))
+    print('SMS                  %s ms' % ms(sms_times(simulator, 3)).strip())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+# Search time per scan with the whole library searched (adafruit finger_search,
+# which also reads the system parameters first) against only the course's range
+# of slots, normal and high-speed search, on the simulated sensor. The fake
+# compares `search_delay` seconds per slot, so the ratio follows the slot counts.
+#
+#   python benchmarks/search_range.py [scans]
+import sys
+from statistics import median
+from time import perf_counter
+
+import hardware_shims
+
+hardware_shims.install()
+
+import adafruit_fingerprint  # noqa: E402
+import serial  # noqa: E402
+
+import drivers  # noqa: E402
+
+LIBRARY = 1000
+COURSE = 40
+STUDENTS = 600
+
+
+def timed(function, *args):
+    started = perf_counter()
+    result = function(*args)
+    return result, perf_counter() - started
+
+
+def main():
+    if not hasattr(adafruit_fingerprint, 'Adafruit_Fingerprint'):
+        sys.exit('needs adafruit-circuitpython-fingerprint (requirements.txt)')
+    scans = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    simulator = drivers.Simulator(sensor_options={'library_size': LIBRARY})
+    sensor = simulator.sensor('bench')
+    for location in range(1, STUDENTS + 1):
+        sensor.enroll(location, 'student-%d' % location)
+    uart = serial.Serial(sensor.port, baudrate=57600, timeout=1)
+    finger = drivers.connect(uart, (57600,))
+    drivers.negotiate(finger, uart, 115200, 256)
+    capture = drivers.CaptureEngine(finger)
+
+    # the course holds slots 401-440, students late in the library search longest
+    start = 401
+    ways = (
+        ('finger_search, whole library', lambda: finger.finger_search()),
+        ('search, whole library', lambda: drivers.fingerprint.search(finger, 0, LIBRARY)),
+        ('search, course range', lambda: drivers.fingerprint.search(finger, start, COURSE)),
+        ('high-speed, course range', lambda: drivers.fingerprint.search(finger, start, COURSE, True)),
+    )
+    print('median ms per search, %d scans, %d templates, %d-slot course range' % (scans, STUDENTS, COURSE))
+    for name, search in ways:
+        times = []
+        for number in range(scans):
+            sensor.touch('student-%d' % (start + number % COURSE), seconds=0.3)
+            assert capture.wait_image() == adafruit_fingerprint.OK
+            assert capture.template(1) == adafruit_fingerprint.OK
+            result, seconds = timed(search)
+            assert result == adafruit_fingerprint.OK, result
+            times.append(seconds)
+            capture.wait_removed()
+        print('%-32s %8.1f' % (name, median(times) * 1000))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+# Startup time and peak RSS of a fresh process importing app.py, which is what
+# `flask createdb`, `flask create-admin` and every worker start pay. Each run is a
+# new interpreter:
+#   cold        import, then compile every template with an empty bytecode cache
+#   warm        the same again, templates come from instance/jinja; the devices
+#               are Lazy and nothing is opened
+#   eager       the baseline: import, then open every device, which is what
+#               import did before the devices were Lazy. It needs the sensor,
+#               GPIO and I2C libraries, or ATTENDANCE_HARDWARE=simulator and
+#               adafruit-circuitpython-fingerprint on a desktop
+#
+# The last line is what an eager start costs on top of a Lazy one.
+#
+#   python benchmarks/startup_report.py [runs]
+#   ATTENDANCE_HARDWARE=simulator python benchmarks/startup_report.py [runs]
+import json
+import os
+import shutil
+import subprocess
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+CHILD = r'''
+import json, os, resource, sys
+from time import perf_counter
+sys.path.insert(0, os.path.join(os.getcwd(), 'benchmarks'))
+import hardware_shims
+hardware_shims.install()
+started = perf_counter()
+import app
+report = {'import': perf_counter() - started}
+started = perf_counter()
+for name in app.app.jinja_env.list_templates():
+    app.app.jinja_env.get_template(name)
+report['templates'] = perf_counter() - started
+if sys.argv[1] == 'eager':
+    started = perf_counter()
+    try:
+        for name in app.hardware.status():
+            app.hardware.get(name)
+        app.display.show('startup report')
+        app.display.wait_idle(5)
+    except Exception as e:
+        report['error'] = '%s: %s' % (type(e).__name__, e)
+    report['hardware'] = perf_counter() - started
+report['rss'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+report['modules'] = len(sys.modules)
+print(json.dumps(report))
+'''
+
+
+def run(mode):
+    output = subprocess.run([sys.executable, '-c', CHILD, mode], cwd=ROOT, capture_output=True, text=True, check=True)
+    return json.loads(output.stdout.strip().splitlines()[-1])
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+    cache = os.path.join(ROOT, 'instance', 'jinja')
+    print('%-9s %10s %13s %12s %10s %8s' % ('mode', 'import ms', 'templates ms', 'hardware ms', 'RSS KiB', 'modules'))
+    results = {}
+    for mode in ('cold', 'warm', 'eager'):
+        reports = []
+        for n in range(runs):
+            if mode == 'cold':
+                shutil.rmtree(cache, ignore_errors=True)
+            reports.append(run(mode))
+        best = min(reports, key=lambda report: report['import'])
+        results[mode] = best
+        hardware = '%12.0f' % (best['hardware'] * 1000) if 'hardware' in best else '%12s' % '-'
+        print('%-9s %10.0f %13.0f %s %10d %8d' % (mode, best['import'] * 1000, best['templates'] * 1000, hardware,
+                                                  best['rss'], best['modules']))
+        if 'error' in best:
+            print('          %s' % best['error'])
+    lazy, eager = results['warm'], results['eager']
+    if 'error' in eager:
+        print('eager - lazy: no baseline, the devices did not open')
+    else:
+        print('eager - lazy: %+.0f ms to start, %+d KiB RSS, %+d modules' % (
+            (eager['import'] + eager['hardware'] - lazy['import']) * 1000, eager['rss'] - lazy['rss'],
+            eager['modules'] - lazy['modules']))
+
+
+if __name__ == '__main__':
+    main()
@@ -1 +1,6 @@
-from .i2c_dev import Lcd, CustomCharacters
+from .i2c_dev import Lcd, BufferedLcd, CustomCharacters
+from .display import DisplayService, PRIORITY_LOW, PRIORITY_NORMAL, PRIORITY_HIGH
+from .fingerprint import CaptureEngine, TIMEOUT, CANCELLED, connect, negotiate
+from .gsm import GsmModem, ModemError, SendUnconfirmed
+from .hardware import Hardware, Lazy
+from .simulator import Simulator
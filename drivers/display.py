@@ -0,0 +1,148 @@
+import heapq
+from itertools import count
+from threading import Thread, Condition
+from time import monotonic, perf_counter, sleep
+
+from .i2c_dev import Lcd
+
+# message priorities, higher is shown first
+PRIORITY_LOW = 0
+PRIORITY_NORMAL = 1
+PRIORITY_HIGH = 2
+
+
+class Message:
+    __slots__ = ('lines', 'duration', 'priority', 'key', 'expires', 'seq', 'cancelled')
+
+    def __init__(self, lines, duration, priority, key, expires, seq):
+        self.lines = lines
+        self.duration = duration
+        self.priority = priority
+        self.key = key
+        self.expires = expires
+        self.seq = seq
+        self.cancelled = False
+
+
+# Background owner of the LCD. Routes enqueue screens with show()/clear() and return
+# immediately; a single worker thread talks to the I2C device and keeps every screen
+# up for at least its duration. A new message with the same key replaces the one
+# still waiting in the queue, messages with a ttl are dropped if they could not be
+# shown in time, and when the queue is full the oldest lowest-priority message goes.
+# observe(phase, seconds), when given, gets the time of every 'render' and 'hold'.
+class DisplayService:
+    def __init__(self, lcd_factory=Lcd, max_pending=16, observe=None):
+        self._lcd_factory = lcd_factory
+        self.observe = observe
+        self._lcd = None
+        self._max_pending = max_pending
+        self._heap = []
+        self._keyed = {}
+        self._pending = 0
+        self._busy = False
+        self._seq = count()
+        self._cond = Condition()
+        self._thread = None
+        self.shown = 0
+        self.dropped = 0
+        self.coalesced = 0
+
+    # queue a screen. Each positional argument is one line (1-4), an empty call clears
+    def show(self, *lines, duration=0, priority=PRIORITY_NORMAL, key=None, ttl=None):
+        expires = monotonic() + ttl if ttl is not None else None
+        msg = Message(lines[:4], duration, priority, key, expires, next(self._seq))
+        with self._cond:
+            if key is not None:
+                old = self._keyed.get(key)
+                if old is not None and not old.cancelled:
+                    old.cancelled = True
+                    self._pending -= 1
+                    self.coalesced += 1
+                self._keyed[key] = msg
+            heapq.heappush(self._heap, (-priority, msg.seq, msg))
+            self._pending += 1
+            if self._pending > self._max_pending:
+                self._drop_one()
+            if self._thread is None:
+                self._thread = Thread(target=self._run, name='lcd', daemon=True)
+                self._thread.start()
+            self._cond.notify_all()
+
+    def clear(self, priority=PRIORITY_NORMAL, key=None):
+        self.show(priority=priority, key=key)
+
+    # number of messages waiting to be shown
+    def pending(self):
+        with self._cond:
+            return self._pending
+
+    # block until everything queued so far has been shown (for CLI commands and benchmarks)
+    def wait_idle(self, timeout=None):
+        deadline = monotonic() + timeout if timeout is not None else None
+        with self._cond:
+            while self._pending or self._busy:
+                remaining = deadline - monotonic() if deadline is not None else None
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def _drop_one(self):
+        live = [entry[2] for entry in self._heap if not entry[2].cancelled]
+        victim = min(live, key=lambda m: (m.priority, m.seq))
+        self._cancel(victim)
+        self.dropped += 1
+
+    def _cancel(self, msg):
+        msg.cancelled = True
+        self._pending -= 1
+        if msg.key is not None and self._keyed.get(msg.key) is msg:
+            del self._keyed[msg.key]
+
+    def _pop(self):
+        now = monotonic()
+        while self._heap:
+            msg = heapq.heappop(self._heap)[2]
+            if msg.cancelled:
+                continue
+            self._cancel(msg)
+            if msg.expires is not None and msg.expires < now:
+                self.dropped += 1
+                continue
+            return msg
+        return None
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._busy = False
+                self._cond.notify_all()
+                msg = self._pop()
+                while msg is None:
+                    self._cond.wait()
+                    msg = self._pop()
+                self._busy = True
+            started = perf_counter()
+            self._render(msg.lines)
+            if self.observe is not None:
+                self.observe('render', perf_counter() - started)
+            if msg.duration:
+                sleep(msg.duration)
+                if self.observe is not None:
+                    self.observe('hold', msg.duration)
+
+    def _render(self, lines):
+        try:
+            if self._lcd is None:
+                self._lcd = self._lcd_factory()
+            self._lcd.lcd_clear()
+            for line, text in enumerate(lines, 1):
+                if text:
+                    self._lcd.lcd_display_string(text, line)
+            # buffered lcds only send the cells that changed
+            flush = getattr(self._lcd, 'lcd_flush', None)
+            if flush is not None:
+                flush()
+            self.shown += 1
+        except Exception as e:
+            print("Error:", str(e))
@@ -0,0 +1,54 @@
+from threading import Condition
+from time import monotonic
+
+# Scriptable stand-in for the RPi.GPIO module: the constants and calls app.py uses,
+# with press(pin) queueing a button press that wait_for_edge() picks up.
+
+
+class FakeGpio:
+    BOARD = 10
+    BCM = 11
+    OUT = 0
+    IN = 1
+    PUD_OFF = 20
+    PUD_DOWN = 21
+    PUD_UP = 22
+    RISING = 31
+    FALLING = 32
+    BOTH = 33
+    RPI_REVISION = 3
+
+    def __init__(self):
+        self.mode = None
+        self.pins = {}
+        self.edges = 0
+        self._presses = {}
+        self._cond = Condition()
+
+    def setmode(self, mode):
+        self.mode = mode
+
+    def setup(self, pin, direction, pull_up_down=PUD_OFF):
+        self.pins[pin] = (direction, pull_up_down)
+
+    def cleanup(self, *pins):
+        for pin in pins or list(self.pins):
+            self.pins.pop(pin, None)
+
+    def press(self, pin, count=1):
+        with self._cond:
+            self._presses[pin] = self._presses.get(pin, 0) + count
+            self._cond.notify_all()
+
+    # blocks until the pin has a queued press, returns the pin or None after timeout ms
+    def wait_for_edge(self, pin, edge, timeout=None):
+        deadline = monotonic() + timeout / 1000 if timeout else None
+        with self._cond:
+            while not self._presses.get(pin):
+                remaining = deadline - monotonic() if deadline is not None else None
+                if remaining is not None and remaining <= 0:
+                    return None
+                self._cond.wait(remaining)
+            self._presses[pin] -= 1
+            self.edges += 1
+            return pin
@@ -0,0 +1,102 @@
+import os
+import tty
+from threading import Thread
+from time import sleep
+
+
+# Pseudo-terminal that answers like a SIM800 modem, for running the SMS path without
+# hardware. Point GsmModem (or anything using pyserial) at `port`.
+#
+#   python -m drivers.fake_modem
+#
+# reply_delay is the time the fake modem takes for an ordinary command and
+# send_delay the network time for AT+CMGS. Sent messages are kept in `messages`.
+class FakeModem:
+    def __init__(self, reply_delay=0.02, send_delay=0.5, fail_numbers=()):
+        self.reply_delay = reply_delay
+        self.send_delay = send_delay
+        self.fail_numbers = set(fail_numbers)
+        self.messages = []
+        self.commands = []
+        self.echo = True
+        self.text_mode = False
+        self.charset = 'IRA'
+        self._master, self._slave = os.openpty()
+        tty.setraw(self._slave)
+        self.port = os.ttyname(self._slave)
+        self._reference = 0
+        self._thread = Thread(target=self._run, name='fake-modem', daemon=True)
+        self._thread.start()
+
+    def close(self):
+        os.close(self._master)
+        os.close(self._slave)
+
+    def _reply(self, text, delay=None):
+        sleep(self.reply_delay if delay is None else delay)
+        os.write(self._master, text.encode())
+
+    def _read(self):
+        try:
+            return os.read(self._master, 1024)
+        except OSError:
+            return b''
+
+    def _run(self):
+        buffer = b''
+        number = None
+        while True:
+            data = self._read()
+            if not data:
+                return
+            buffer += data
+            if number is not None:
+                # message body, terminated by Ctrl-Z
+                if b'\x1A' not in buffer:
+                    continue
+                body, buffer = buffer.split(b'\x1A', 1)
+                if number in self.fail_numbers:
+                    self._reply('\r\n+CMS ERROR: 500\r\n', self.send_delay)
+                else:
+                    self._reference += 1
+                    self.messages.append((number, body.decode(errors='replace')))
+                    self._reply('\r\n+CMGS: %d\r\n\r\nOK\r\n' % self._reference, self.send_delay)
+                number = None
+                continue
+            while b'\r' in buffer:
+                line, buffer = buffer.split(b'\r', 1)
+                command = line.decode(errors='replace').strip()
+                if not command:
+                    continue
+                self.commands.append(command)
+                echo = command + '\r' if self.echo else ''
+                upper = command.upper()
+                if upper == 'AT':
+                    self._reply(echo + '\r\nOK\r\n')
+                elif upper in ('ATE0', 'ATE1'):
+                    self.echo = upper == 'ATE1'
+                    self._reply(echo + '\r\nOK\r\n')
+                elif upper == 'AT+CMGF=1':
+                    self.text_mode = True
+                    self._reply(echo + '\r\nOK\r\n')
+                elif upper in ('AT+CSCS="GSM"', 'AT+CSCS="IRA"'):
+                    self.charset = command.split('"')[1]
+                    self._reply(echo + '\r\nOK\r\n')
+                elif upper.startswith('AT+CMGS=') and self.text_mode:
+                    number = command.split('=', 1)[1].strip('"')
+                    self._reply(echo + '\r\n> ')
+                    break
+                else:
+                    self._reply(echo + '\r\nERROR\r\n')
+
+
+if __name__ == '__main__':
+    modem = FakeModem()
+    print("Fake modem listening on", modem.port)
+    try:
+        while True:
+            sleep(1)
+            while modem.messages:
+                print("SMS to %s: %s" % modem.messages.pop(0))
+    except KeyboardInterrupt:
+        modem.close()
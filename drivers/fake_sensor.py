@@ -0,0 +1,322 @@
+import os
+import struct
+import termios
+import tty
+from hashlib import sha256
+from threading import Thread, Lock
+from time import monotonic, sleep
+
+# Pseudo-terminal that answers like an R307/AS608 fingerprint sensor, for running
+# the scan and enrollment paths without hardware. Point pyserial (and through it
+# adafruit_fingerprint) at `port`; the library talks the real packet protocol.
+#
+#   sensor = FakeSensor()
+#   sensor.touch('student-1')      # a finger is on the glass for touch_seconds
+#
+# A "person" is any string: enrolling it stores a template derived from it, and
+# searching finds the slot holding that template. The sensor only answers when
+# the port runs at its baud rate, like the real one after set_sysparam.
+
+STARTCODE = 0xEF01
+COMMAND = 0x01
+DATA = 0x02
+ACK = 0x07
+END_DATA = 0x08
+
+OK = 0x00
+PACKETRECIEVEERR = 0x01
+NOFINGER = 0x02
+IMAGEFAIL = 0x03
+ENROLLMISMATCH = 0x0A
+BADLOCATION = 0x0B
+DBREADFAIL = 0x0C
+UPLOADFEATUREFAIL = 0x0D
+NOTFOUND = 0x09
+INVALIDREG = 0x1A
+
+TEMPLATE_SIZE = 512
+PACKET_SIZES = (32, 64, 128, 256)
+
+BAUDRATES = {}
+for rate in (9600, 19200, 38400, 57600, 115200):
+    BAUDRATES[getattr(termios, 'B%d' % rate)] = rate
+
+
+def template_of(person):
+    seed = sha256(person.encode()).digest()
+    return (seed * (TEMPLATE_SIZE // len(seed)))[:TEMPLATE_SIZE]
+
+
+def packet(pid, payload):
+    length = len(payload) + 2
+    checksum = (pid + (length >> 8) + (length & 0xFF) + sum(payload)) & 0xFFFF
+    return struct.pack('>HBBBBBH', STARTCODE, 0xFF, 0xFF, 0xFF, 0xFF, pid, length) + bytes(payload) + struct.pack('>H', checksum)
+
+
+class FakeSensor:
+    # the delays are the sensor's own processing times, search_delay is per
+    # library slot compared
+    def __init__(self, library_size=162, baudrate=57600, packet_size=128, touch_seconds=0.6,
+                 image_delay=0.15, nofinger_delay=0.03, template_delay=0.1, search_delay=0.0005,
+                 store_delay=0.03, wire_time=True, unsupported=()):
+        self.library_size = library_size
+        self.baudrate = baudrate
+        self.packet_size = packet_size
+        self.touch_seconds = touch_seconds
+        self.image_delay = image_delay
+        self.nofinger_delay = nofinger_delay
+        self.template_delay = template_delay
+        self.search_delay = search_delay
+        self.store_delay = store_delay
+        self.wire_time = wire_time
+        # command codes answered like an unknown command, e.g. 0x1B on sensors
+        # without high-speed search
+        self.unsupported = set(unsupported)
+        self.library = {}
+        self.commands = {}
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self._buffers = {1: None, 2: None}
+        self._image = None
+        self._touches = []
+        self._download = None
+        self._lock = Lock()
+        self._master, self._slave = os.openpty()
+        tty.setraw(self._slave)
+        self.port = os.ttyname(self._slave)
+        self._thread = Thread(target=self._run, name='fake-sensor', daemon=True)
+        self._thread.start()
+
+    def close(self):
+        os.close(self._master)
+        os.close(self._slave)
+
+    # put a finger on the glass after `delay` seconds for `seconds`. result forces
+    # the status of templating it (e.g. IMAGEMESS for a smudged print).
+    def touch(self, person, seconds=None, delay=0, result=OK):
+        start = monotonic() + delay
+        with self._lock:
+            self._touches.append((start, start + (seconds or self.touch_seconds), person, result))
+
+    # store a person's template directly, as if enrolled earlier
+    def enroll(self, location, person):
+        self.library[location] = template_of(person)
+
+    def _finger(self):
+        now = monotonic()
+        with self._lock:
+            self._touches = [touch for touch in self._touches if touch[1] > now]
+            for start, end, person, result in self._touches:
+                if start <= now:
+                    return person, result
+        return None
+
+    def _line_rate(self):
+        try:
+            return BAUDRATES.get(termios.tcgetattr(self._slave)[4])
+        except termios.error:
+            return None
+
+    def _wire(self, count):
+        if self.wire_time:
+            sleep(count * 10 / self.baudrate)
+
+    def _send(self, data):
+        self._wire(len(data))
+        self.bytes_out += len(data)
+        os.write(self._master, data)
+
+    def _reply(self, *payload):
+        self._send(packet(ACK, payload))
+
+    def _read(self):
+        try:
+            return os.read(self._master, 1024)
+        except OSError:
+            return b''
+
+    def _run(self):
+        buffer = b''
+        while True:
+            data = self._read()
+            if not data:
+                return
+            self.bytes_in += len(data)
+            # at the wrong baud rate the sensor only sees noise
+            if self._line_rate() != self.baudrate:
+                continue
+            buffer += data
+            while len(buffer) >= 9:
+                start = buffer.find(struct.pack('>H', STARTCODE))
+                if start < 0:
+                    buffer = b''
+                    break
+                buffer = buffer[start:]
+                if len(buffer) < 9:
+                    break
+                pid, length = struct.unpack('>BH', buffer[6:9])
+                if len(buffer) < 9 + length:
+                    break
+                payload, checksum = buffer[9:7 + length], struct.unpack('>H', buffer[7 + length:9 + length])[0]
+                buffer = buffer[9 + length:]
+                self._wire(9 + length)
+                valid = (pid + (length >> 8) + (length & 0xFF) + sum(payload)) & 0xFFFF == checksum
+                if pid in (DATA, END_DATA):
+                    self._receive_data(pid, payload)
+                elif not valid:
+                    self._reply(PACKETRECIEVEERR)
+                elif pid == COMMAND and payload:
+                    self._command(payload[0], payload[1:])
+
+    def _receive_data(self, pid, payload):
+        if self._download is None:
+            return
+        slot, data = self._download
+        data += payload
+        if pid == END_DATA:
+            self._buffers[slot] = bytes(data)
+            self._download = None
+        else:
+            self._download = (slot, data)
+
+    def _command(self, code, args):
+        self.commands[code] = self.commands.get(code, 0) + 1
+        handler = None if code in self.unsupported else COMMANDS.get(code)
+        if handler is None:
+            self._reply(PACKETRECIEVEERR)
+        else:
+            handler(self, args)
+
+    def verify_password(self, args):
+        self._reply(OK)
+
+    def read_sysparam(self, args):
+        self._reply(OK, *struct.pack('>HHHH4sHH', 0, 0, self.library_size, 3, b'\xff\xff\xff\xff',
+                                     PACKET_SIZES.index(self.packet_size), self.baudrate // 9600))
+
+    def set_sysparam(self, args):
+        number, value = args[0], args[1]
+        if number == 4 and 1 <= value <= 12:
+            self._reply(OK)
+            self.baudrate = value * 9600
+        elif number == 5 and 1 <= value <= 5:
+            self._reply(OK)
+        elif number == 6 and value < len(PACKET_SIZES):
+            self.packet_size = PACKET_SIZES[value]
+            self._reply(OK)
+        else:
+            self._reply(INVALIDREG)
+
+    def template_count(self, args):
+        self._reply(OK, *struct.pack('>H', len(self.library)))
+
+    def template_read(self, args):
+        index = bytearray(32)
+        for location in self.library:
+            offset = location - args[0] * 256
+            if 0 <= offset < 256:
+                index[offset // 8] |= 1 << (offset % 8)
+        self._reply(OK, *index)
+
+    def get_image(self, args):
+        finger = self._finger()
+        if finger is None:
+            sleep(self.nofinger_delay)
+            self._image = None
+            self._reply(NOFINGER)
+        else:
+            sleep(self.image_delay)
+            self._image = finger
+            self._reply(OK)
+
+    def image_2_tz(self, args):
+        sleep(self.template_delay)
+        if self._image is None:
+            self._reply(IMAGEFAIL)
+            return
+        person, result = self._image
+        if result == OK:
+            self._buffers[args[0]] = template_of(person)
+        self._reply(result)
+
+    def search(self, args):
+        slot, start, count = args[0], (args[1] << 8) | args[2], (args[3] << 8) | args[4]
+        wanted = self._buffers.get(slot)
+        end = min(start + count, self.library_size)
+        sleep(self.search_delay * max(0, end - start))
+        for location in range(start, end):
+            if wanted is not None and self.library.get(location) == wanted:
+                self._reply(OK, *struct.pack('>HH', location, 200))
+                return
+        self._reply(NOTFOUND, 0, 0, 0, 0)
+
+    def create_model(self, args):
+        if self._buffers[1] is None or self._buffers[1] != self._buffers[2]:
+            self._reply(ENROLLMISMATCH)
+        else:
+            self._reply(OK)
+
+    def store_model(self, args):
+        slot, location = args[0], (args[1] << 8) | args[2]
+        sleep(self.store_delay)
+        if location >= self.library_size or self._buffers.get(slot) is None:
+            self._reply(BADLOCATION)
+        else:
+            self.library[location] = self._buffers[slot]
+            self._reply(OK)
+
+    def load_model(self, args):
+        slot, location = args[0], (args[1] << 8) | args[2]
+        if location not in self.library:
+            self._reply(DBREADFAIL)
+        else:
+            self._buffers[slot] = self.library[location]
+            self._reply(OK)
+
+    def upload(self, args):
+        data = self._buffers.get(args[0])
+        if data is None:
+            self._reply(UPLOADFEATUREFAIL)
+            return
+        self._reply(OK)
+        chunks = [data[i:i + self.packet_size] for i in range(0, len(data), self.packet_size)]
+        for number, chunk in enumerate(chunks):
+            self._send(packet(END_DATA if number == len(chunks) - 1 else DATA, chunk))
+
+    def download(self, args):
+        self._download = (args[0], b'')
+        self._reply(OK)
+
+    def delete_model(self, args):
+        location, count = (args[0] << 8) | args[1], (args[2] << 8) | args[3]
+        for number in range(location, location + count):
+            self.library.pop(number, None)
+        self._reply(OK)
+
+    def empty_library(self, args):
+        self.library.clear()
+        self._reply(OK)
+
+    def stats(self):
+        return {'commands': dict(self.commands), 'bytes_in': self.bytes_in, 'bytes_out': self.bytes_out,
+                'templates': len(self.library), 'baudrate': self.baudrate, 'packet_size': self.packet_size}
+
+
+COMMANDS = {
+    0x13: FakeSensor.verify_password,
+    0x0F: FakeSensor.read_sysparam,
+    0x0E: FakeSensor.set_sysparam,
+    0x1D: FakeSensor.template_count,
+    0x1F: FakeSensor.template_read,
+    0x01: FakeSensor.get_image,
+    0x02: FakeSensor.image_2_tz,
+    0x04: FakeSensor.search,
+    0x1B: FakeSensor.search,
+    0x05: FakeSensor.create_model,
+    0x06: FakeSensor.store_model,
+    0x07: FakeSensor.load_model,
+    0x08: FakeSensor.upload,
+    0x09: FakeSensor.download,
+    0x0C: FakeSensor.delete_model,
+    0x0D: FakeSensor.empty_library,
+}
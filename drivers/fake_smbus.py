@@ -0,0 +1,49 @@
+# SMBus stand-in for the LCD driver: accepts every write and counts the bytes and
+# transactions that would go over I2C, and how long they would take on the wire.
+I2C_HZ = 100000
+
+
+class FakeSMBus:
+    def __init__(self, hz=I2C_HZ):
+        self.hz = hz
+        self.reset()
+
+    def reset(self):
+        self.bytes = 0
+        self.transactions = 0
+
+    def _count(self, payload):
+        # address byte + payload, each byte is 9 clocks on the wire
+        self.bytes += 1 + payload
+        self.transactions += 1
+
+    def write_byte(self, addr, value):
+        self._count(1)
+
+    def write_byte_data(self, addr, cmd, value):
+        self._count(2)
+
+    def write_block_data(self, addr, cmd, data):
+        self._count(2 + len(data))
+
+    def write_i2c_block_data(self, addr, cmd, data):
+        self._count(1 + len(data))
+
+    def read_byte(self, addr):
+        self._count(1)
+        return 0
+
+    def read_byte_data(self, addr, cmd):
+        self._count(2)
+        return 0
+
+    def read_block_data(self, addr, cmd):
+        self._count(2)
+        return []
+
+    def wire_seconds(self):
+        # 9 clocks per byte plus roughly 2 for start/stop per transaction
+        return (self.bytes * 9 + self.transactions * 2) / self.hz
+
+    def stats(self):
+        return {'bytes': self.bytes, 'transactions': self.transactions, 'wire_seconds': round(self.wire_seconds(), 4)}
@@ -0,0 +1,271 @@
+import adafruit_fingerprint
+import struct
+from threading import Event, RLock
+from time import monotonic, perf_counter, sleep
+
+# returned in place of a sensor status code
+TIMEOUT = 'timeout'
+CANCELLED = 'cancelled'
+
+# set_sysparam parameter numbers and the data packet size codes of R307/AS608 sensors
+BAUD_PARAM = 4
+PACKET_PARAM = 6
+PACKET_SIZES = {32: 0, 64: 1, 128: 2, 256: 3}
+
+# search commands; the library's finger_search() always searches every page and
+# reads the system parameters first
+SEARCH = 0x04
+HISPEED_SEARCH = 0x1B
+
+
+# Open the sensor at the first of `baudrates` it answers at. A rate set with
+# set_sysparam is kept across power cycles, so the sensor may no longer be at
+# its 57600 default.
+def connect(uart, baudrates):
+    for baudrate in baudrates:
+        uart.baudrate = baudrate
+        uart.reset_input_buffer()
+        try:
+            return adafruit_fingerprint.Adafruit_Fingerprint(uart)
+        except (RuntimeError, OSError):
+            continue
+    raise RuntimeError('Failed to find sensor at %s baud' % '/'.join(map(str, baudrates)))
+
+
+# Move the link to `baudrate` (a multiple of 9600 up to 115200) and data packets of
+# `packet_size` bytes. The sensor acknowledges at the old rate and answers at the
+# new one, so the new rate is confirmed with read_sysparam and the uart goes back
+# to the old rate if that fails. Returns the baud rate and packet size in use.
+def negotiate(finger, uart, baudrate, packet_size):
+    current = uart.baudrate
+    if baudrate != current:
+        try:
+            finger.set_sysparam(BAUD_PARAM, baudrate // 9600)
+            sleep(0.1)
+            uart.baudrate = baudrate
+            uart.reset_input_buffer()
+            if finger.read_sysparam() != adafruit_fingerprint.OK:
+                raise RuntimeError('no answer at %d baud' % baudrate)
+        except (RuntimeError, OSError) as e:
+            print("Error:", str(e))
+            uart.baudrate = current
+            uart.reset_input_buffer()
+    try:
+        if finger.data_packet_size != PACKET_SIZES[packet_size]:
+            finger.set_sysparam(PACKET_PARAM, PACKET_SIZES[packet_size])
+        finger.read_sysparam()
+    except (RuntimeError, OSError) as e:
+        print("Error:", str(e))
+    sizes = {code: size for size, code in PACKET_SIZES.items()}
+    return uart.baudrate, sizes.get(finger.data_packet_size)
+
+
+# Search `count` library pages from `start` for the template in char buffer 1, like
+# finger_search(). Sets finger_id and confidence, returns the status code.
+def search(finger, start, count, fast=False):
+    finger._send_packet([HISPEED_SEARCH if fast else SEARCH, 0x01, start >> 8, start & 0xFF, count >> 8, count & 0xFF])
+    r = read_reply(finger)
+    if len(r) < 5:
+        # an error reply carries only the status code
+        return r[0]
+    finger.finger_id, finger.confidence = struct.unpack('>HH', bytes(r[1:5]))
+    return r[0]
+
+
+# Payload of an acknowledge packet of whatever length the sensor sent: a command
+# it rejects answers with a 12-byte packet where the reply would be longer, which
+# _get_packet(expected) only reports as a timeout.
+def read_reply(finger):
+    header = finger._uart.read(9)
+    if not header or len(header) != 9:
+        raise RuntimeError('Failed to read data from sensor')
+    start, packet_type, length = struct.unpack('>H4xBH', header)
+    if start != 0xEF01 or packet_type != 0x07 or length < 3:
+        finger._uart.reset_input_buffer()
+        raise RuntimeError('Incorrect packet data')
+    body = finger._uart.read(length)
+    if not body or len(body) != length:
+        raise RuntimeError('Failed to read data from sensor')
+    return list(body[:-2])
+
+
+# Paced capture loop around an Adafruit_Fingerprint sensor. Polling starts fast when
+# wake() is called (the button was pressed, or a finger was just read) and backs off
+# towards `slow` while no finger shows up, so an idle sensor is not flooded with
+# GetImage packets. Every polling phase has a timeout and can be cancelled, and all
+# commands are counted.
+# observe(phase, seconds), when given, is called with the time of every command.
+# The lock serialises scans and enrollments that share the sensor.
+#
+# fast_search picks the high-speed search command: None tries it once and falls
+# back to the normal search for good when the sensor rejects it.
+class CaptureEngine:
+    def __init__(self, finger, fast=0.05, slow=0.4, backoff=1.25, wake_window=5, timeouts=None, observe=None, fast_search=None):
+        self.finger = finger
+        self.observe = observe
+        self.fast_search = fast_search
+        self.fast = fast
+        self.slow = slow
+        self.backoff = backoff
+        self.wake_window = wake_window
+        self.timeouts = {'image': 10, 'remove': 10}
+        if timeouts:
+            self.timeouts.update(timeouts)
+        self.lock = RLock()
+        self.packets = {}
+        self.matches = 0
+        self.match_packets = 0
+        self.last_match_packets = 0
+        self._since_match = 0
+        self._sent = 0
+        self._woken = None
+        self._wakeup = Event()
+
+    # the user is about to touch the sensor, poll fast again
+    def wake(self):
+        self._woken = monotonic()
+        self._wakeup.set()
+
+    def _call(self, phase, command, *args):
+        self.packets[phase] = self.packets.get(phase, 0) + 1
+        self._sent += 1
+        if self.observe is None:
+            return command(*args)
+        started = perf_counter()
+        try:
+            return command(*args)
+        finally:
+            self.observe(phase, perf_counter() - started)
+
+    def _interval(self):
+        if self._woken is not None and monotonic() - self._woken < self.wake_window:
+            return self.fast
+        return self.slow
+
+    # call command until it returns one of `until`, TIMEOUT or CANCELLED
+    def poll(self, phase, command, until, timeout=None, cancelled=None):
+        timeout = self.timeouts.get(phase) if timeout is None else timeout
+        deadline = monotonic() + timeout if timeout else None
+        interval = self._interval()
+        with self.lock:
+            while True:
+                result = self._call(phase, command)
+                if result in until:
+                    return result
+                if cancelled is not None and cancelled():
+                    return CANCELLED
+                if deadline is not None and monotonic() >= deadline:
+                    return TIMEOUT
+                self._wakeup.clear()
+                if self._wakeup.wait(interval):
+                    interval = self.fast
+                else:
+                    interval = min(self.slow, interval * self.backoff)
+
+    def wait_image(self, cancelled=None, timeout=None):
+        return self.poll('image', self.finger.get_image, (adafruit_fingerprint.OK,), timeout, cancelled)
+
+    def wait_removed(self, cancelled=None, timeout=None):
+        return self.poll('remove', self.finger.get_image, (adafruit_fingerprint.NOFINGER,), timeout, cancelled)
+
+    def template(self, slot=1):
+        return self._call('template', self.finger.image_2_tz, slot)
+
+    # search pages [start, start + count), the whole library by default
+    def search(self, start=0, count=None):
+        if count is None:
+            count = self.finger.library_size - start
+        if self.fast_search is not False:
+            try:
+                result = self._call('search', search, self.finger, start, count, True)
+            except RuntimeError:
+                if self.fast_search:
+                    raise
+                # a garbled answer to the first try: drop what is left of it
+                self.finger._uart.reset_input_buffer()
+                result = None
+            if result in (adafruit_fingerprint.OK, adafruit_fingerprint.NOTFOUND):
+                self.fast_search = True
+                return result
+            if self.fast_search:
+                return result
+            self.fast_search = False
+        return self._call('search', search, self.finger, start, count)
+
+    def create_model(self):
+        return self._call('model', self.finger.create_model)
+
+    def store(self, location, slot=1):
+        return self._call('store', self.finger.store_model, location, slot)
+
+    def delete(self, location):
+        with self.lock:
+            return self._call('delete', self.finger.delete_model, location)
+
+    # the template in `location` as bytes, None when the slot cannot be loaded
+    def download(self, location):
+        with self.lock:
+            if self._call('backup', self.finger.load_model, location) != adafruit_fingerprint.OK:
+                return None
+            return bytes(self._call('backup', self.finger.get_fpdata, 'char', 1))
+
+    # write a downloaded template back into `location`
+    def upload(self, location, data):
+        with self.lock:
+            if not self._call('restore', self.finger.send_fpdata, list(data), 'char', 1):
+                return None
+            return self._call('restore', self.finger.store_model, location, 1)
+
+    # library size from the system parameters and the set of slots holding a template
+    def library(self):
+        with self.lock:
+            if self._call('library', self.finger.read_sysparam) != adafruit_fingerprint.OK:
+                raise IOError('could not read sensor parameters')
+            if self._call('library', self.finger.read_templates) != adafruit_fingerprint.OK:
+                raise IOError('could not read sensor template index')
+            return self.finger.library_size, set(self.finger.templates)
+
+    # full scan: wait for a finger, template it and search the library, or only the
+    # (start, count) pages of `pages`. progress is called with 'template' and
+    # 'search' so the caller can update the display.
+    # Packets of failed scans are charged to the next successful match.
+    def identify(self, cancelled=None, timeout=None, progress=None, pages=None):
+        with self.lock:
+            sent = self._sent
+            result = self._identify(cancelled, timeout, progress, pages)
+            self._since_match += self._sent - sent
+            if result == adafruit_fingerprint.OK:
+                self.matches += 1
+                self.match_packets += self._since_match
+                self.last_match_packets = self._since_match
+                self._since_match = 0
+            return result
+
+    # a reader without a button calls this back to back, so only a finger on the
+    # glass speeds up the polling, for the next student in the queue
+    def _identify(self, cancelled, timeout, progress, pages):
+        result = self.wait_image(cancelled, timeout)
+        if result != adafruit_fingerprint.OK:
+            return result
+        self.wake()
+        if progress is not None:
+            progress('template')
+        result = self.template(1)
+        if result != adafruit_fingerprint.OK:
+            return result
+        if progress is not None:
+            progress('search')
+        if pages is not None:
+            return self.search(*pages)
+        return self.search()
+
+    def stats(self):
+        total = sum(self.packets.values())
+        return {
+            'packets': dict(self.packets),
+            'total_packets': total,
+            'matches': self.matches,
+            'packets_per_match': round(self.match_packets / self.matches, 1) if self.matches else None,
+            'last_match_packets': self.last_match_packets,
+            'fast_search': self.fast_search,
+        }
@@ -0,0 +1,105 @@
+import re
+import serial
+from time import monotonic
+
+CMGS_REFERENCE = re.compile(r'\+CMGS:\s*(\d+)')
+
+
+class ModemError(IOError):
+    pass
+
+
+# the message went to the modem but its reply never came: it may have been sent
+class SendUnconfirmed(ModemError):
+    pass
+
+
+# AT command driver for the SIM800-class modem on /dev/ttyUSB0. Every command reads
+# the reply until its final result code (OK, ERROR, +CME/+CMS ERROR or the '>' text
+# prompt) instead of sleeping a fixed time, so a command costs what the modem needs.
+# Text mode, the GSM character set and echo-off are set up once per open port.
+class GsmModem:
+    def __init__(self, port='/dev/ttyUSB0', baudrate=9600, timeout=5, send_timeout=60):
+        self.port = port
+        self.baudrate = baudrate
+        self.timeout = timeout
+        self.send_timeout = send_timeout
+        self.serial = None
+        self.configured = False
+
+    def open(self):
+        if self.serial is None or not self.serial.is_open:
+            self.serial = serial.Serial(self.port, baudrate=self.baudrate, timeout=0.05)
+            self.configured = False
+        return self.serial
+
+    def close(self):
+        if self.serial is not None:
+            try:
+                self.serial.close()
+            except Exception:
+                pass
+        self.serial = None
+        self.configured = False
+
+    # read until a final result code, returns the reply lines without it
+    def read_response(self, timeout=None, prompt=False):
+        deadline = monotonic() + (timeout or self.timeout)
+        buffer = b''
+        while monotonic() < deadline:
+            buffer += self.serial.read(self.serial.in_waiting or 1)
+            if prompt and buffer.rstrip().endswith(b'>'):
+                return buffer.decode(errors='replace').split('\r\n')[:-1]
+            if not buffer.endswith(b'\r\n'):
+                continue
+            lines = [line for line in buffer.decode(errors='replace').split('\r\n') if line.strip()]
+            if not lines:
+                continue
+            last = lines[-1].strip()
+            if last == 'OK':
+                return lines[:-1]
+            if last == 'ERROR' or last.startswith('+CME ERROR') or last.startswith('+CMS ERROR'):
+                raise ModemError(last)
+        raise ModemError('timeout waiting for modem: %r' % buffer)
+
+    def command(self, command, timeout=None, prompt=False):
+        port = self.open()
+        port.reset_input_buffer()
+        port.write((command + '\r').encode())
+        return self.read_response(timeout, prompt)
+
+    def configure(self):
+        if self.configured:
+            return
+        self.command('AT')
+        self.command('ATE0')
+        self.command('AT+CMGF=1')
+        self.command('AT+CSCS="GSM"')
+        self.configured = True
+
+    # send a text message and return the modem's message reference
+    def send_sms(self, number, body):
+        try:
+            self.configure()
+            self.command(f'AT+CMGS="{number}"', prompt=True)
+            self.serial.write(body.encode() + b'\x1A')
+            try:
+                lines = self.read_response(self.send_timeout)
+            except ModemError as e:
+                if not str(e).startswith('timeout'):
+                    raise
+                raise SendUnconfirmed(str(e))
+        except ModemError as e:
+            # +CMS/+CME errors are about this message, anything else may be the port
+            if not str(e).startswith('+CM'):
+                self.close()
+            raise
+        except (serial.SerialException, OSError):
+            # start from a fresh port and configuration next time
+            self.close()
+            raise
+        for line in lines:
+            result = CMGS_REFERENCE.search(line)
+            if result:
+                return int(result.group(1))
+        return None
@@ -0,0 +1,65 @@
+from threading import Lock
+from time import monotonic
+
+
+# Stand-in for a hardware object that is only built the first time it is used.
+# Attribute access, iteration and len() go to the real object, so code holding
+# the stand-in does not need to know whether the device is open yet.
+class Lazy:
+    def __init__(self, name, factory):
+        self._lazy_name = name
+        self._lazy_factory = factory
+        self._lazy_lock = Lock()
+        self._lazy_value = None
+        self._lazy_created = False
+        self._lazy_seconds = None
+
+    def _lazy_get(self):
+        if not self._lazy_created:
+            with self._lazy_lock:
+                if not self._lazy_created:
+                    started = monotonic()
+                    self._lazy_value = self._lazy_factory()
+                    self._lazy_seconds = monotonic() - started
+                    self._lazy_created = True
+        return self._lazy_value
+
+    def __getattr__(self, attr):
+        return getattr(self._lazy_get(), attr)
+
+    def __iter__(self):
+        return iter(self._lazy_get())
+
+    def __len__(self):
+        return len(self._lazy_get())
+
+    def __repr__(self):
+        if self._lazy_created:
+            return repr(self._lazy_value)
+        return '<Lazy %s (not created)>' % self._lazy_name
+
+
+# Devices by name, each created by its factory on first use. Importing the app
+# (for `flask createdb` and the like) touches none of them.
+class Hardware:
+    def __init__(self):
+        self._devices = {}
+
+    def add(self, name, factory):
+        device = Lazy(name, factory)
+        self._devices[name] = device
+        return device
+
+    def created(self, name):
+        return self._devices[name]._lazy_created
+
+    def get(self, name):
+        return self._devices[name]._lazy_get()
+
+    # which devices exist and how long each took to set up
+    def status(self):
+        return {
+            name: {'created': device._lazy_created,
+                   'seconds': round(device._lazy_seconds, 3) if device._lazy_seconds is not None else None}
+            for name, device in self._devices.items()
+        }
@@ -1,13 +1,46 @@
-from smbus import SMBus
-from RPi.GPIO import RPI_REVISION
 from time import sleep
-from re import findall, match
+from re import findall, compile as re_compile
 from subprocess import check_output
-from os.path import exists
+from os import makedirs
+from os.path import exists, dirname
+from functools import lru_cache
+try:
+    from smbus2 import i2c_msg
+except ImportError:
+    i2c_msg = None
 
 # old and new versions of the RPi have swapped the two i2c buses
 # they can be identified by RPI_REVISION (or check sysfs)
-BUS_NUMBER = 0 if RPI_REVISION == 1 else 1
+@lru_cache(maxsize=None)
+def bus_number():
+    from RPi.GPIO import RPI_REVISION
+    return 0 if RPI_REVISION == 1 else 1
+
+
+# first address i2cdetect finds on the bus, None when there is none
+def detect_address(bus):
+    if not exists('/usr/sbin/i2cdetect'):
+        return None
+    found = findall("[0-9a-z]{2}(?!:)", check_output(['/usr/sbin/i2cdetect', '-y', str(bus)]).decode())
+    return int(found[0], base=16) if found else None
+
+
+# Address from the cache file, else detected once and written there, since
+# i2cdetect takes a good part of a second on a Pi Zero. Delete the file after
+# swapping the LCD backpack.
+def cached_address(path, bus):
+    if path and exists(path):
+        try:
+            with open(path) as cache:
+                return int(cache.read().strip(), base=16)
+        except ValueError:
+            pass
+    addr = detect_address(bus)
+    if path and addr is not None:
+        makedirs(dirname(path) or '.', exist_ok=True)
+        with open(path, 'w') as cache:
+            cache.write('0x%02x\n' % addr)
+    return addr
 
 # other commands
 LCD_CLEARDISPLAY = 0x01
@@ -55,19 +88,50 @@ En = 0b00000100  # Enable bit
 Rw = 0b00000010  # Read/Write bit
 Rs = 0b00000001  # Register select bit
 
+# DDRAM address of the first cell of lines 1-4 on a 20x4 panel
+LINE_ADDRESSES = (0x00, 0x40, 0x14, 0x54)
+
+# largest payload for one SMBus block write (command byte + 32 data bytes)
+I2C_BLOCK_MAX = 33
+
+EXTENDED_SYMBOL = re_compile(r'\{0[xX]([0-9a-fA-F]{2})\}')
+
+
+# turn an extended string with {0xFF} placeholders into the bytes sent to the lcd.
+# Strings repeat a lot (status screens), so the result is cached.
+@lru_cache(maxsize=256)
+def encode_extended_string(string):
+    data = bytearray()
+    pos = 0
+    for result in EXTENDED_SYMBOL.finditer(string):
+        data += encode_string(string[pos:result.start()])
+        data.append(int(result.group(1), 16))
+        pos = result.end()
+    data += encode_string(string[pos:])
+    return bytes(data)
+
+
+def encode_string(string):
+    return bytes(ord(char) & 0xFF for char in string)
+
 class I2CDevice:
-    def __init__(self, addr=None, addr_default=None, bus=BUS_NUMBER):
+    # bus is either a bus number (None for the board's header bus) or an already
+    # opened SMBus-like object. address_cache is a file keeping the detected address.
+    def __init__(self, addr=None, addr_default=None, bus=None, address_cache=None):
+        if bus is None:
+            bus = bus_number()
         if not addr:
             # try autodetect address, else use default if provided
             try:
-                self.addr = int('0x{}'.format(
-                    findall("[0-9a-z]{2}(?!:)", check_output(['/usr/sbin/i2cdetect', '-y', str(BUS_NUMBER)]).decode())[0]), base=16) \
-                    if exists('/usr/sbin/i2cdetect') else addr_default
-            except:
+                self.addr = cached_address(address_cache, bus if isinstance(bus, int) else bus_number()) or addr_default
+            except Exception:
                 self.addr = addr_default
         else:
             self.addr = addr
-        self.bus = SMBus(bus)
+        if isinstance(bus, int):
+            from smbus import SMBus
+            bus = SMBus(bus)
+        self.bus = bus
 
     # write a single command
     def write_cmd(self, cmd):
@@ -84,6 +148,19 @@ class I2CDevice:
         self.bus.write_block_data(self.addr, cmd, data)
         sleep(0.0001)
 
+    # write a raw byte stream in as few bus transactions as possible. The PCF8574
+    # backpack latches every byte it receives, so the stream can be split anywhere.
+    def write_stream(self, data):
+        if i2c_msg is not None and hasattr(self.bus, 'i2c_rdwr'):
+            self.bus.i2c_rdwr(i2c_msg.write(self.addr, data))
+            return
+        for start in range(0, len(data), I2C_BLOCK_MAX):
+            chunk = data[start:start + I2C_BLOCK_MAX]
+            if len(chunk) == 1:
+                self.bus.write_byte(self.addr, chunk[0])
+            else:
+                self.bus.write_i2c_block_data(self.addr, chunk[0], list(chunk[1:]))
+
     # read a single byte
     def read(self):
         return self.bus.read_byte(self.addr)
@@ -98,9 +175,9 @@ class I2CDevice:
 
 
 class Lcd:
-    def __init__(self, addr=None):
+    def __init__(self, addr=None, bus=None, address_cache=None):
         self.addr = addr
-        self.lcd = I2CDevice(addr=self.addr, addr_default=0x27)
+        self.lcd = I2CDevice(addr=self.addr, addr_default=0x27, bus=bus, address_cache=address_cache)
         self.lcd_write(0x03)
         self.lcd_write(0x03)
         self.lcd_write(0x03)
@@ -151,16 +228,8 @@ class Lcd:
             self.lcd_write(0x94)
         if line == 4:
             self.lcd_write(0xD4)
-        # Process the string
-        while string:
-            # Trying to find pattern {0xFF} representing a symbol
-            result = match(r'\{0[xX][0-9a-fA-F]{2}\}', string)
-            if result:
-                self.lcd_write(int(result.group(0)[1:-1], 16), Rs)
-                string = string[6:]
-            else:
-                self.lcd_write(ord(string[0]), Rs)
-                string = string[1:]
+        for char in encode_extended_string(string):
+            self.lcd_write(char, Rs)
 
     # clear lcd and set to home
     def lcd_clear(self):
@@ -175,6 +244,131 @@ class Lcd:
         elif state == 0:
             self.lcd.write_cmd(LCD_NOBACKLIGHT)
 
+class BufferedLcd(Lcd):
+    # Framebuffer mode. Drawing calls only update a target framebuffer; lcd_flush()
+    # compares it with a shadow of what the panel already shows and sends just the
+    # changed cells, with all nibble/strobe writes packed into block transfers.
+    # Both buffers mirror the controller's two 40 byte DDRAM rows, which hold the
+    # 4x20 panel (lines 1/3 share row 0, lines 2/4 share row 1).
+    def __init__(self, addr=None, bus=None, autoflush=False, address_cache=None):
+        self._ready = False
+        super().__init__(addr=addr, bus=bus, address_cache=address_cache)
+        self.autoflush = autoflush
+        self._shadow = [bytearray(b' ' * 40), bytearray(b' ' * 40)]
+        self._target = [bytearray(b' ' * 40), bytearray(b' ' * 40)]
+        self._cursor = None
+        self._shift = 0
+        self._glyphs = None
+        self._ready = True
+
+    # encode (byte, mode) pairs into one PCF8574 byte stream. Each nibble costs two
+    # bytes (enable high, enable low); a setup byte is only needed when RS changes.
+    def _encode(self, seq):
+        data = bytearray()
+        last_mode = None
+        for value, mode in seq:
+            for nibble in (value & 0xF0, (value << 4) & 0xF0):
+                out = mode | nibble | LCD_BACKLIGHT
+                if mode != last_mode:
+                    data.append(out)
+                    last_mode = mode
+                data.append(out | En)
+                data.append(out)
+        return bytes(data)
+
+    def _transfer(self, seq):
+        if seq:
+            self.lcd.write_stream(self._encode(seq))
+
+    # commands written directly (backlight, user code) bypass the framebuffer
+    def lcd_write(self, cmd, mode=0):
+        if not self._ready:
+            super().lcd_write(cmd, mode)
+            return
+        self._transfer([(cmd, mode)])
+        self._cursor = None
+        if mode == 0 and cmd in (LCD_CLEARDISPLAY, LCD_RETURNHOME):
+            # both take ~1.5ms and reset the display shift, clear also blanks DDRAM
+            sleep(0.002)
+            self._shift = 0
+            if cmd == LCD_CLEARDISPLAY:
+                for row in self._shadow:
+                    row[:] = b' ' * 40
+
+    def _put(self, data, line, wrap=False):
+        address = LINE_ADDRESSES[line - 1]
+        row, offset = address >> 6, address & 0x3F
+        target = self._target[row]
+        if wrap:
+            for i, char in enumerate(data[:40]):
+                target[(offset + i) % 40] = char
+        else:
+            data = data[:40 - offset]
+            target[offset:offset + len(data)] = data
+        if self.autoflush:
+            self.lcd_flush()
+
+    def lcd_display_string(self, string, line):
+        self._put(encode_string(string), line)
+
+    def lcd_display_extended_string(self, string, line):
+        self._put(encode_extended_string(string), line)
+
+    # blank the framebuffer; nothing is sent until the next flush
+    def lcd_clear(self):
+        for row in self._target:
+            row[:] = b' ' * 40
+        if self._shift:
+            self.lcd_write(LCD_RETURNHOME)
+        if self.autoflush:
+            self.lcd_flush()
+
+    # send the difference between the framebuffer and the panel. Unchanged cells
+    # between two changes are rewritten when that is cheaper than a new address.
+    def lcd_flush(self):
+        seq = []
+        for row in (0, 1):
+            shadow, target = self._shadow[row], self._target[row]
+            changed = [col for col in range(40) if shadow[col] != target[col]]
+            start = 0
+            while start < len(changed):
+                stop = start
+                while stop + 1 < len(changed) and changed[stop + 1] - changed[stop] <= 2:
+                    stop += 1
+                first, last = changed[start], changed[stop]
+                address = (row << 6) | first
+                if self._cursor != address:
+                    seq.append((LCD_SETDDRAMADDR | address, 0))
+                seq.extend((char, Rs) for char in target[first:last + 1])
+                self._cursor = ((row << 6) | (last + 1)) if last < 39 else None
+                start = stop + 1
+            shadow[:] = target
+        self._transfer(seq)
+        return len(seq)
+
+    # write up to 40 characters into the DDRAM row behind a line so it can be scrolled
+    # with lcd_shift_display(). The controller shifts every line together and the
+    # tail lands in the paired line (3 for 1, 4 for 2), so use it for single-line screens.
+    def lcd_display_long_string(self, string, line):
+        self._put(encode_string(string), line, wrap=True)
+
+    # hardware display shift, one command per step instead of rewriting the line.
+    # Positive steps scroll the text to the left.
+    def lcd_shift_display(self, steps=1):
+        direction = LCD_MOVELEFT if steps > 0 else LCD_MOVERIGHT
+        self.lcd_flush()
+        self._transfer([(LCD_CURSORSHIFT | LCD_DISPLAYMOVE | direction, 0)] * abs(steps))
+        self._shift = (self._shift + steps) % 40
+
+    # load all eight custom characters (64 bytes, already encoded) in one transfer.
+    # Reloading the same glyphs is skipped.
+    def lcd_load_custom_chars(self, data):
+        if data == self._glyphs:
+            return
+        self._transfer([(LCD_SETCGRAMADDR, 0)] + [(char, Rs) for char in data])
+        self._cursor = None
+        self._glyphs = data
+
 class CustomCharacters:
     def __init__(self, lcd):
         self.lcd = lcd
@@ -251,22 +445,25 @@ class CustomCharacters:
                             "10001",
                             "11111"]
 
+    # encode the character rows into the 64 bytes stored in CG RAM
+    def custom_characters_bytes(self):
+        self.chars_list = [self.char_1_data, self.char_2_data, self.char_3_data,
+                           self.char_4_data, self.char_5_data, self.char_6_data,
+                           self.char_7_data, self.char_8_data]
+        return bytes(int(line, 2) for char in self.chars_list for line in char)
+
     # load custom character data to CG RAM for later use in extended string. Data for  
     # characters is hold in file custom_characters.txt in the same folder as i2c_dev.py 
     # file. These custom characters can be used in printing of extended string with a 
     # placeholder with desired character codes: 1st - {0x00}, 2nd - {0x01}, 3rd - {0x02},
     # 4th - {0x03}, 5th - {0x04}, 6th - {0x05}, 7th - {0x06} and 8th - {0x07}.
     def load_custom_characters_data(self):
-        self.chars_list = [self.char_1_data, self.char_2_data, self.char_3_data,
-                           self.char_4_data, self.char_5_data, self.char_6_data,
-                           self.char_7_data, self.char_8_data]
+        data = self.custom_characters_bytes()
+        if hasattr(self.lcd, 'lcd_load_custom_chars'):
+            self.lcd.lcd_load_custom_chars(data)
+            return
 
-        # commands to load character adress to RAM srarting from desired base adresses:
-        char_load_cmds = [0x40, 0x48, 0x50, 0x58, 0x60, 0x68, 0x70, 0x78]
-        for char_num in range(8):
-            # command to start loading data into CG RAM:
-            self.lcd.lcd_write(char_load_cmds[char_num])
-            for line_num in range(8):
-                line = self.chars_list[char_num][line_num]
-                binary_str_cmd = "0b000{0}".format(line)
-                self.lcd.lcd_write(int(binary_str_cmd, 2), Rs)
+        # CG RAM auto-increments, so one address command covers all eight characters
+        self.lcd.lcd_write(LCD_SETCGRAMADDR)
+        for line in data:
+            self.lcd.lcd_write(line, Rs)
@@ -0,0 +1,63 @@
+from threading import Lock
+
+from .fake_gpio import FakeGpio
+from .fake_modem import FakeModem
+from .fake_sensor import FakeSensor
+from .fake_smbus import FakeSMBus
+
+
+# Simulated hardware for running the app and the benchmarks on a plain Linux box:
+# a FakeSensor pty per reader port, the LCD on a FakeSMBus, a pty FakeModem and
+# FakeGpio for the buttons. adafruit_fingerprint, GsmModem and BufferedLcd run
+# against them unchanged. Every device is created on first use.
+class Simulator:
+    def __init__(self, sensor_options=None, modem_options=None):
+        self.sensor_options = sensor_options or {}
+        self.modem_options = modem_options or {}
+        self.sensors = {}
+        self._gpio = None
+        self._smbus = None
+        self._modem = None
+        self._lock = Lock()
+
+    # the fake sensor standing in for a reader's serial port
+    def sensor(self, port):
+        with self._lock:
+            if port not in self.sensors:
+                self.sensors[port] = FakeSensor(**self.sensor_options)
+            return self.sensors[port]
+
+    @property
+    def gpio(self):
+        with self._lock:
+            if self._gpio is None:
+                self._gpio = FakeGpio()
+            return self._gpio
+
+    @property
+    def smbus(self):
+        with self._lock:
+            if self._smbus is None:
+                self._smbus = FakeSMBus()
+            return self._smbus
+
+    @property
+    def modem(self):
+        with self._lock:
+            if self._modem is None:
+                self._modem = FakeModem(**self.modem_options)
+            return self._modem
+
+    # a student at a reader: finger on the sensor of `port`, and the button pressed
+    def touch(self, port, person, button=None, **options):
+        self.sensor(port).touch(person, **options)
+        if button is not None:
+            self.gpio.press(button)
+
+    def stats(self):
+        return {
+            'sensors': {port: sensor.stats() for port, sensor in self.sensors.items()},
+            'lcd': self._smbus.stats() if self._smbus is not None else None,
+            'buttons': self._gpio.edges if self._gpio is not None else None,
+            'sms': len(self._modem.messages) if self._modem is not None else None,
+        }
@@ -0,0 +1,103 @@
+import json
+from collections import deque
+from threading import Condition
+from time import time, monotonic
+
+
+class Event:
+    __slots__ = ('seq', 'name', 'data', 'scopes')
+
+    def __init__(self, seq, name, data, scopes):
+        self.seq = seq
+        self.name = name
+        self.data = data
+        self.scopes = scopes
+
+
+# In-process publish/subscribe for the live pages. Events go into one ring of
+# the last `replay` events; a subscriber is only a cursor into it and a set of
+# scopes ('teacher:<id>', 'course:<id>'), so an idle subscriber costs a thread
+# parked on the shared condition and nothing per event it is not shown. Event
+# ids carry the process start, so a browser reconnecting to a restarted server,
+# or one further behind than the ring goes, is told to reload instead.
+#
+# Only this process's writes are seen: the app runs as a single process.
+class EventBus:
+    def __init__(self, replay=256):
+        self.epoch = '%x' % int(time() * 1000)
+        self._events = deque(maxlen=replay)
+        self._seq = 0
+        self._condition = Condition()
+        self.published = 0
+        self.subscribers = 0
+
+    def publish(self, name, data, scopes):
+        with self._condition:
+            self._seq += 1
+            self._events.append(Event(self._seq, name, data, frozenset(scopes)))
+            self.published += 1
+            self._condition.notify_all()
+
+    def event_id(self, seq):
+        return '%s-%d' % (self.epoch, seq)
+
+    # cursor for a new subscriber: the seq after Last-Event-ID, or None when the
+    # events since then are gone (another process, or pushed out of the ring)
+    def cursor(self, last_event_id=None):
+        with self._condition:
+            if not last_event_id:
+                return self._seq
+            epoch, _, seq = last_event_id.partition('-')
+            try:
+                seq = int(seq)
+            except ValueError:
+                return None
+            oldest = self._events[0].seq if self._events else self._seq + 1
+            if epoch != self.epoch or seq > self._seq or seq < oldest - 1:
+                return None
+            return seq
+
+    # (events after `cursor` in `scopes`, new cursor), waiting up to `timeout`
+    # seconds for one; events of other scopes move the cursor without waking
+    # the caller
+    def wait(self, cursor, scopes, timeout):
+        deadline = monotonic() + timeout
+        with self._condition:
+            while True:
+                events = []
+                for event in reversed(self._events):
+                    if event.seq <= cursor:
+                        break
+                    if not event.scopes.isdisjoint(scopes):
+                        events.append(event)
+                cursor = self._seq
+                remaining = deadline - monotonic()
+                if events or remaining <= 0:
+                    return events[::-1], cursor
+                self._condition.wait(remaining)
+
+    # Server-Sent Events for `scopes`, from after Last-Event-ID. A comment line
+    # every `keepalive` seconds keeps proxies from closing an idle stream and
+    # ends the generator once the browser has gone.
+    def stream(self, scopes, last_event_id=None, keepalive=15, retry=3000):
+        scopes = frozenset(scopes)
+        cursor = self.cursor(last_event_id)
+        with self._condition:
+            self.subscribers += 1
+        try:
+            yield 'retry: %d\n\n' % retry
+            if cursor is None:
+                cursor = self.cursor()
+                yield 'id: %s\nevent: reset\ndata: {}\n\n' % self.event_id(cursor)
+            while True:
+                events, cursor = self.wait(cursor, scopes, keepalive)
+                if not events:
+                    yield ': keepalive\n\n'
+                for event in events:
+                    yield 'id: %s\nevent: %s\ndata: %s\n\n' % (self.event_id(event.seq), event.name, json.dumps(event.data, separators=(',', ':')))
+        finally:
+            with self._condition:
+                self.subscribers -= 1
+
+    def stats(self):
+        return {'subscribers': self.subscribers, 'published': self.published, 'buffered': len(self._events)}
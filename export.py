@@ -0,0 +1,157 @@
+import csv
+import io
+import re
+import zipfile
+from datetime import datetime, date
+from xml.sax.saxutils import escape
+
+# Streaming CSV / XLSX writers for attendance exports. Rows are read from the
+# database in batches (yield_per) and written out in chunks of about CHUNK bytes,
+# so an export holds one batch and one chunk in memory however long it is.
+
+CHUNK = 64 * 1024
+BATCH = 1000
+
+
+def stream_rows(session, statement, batch=BATCH):
+    result = session.execute(statement.execution_options(yield_per=batch))
+    try:
+        for row in result:
+            yield row
+    finally:
+        result.close()
+
+
+def cell_text(value):
+    if value is None:
+        return ''
+    if isinstance(value, datetime):
+        return value.strftime('%Y-%m-%d %H:%M:%S')
+    if isinstance(value, date):
+        return value.isoformat()
+    return str(value)
+
+
+##### CSV #####
+
+# a leading = + - @ makes spreadsheet programs evaluate the cell as a formula
+FORMULA_START = ('=', '+', '-', '@')
+
+
+def csv_cell(value):
+    text = cell_text(value)
+    if text.startswith(FORMULA_START) and not isinstance(value, (int, float)):
+        return "'" + text
+    return text
+
+
+def csv_stream(header, rows, chunk=CHUNK):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    # the BOM makes Excel open the file as UTF-8
+    buffer.write('\ufeff')
+    writer.writerow(header)
+    for row in rows:
+        writer.writerow([csv_cell(value) for value in row])
+        if buffer.tell() >= chunk:
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode()
+
+
+##### XLSX #####
+
+CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/worksheets/sheet1.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+    '</Types>')
+
+ROOT_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="xl/workbook.xml"/>'
+    '</Relationships>')
+
+WORKBOOK = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+    '<sheets><sheet name="%s" sheetId="1" r:id="rId1"/></sheets>'
+    '</workbook>')
+
+WORKBOOK_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" Target="worksheets/sheet1.xml"/>'
+    '</Relationships>')
+
+SHEET_HEAD = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>')
+
+SHEET_TAIL = '</sheetData></worksheet>'
+
+# characters XML 1.0 does not allow, even escaped
+INVALID_XML = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+
+def xlsx_row(number, values):
+    cells = []
+    for value in values:
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            cells.append('<c><v>%s</v></c>' % value)
+        else:
+            text = escape(INVALID_XML.sub('', cell_text(value)))
+            cells.append('<c t="inlineStr"><is><t xml:space="preserve">%s</t></is></c>' % text)
+    return '<row r="%d">%s</row>' % (number, ''.join(cells))
+
+
+# Write-only file object for zipfile: collects the compressed output until the
+# generator hands it on. Without seek(), zipfile writes data descriptors instead
+# of going back to patch the local headers.
+class ChunkBuffer:
+    def __init__(self):
+        self.chunks = []
+        self.size = 0
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.size += len(data)
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def take(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        self.size = 0
+        return data
+
+
+def xlsx_stream(header, rows, sheet='Sheet1', chunk=CHUNK):
+    out = ChunkBuffer()
+    with zipfile.ZipFile(out, 'w', zipfile.ZIP_DEFLATED) as book:
+        book.writestr('[Content_Types].xml', CONTENT_TYPES)
+        book.writestr('_rels/.rels', ROOT_RELS)
+        book.writestr('xl/workbook.xml', WORKBOOK % escape(sheet, {'"': '&quot;'}))
+        book.writestr('xl/_rels/workbook.xml.rels', WORKBOOK_RELS)
+        with book.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True) as part:
+            part.write((SHEET_HEAD + xlsx_row(1, header)).encode())
+            for number, row in enumerate(rows, 2):
+                part.write(xlsx_row(number, row).encode())
+                if out.size >= chunk:
+                    yield out.take()
+            part.write(SHEET_TAIL.encode())
+    yield out.take()
+
+
+FORMATS = {
+    'csv': (csv_stream, 'text/csv'),
+    'xlsx': (xlsx_stream, 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'),
+}
@@ -0,0 +1,141 @@
+from bisect import bisect_left
+from collections import deque
+from contextlib import contextmanager
+from threading import Lock
+from time import perf_counter
+
+# upper bounds in seconds, from one I2C write to a slow GSM exchange
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+def quantile(values, q):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def label_text(labels):
+    if not labels:
+        return ''
+    return '{%s}' % ','.join('%s="%s"' % (key, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+                             for key, value in labels)
+
+
+class Histogram:
+    __slots__ = ('buckets', 'counts', 'count', 'sum', 'recent', 'lock')
+
+    def __init__(self, buckets, window):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        # the last `window` samples, for p50/p95 without a bucket estimate
+        self.recent = deque(maxlen=window)
+        self.lock = Lock()
+
+    def observe(self, value):
+        index = bisect_left(self.buckets, value)
+        with self.lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.sum += value
+            self.recent.append(value)
+
+    def snapshot(self):
+        with self.lock:
+            return list(self.counts), self.count, self.sum, list(self.recent)
+
+
+# Process-wide histograms and counters in Prometheus text format. Recording is a
+# dict lookup, a bisect and a short lock, cheap enough to leave on for every
+# scan and request. Series are keyed by name plus labels; keep label values to
+# small fixed sets (stage names, endpoints), never ids.
+#
+#   metrics.describe('attendance_stage_seconds', 'Time per pipeline stage')
+#   with metrics.timer('attendance_stage_seconds', stage='search'):
+#       ...
+class Metrics:
+    def __init__(self, buckets=BUCKETS, window=512):
+        self.buckets = tuple(buckets)
+        self.window = window
+        self._help = {}
+        self._histograms = {}
+        self._counters = {}
+        self._lock = Lock()
+
+    def describe(self, name, text):
+        self._help[name] = text
+
+    def _histogram(self, key):
+        histogram = self._histograms.get(key)
+        if histogram is None:
+            with self._lock:
+                histogram = self._histograms.setdefault(key, Histogram(self.buckets, self.window))
+        return histogram
+
+    def observe(self, name, seconds, **labels):
+        self._histogram((name, tuple(sorted(labels.items())))).observe(seconds)
+
+    def inc(self, name, amount=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    @contextmanager
+    def timer(self, name, **labels):
+        started = perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, perf_counter() - started, **labels)
+
+    # a callable recording into one histogram, for driver hooks: observe(label, seconds)
+    def recorder(self, name, label, **labels):
+        return lambda value, seconds: self.observe(name, seconds, **dict(labels, **{label: value}))
+
+    def render(self):
+        lines = []
+        with self._lock:
+            histograms = sorted(self._histograms.items())
+            counters = sorted(self._counters.items())
+        seen = set()
+        for (name, labels), histogram in histograms:
+            if name not in seen:
+                seen.add(name)
+                if name in self._help:
+                    lines.append('# HELP %s %s' % (name, self._help[name]))
+                lines.append('# TYPE %s histogram' % name)
+            counts, count, total, recent = histogram.snapshot()
+            cumulative = 0
+            for bound, bucket in zip(self.buckets, counts):
+                cumulative += bucket
+                lines.append('%s_bucket%s %d' % (name, label_text(labels + (('le', repr(float(bound))),)), cumulative))
+            lines.append('%s_bucket%s %d' % (name, label_text(labels + (('le', '+Inf'),)), count))
+            lines.append('%s_sum%s %r' % (name, label_text(labels), total))
+            lines.append('%s_count%s %d' % (name, label_text(labels), count))
+        for (name, labels), value in counters:
+            if name not in seen:
+                seen.add(name)
+                if name in self._help:
+                    lines.append('# HELP %s %s' % (name, self._help[name]))
+                lines.append('# TYPE %s counter' % name)
+            lines.append('%s%s %r' % (name, label_text(labels), value))
+        return '\n'.join(lines) + '\n'
+
+    # (name, labels, count, p50, p95) of every histogram, p50/p95 over the recent window
+    def summary(self, name=None):
+        with self._lock:
+            histograms = sorted(self._histograms.items())
+        rows = []
+        for (series, labels), histogram in histograms:
+            if name is not None and series != name:
+                continue
+            counts, count, total, recent = histogram.snapshot()
+            rows.append((series, dict(labels), count, quantile(recent, 0.5), quantile(recent, 0.95)))
+        return rows
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
@@ -0,0 +1,142 @@
+from sqlalchemy import text
+
+# Schema migrations for attendance.db, tracked in PRAGMA user_version.
+# `flask createdb` stamps a new database with the latest version, `flask upgradedb`
+# runs whatever an existing database is missing.
+
+
+def schema_version(conn):
+    return conn.execute(text('PRAGMA user_version')).scalar()
+
+
+def table_columns(conn, table):
+    return {row[1] for row in conn.execute(text('PRAGMA table_info(%s)' % table))}
+
+
+# 1: integer foreign keys instead of "firstname lastname" / course name strings.
+#    course.teacher_id, student.course_id, attendacehistory.session_id + student.id,
+#    one history row per student per session. Legacy rows that no longer map to a
+#    course or student are kept in *_unmapped tables, the other rows of a student's
+#    re-opened session in attendacehistory_duplicates.
+def integer_keys(conn, db):
+    if 'course_teacher' not in table_columns(conn, 'course'):
+        return {}
+
+    # keep references in other tables pointing at the original names while renaming
+    conn.execute(text('PRAGMA legacy_alter_table = ON'))
+    for table in ('course', 'student', 'attendacehistory'):
+        conn.execute(text('ALTER TABLE %s RENAME TO %s_old' % (table, table)))
+    tables = [db.metadata.tables[name] for name in ('course', 'student', 'attendancesession', 'attendacehistory')]
+    db.metadata.create_all(bind=conn, tables=tables)
+
+    conn.execute(text("""
+        INSERT INTO course (id, course_name, course_code, course_description, course_units, teacher_id, date_added)
+        SELECT c.id, c.course_name, c.course_code, c.course_description, c.course_units,
+               (SELECT t.id FROM teacher t WHERE t.firstname || ' ' || t.lastname = c.course_teacher ORDER BY t.id LIMIT 1),
+               c.date_added
+        FROM course_old c"""))
+
+    # course names are not unique, prefer the course taught by the student's teacher
+    conn.execute(text("""
+        INSERT INTO student (id, fingerprint_id, lastname, firstname, middlename, student_id, parent_phone, course_id, date_added)
+        SELECT id, fingerprint_id, lastname, firstname, middlename, student_id, parent_phone, course_id, date_added
+        FROM (SELECT s.*, COALESCE(
+                     (SELECT MIN(c.id) FROM course_old c WHERE c.course_name = s.course_name AND c.course_teacher = s.teacher_name),
+                     (SELECT MIN(c.id) FROM course_old c WHERE c.course_name = s.course_name)) AS course_id
+              FROM student_old s)
+        WHERE course_id IS NOT NULL"""))
+
+    conn.execute(text("""
+        CREATE TEMP TABLE history_map AS
+        SELECT h.id, h.status, h.date_timein, date(h.date_timein) AS day,
+               COALESCE(
+                   (SELECT MIN(c.id) FROM course_old c WHERE c.course_name = h.course AND c.course_teacher = h.course_teacher),
+                   (SELECT MIN(c.id) FROM course_old c WHERE c.course_name = h.course)) AS course_id,
+               -- legacy history keeps the student number in an INTEGER column, which
+               -- drops leading zeros: an exact match first, then by numeric value
+               COALESCE(
+                   (SELECT MIN(s.id) FROM student s WHERE s.student_id = CAST(h.student_id AS TEXT)),
+                   (SELECT MIN(s.id) FROM student s WHERE s.student_id = h.student_id)) AS student_pk
+        FROM attendacehistory_old h"""))
+
+    # the row kept of each student's session: the first Present scan, else the first row
+    conn.execute(text("""
+        CREATE TEMP TABLE history_rank AS
+        SELECT id, ROW_NUMBER() OVER (PARTITION BY course_id, day, student_pk
+                                      ORDER BY status = 'Present' DESC, date_timein, id) AS rank
+        FROM history_map
+        WHERE course_id IS NOT NULL AND student_pk IS NOT NULL"""))
+
+    conn.execute(text("""
+        INSERT OR IGNORE INTO attendancesession (course_id, date, opened_at)
+        SELECT course_id, day, MIN(date_timein) FROM history_map
+        WHERE course_id IS NOT NULL AND student_pk IS NOT NULL
+        GROUP BY course_id, day"""))
+
+    conn.execute(text("""
+        INSERT INTO attendacehistory (id, session_id, student_id, status, date_timein)
+        SELECT m.id, s.id, m.student_pk, CASE WHEN m.status = 'Present' THEN 'Present' ELSE 'Absent' END, m.date_timein
+        FROM history_map m
+        JOIN history_rank r ON r.id = m.id AND r.rank = 1
+        JOIN attendancesession s ON s.course_id = m.course_id AND s.date = m.day"""))
+
+    # every other row of a re-opened session, with the id of the row kept
+    conn.execute(text("""
+        CREATE TABLE attendacehistory_duplicates AS
+        SELECT h.*, (SELECT k.id FROM history_map k JOIN history_rank kr ON kr.id = k.id AND kr.rank = 1
+                     WHERE k.course_id = m.course_id AND k.day = m.day AND k.student_pk = m.student_pk) AS kept_id
+        FROM attendacehistory_old h
+        JOIN history_map m ON m.id = h.id
+        JOIN history_rank r ON r.id = h.id AND r.rank > 1"""))
+
+    conn.execute(text("""
+        CREATE TABLE student_unmapped AS
+        SELECT * FROM student_old WHERE id NOT IN (SELECT id FROM student)"""))
+    conn.execute(text("""
+        CREATE TABLE attendacehistory_unmapped AS
+        SELECT * FROM attendacehistory_old
+        WHERE id IN (SELECT id FROM history_map WHERE course_id IS NULL OR student_pk IS NULL)"""))
+
+    counts = {
+        'history rows before': conn.execute(text('SELECT COUNT(*) FROM attendacehistory_old')).scalar(),
+        'history rows after': conn.execute(text('SELECT COUNT(*) FROM attendacehistory')).scalar(),
+        'sessions': conn.execute(text('SELECT COUNT(*) FROM attendancesession')).scalar(),
+        'unmapped students': conn.execute(text('SELECT COUNT(*) FROM student_unmapped')).scalar(),
+        'unmapped history rows': conn.execute(text('SELECT COUNT(*) FROM attendacehistory_unmapped')).scalar(),
+        'duplicate history rows': conn.execute(text('SELECT COUNT(*) FROM attendacehistory_duplicates')).scalar(),
+    }
+
+    conn.execute(text('DROP TABLE history_rank'))
+    conn.execute(text('DROP TABLE history_map'))
+    for table in ('attendacehistory_old', 'student_old', 'course_old'):
+        conn.execute(text('DROP TABLE %s' % table))
+    conn.execute(text('PRAGMA legacy_alter_table = OFF'))
+    return counts
+
+
+MIGRATIONS = [
+    (1, integer_keys),
+]
+
+LATEST = MIGRATIONS[-1][0]
+
+
+def stamp(db):
+    with db.engine.begin() as conn:
+        conn.execute(text('PRAGMA user_version = %d' % LATEST))
+
+
+def upgrade(db):
+    applied = []
+    with db.engine.begin() as conn:
+        # pysqlite would run the DDL below outside of a transaction
+        conn.exec_driver_sql('BEGIN')
+        current = schema_version(conn)
+        for version, migration in MIGRATIONS:
+            if version <= current:
+                continue
+            applied.append((version, migration.__name__, migration(conn, db)))
+            conn.execute(text('PRAGMA user_version = %d' % version))
+    # tables added by the models since (outbox, sessions, ...)
+    db.create_all()
+    return applied
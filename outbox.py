@@ -0,0 +1,113 @@
+from datetime import datetime, timedelta
+from threading import Thread, Event, Lock
+from time import monotonic
+
+
+# Delivery worker for a persistent SMS outbox table. The scan path only inserts a
+# row and calls notify(); this single thread owns the modem, sends due messages in
+# id order and reschedules failures with exponential backoff. Pending rows stay in
+# the database, so nothing is lost when the app restarts.
+#
+# A message is marked 'sending' before it goes to the modem. When the modem's
+# reply or the commit of the result is lost, it stays 'sending' and is not sent
+# again: a parent gets at most one SMS per message.
+#
+# model needs the columns phone, body, status, attempts, next_attempt, created,
+# sent_at and last_error. send(phone, body) raises on failure, and raises one of
+# `unconfirmed` when the message may have gone out anyway.
+class OutboxWorker:
+    def __init__(self, app, db, model, send, interval=30, batch=10, max_attempts=8,
+                 backoff=15, max_backoff=1800, unconfirmed=()):
+        self.app = app
+        self.db = db
+        self.model = model
+        self.send = send
+        self.interval = interval
+        self.batch = batch
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.unconfirmed = tuple(unconfirmed)
+        self._wakeup = Event()
+        self._lock = Lock()
+        self._thread = None
+        self.sent = 0
+        self.failed = 0
+        self.retried = 0
+        self.send_seconds = 0.0
+        self.last_send_seconds = None
+        self.queue_seconds = 0.0
+
+    def start(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = Thread(target=self._run, name='outbox', daemon=True)
+                self._thread.start()
+
+    # a new message was committed, deliver it now instead of at the next interval
+    def notify(self):
+        self.start()
+        self._wakeup.set()
+
+    def _run(self):
+        while True:
+            try:
+                with self.app.app_context():
+                    while self._deliver_batch():
+                        pass
+            except Exception as e:
+                print("Error:", str(e))
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+
+    # send one batch of due messages, returns True when there may be more
+    def _deliver_batch(self):
+        model = self.model
+        now = datetime.now()
+        messages = model.query.filter(model.status == 'pending', model.next_attempt <= now) \
+            .order_by(model.id).limit(self.batch).all()
+        for message in messages:
+            message.status = 'sending'
+            self.db.session.commit()
+            started = monotonic()
+            try:
+                self.send(message.phone, message.body)
+            except self.unconfirmed as e:
+                message.attempts += 1
+                message.last_error = str(e)[:255]
+            except Exception as e:
+                message.attempts += 1
+                message.last_error = str(e)[:255]
+                if message.attempts >= self.max_attempts:
+                    message.status = 'failed'
+                    self.failed += 1
+                else:
+                    delay = min(self.backoff * 2 ** (message.attempts - 1), self.max_backoff)
+                    message.status = 'pending'
+                    message.next_attempt = datetime.now() + timedelta(seconds=delay)
+                    self.retried += 1
+            else:
+                message.status = 'sent'
+                message.sent_at = datetime.now()
+                self.sent += 1
+                self.last_send_seconds = monotonic() - started
+                self.send_seconds += self.last_send_seconds
+                self.queue_seconds += (message.sent_at - message.created).total_seconds()
+            self.db.session.commit()
+        return len(messages) == self.batch
+
+    def stats(self):
+        model = self.model
+        pending = model.query.filter(model.status == 'pending').count()
+        return {
+            'pending': pending,
+            'unconfirmed': model.query.filter(model.status == 'sending').count(),
+            'sent': self.sent,
+            'failed': self.failed,
+            'retried': self.retried,
+            'avg_send_seconds': round(self.send_seconds / self.sent, 3) if self.sent else None,
+            'last_send_seconds': round(self.last_send_seconds, 3) if self.last_send_seconds is not None else None,
+            'avg_queue_seconds': round(self.queue_seconds / self.sent, 3) if self.sent else None,
+        }
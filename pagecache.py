@@ -0,0 +1,61 @@
+from collections import OrderedDict
+from hashlib import sha1
+from threading import Lock
+
+
+# ETag of a page: what the page is (endpoint, user, arguments) and the versions
+# of the data it shows. Any write bumping one of those versions changes it.
+def page_etag(key, versions):
+    text = repr((key, sorted(versions.items())))
+    return sha1(text.encode()).hexdigest()[:20]
+
+
+# Rendered pages by ETag, least recently used dropped past max_entries. The ETag
+# already covers the data versions, so an entry never needs invalidating: after
+# a write it is simply no longer asked for and ages out. The gzipped page is
+# kept in the same entry once a browser asked for it.
+class PageCache:
+    def __init__(self, max_entries=64):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = Lock()
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+
+    def get(self, etag):
+        with self._lock:
+            entry = self._entries.get(etag)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(etag)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, etag, body):
+        with self._lock:
+            self._entries[etag] = [body, None]
+            self._entries.move_to_end(etag)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    # the page compressed by compress(), done once per entry
+    def compressed(self, etag, compress):
+        with self._lock:
+            entry = self._entries.get(etag)
+            if entry is not None and entry[1] is not None:
+                return entry[1]
+        data = compress()
+        with self._lock:
+            if entry is not None and self._entries.get(etag) is entry:
+                entry[1] = data
+        return data
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        return {'entries': len(self._entries), 'hits': self.hits, 'misses': self.misses,
+                'not_modified': self.not_modified}
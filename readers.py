@@ -0,0 +1,75 @@
+from scanner import IDLE
+
+
+# One fingerprint reader: its serial port, sensor (a CaptureEngine), the GPIO pin
+# of its button (None for a reader that polls the sensor without one) and the
+# Scanner worker that serves a course on it. Every reader has its own lock and
+# worker thread, so scans on different readers run side by side.
+class Reader:
+    def __init__(self, name, port, capture, button=None, link=(None, None)):
+        self.name = name
+        self.port = port
+        self.capture = capture
+        self.button = button
+        self.baudrate, self.packet_size = link
+        self.scanner = None
+
+    def status(self):
+        sensor = dict(self.capture.stats(), baudrate=self.baudrate, packet_size=self.packet_size)
+        return dict(self.scanner.status(), reader=self.name, port=self.port, sensor=sensor)
+
+
+# Readers by name, in configuration order. The first one is the primary reader
+# that enrollment and the template library maintenance use.
+class ReaderRegistry:
+    def __init__(self, readers=()):
+        self._readers = {}
+        for reader in readers:
+            self.add(reader)
+
+    def add(self, reader):
+        self._readers[reader.name] = reader
+        return reader
+
+    def __iter__(self):
+        return iter(list(self._readers.values()))
+
+    def __len__(self):
+        return len(self._readers)
+
+    @property
+    def primary(self):
+        return next(iter(self._readers.values()))
+
+    def get(self, name=None):
+        if not name:
+            return self.primary
+        return self._readers.get(name)
+
+    # the reader armed for a course, None when no reader serves it
+    def serving(self, course):
+        for reader in self:
+            status = reader.scanner.status()
+            if status['state'] != IDLE and status['course'] == course:
+                return reader
+        return None
+
+    # Reader to run a course on: the one already serving it, the requested one,
+    # else the first idle reader. None when every reader is busy with another
+    # course: taking one over would stop a class in the middle of its scans.
+    def assign(self, course, name=None):
+        reader = self.serving(course)
+        if reader is not None:
+            return reader
+        if name:
+            return self._readers.get(name)
+        for reader in self:
+            if reader.scanner.status()['state'] == IDLE:
+                return reader
+        return None
+
+    def idle(self):
+        return all(reader.scanner.status()['state'] == IDLE for reader in self)
+
+    def status(self):
+        return {reader.name: reader.status() for reader in self}
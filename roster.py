@@ -0,0 +1,102 @@
+from threading import Lock
+
+
+class RosterEntry:
+    __slots__ = ('bit', 'fingerprint_id', 'student_id', 'name', 'parent_phone', 'course', 'teacher',
+                 'history_id', 'date_timein', 'pk')
+
+    def __init__(self, bit, fingerprint_id, student_id, name, parent_phone, course, teacher,
+                 history_id=None, date_timein=None, pk=None):
+        self.bit = bit
+        self.fingerprint_id = fingerprint_id
+        self.student_id = student_id
+        self.name = name
+        self.parent_phone = parent_phone
+        self.course = course
+        self.teacher = teacher
+        self.history_id = history_id
+        self.date_timein = date_timein
+        self.pk = pk
+
+
+# Roster of one course for the running attendance session:
+# fingerprint_id -> student -> today's attendance row, plus a bitset of who is present.
+# Readers serving the same course mark the bitset under a lock.
+class RosterIndex:
+    def __init__(self, course, entries=(), day=None, teacher=None):
+        self.course = course
+        self.day = day
+        self.teacher = teacher
+        self._lock = Lock()
+        self.by_finger = {}
+        self.entries = []
+        self.present = 0
+        for entry in entries:
+            self.add(entry)
+
+    def add(self, entry, present=False):
+        entry.bit = 1 << len(self.entries)
+        self.entries.append(entry)
+        self.by_finger[entry.fingerprint_id] = entry
+        if present:
+            self.present |= entry.bit
+        return entry
+
+    def lookup(self, fingerprint_id):
+        return self.by_finger.get(fingerprint_id)
+
+    def is_present(self, entry):
+        return bool(self.present & entry.bit)
+
+    # returns False when the student was already present
+    def mark(self, entry):
+        with self._lock:
+            if self.present & entry.bit:
+                return False
+            self.present |= entry.bit
+            return True
+
+    @property
+    def total(self):
+        return len(self.entries)
+
+    def count_present(self):
+        return bin(self.present).count('1')
+
+    def all_present(self):
+        return self.present == (1 << len(self.entries)) - 1
+
+    # students that still have no attendance row for the session
+    def missing_rows(self):
+        return [entry for entry in self.entries if entry.history_id is None]
+
+
+# Built rosters by course, dropped whenever students of the course change
+class RosterCache:
+    def __init__(self):
+        self._lock = Lock()
+        self._rosters = {}
+        self._generation = 0
+
+    def get(self, course, build=None):
+        with self._lock:
+            roster = self._rosters.get(course)
+            generation = self._generation
+        if roster is None and build is not None:
+            roster = build(course)
+            with self._lock:
+                # an invalidation during the build means the roster may already be stale
+                if generation == self._generation:
+                    self._rosters[course] = roster
+        return roster
+
+    def invalidate(self, *courses):
+        with self._lock:
+            self._generation += 1
+            for course in courses:
+                self._rosters.pop(course, None)
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._rosters.clear()
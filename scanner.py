@@ -0,0 +1,110 @@
+from threading import Thread, Event, Lock
+from time import time
+
+##### SCANNER STATES #####
+IDLE = 'idle'
+ARMED = 'armed'
+CAPTURING = 'capturing'
+MATCHED = 'matched'
+FAILED = 'failed'
+
+
+# Attendance scanner worker. One background thread owns the button and the sensor:
+#
+#   idle -> armed (course) -> capturing -> matched / failed -> armed -> ...
+#
+# start() and stop() only flip state and return, so the HTTP route that calls them
+# stays fast. The hardware is passed in as callables:
+#   wait_for_trigger(timeout) -> True when the button was pressed within timeout seconds
+#   capture(cancelled) -> finger id or None, cancelled() tells it to give up
+#   on_match(course, finger_id) -> dict describing the student, or None if not on the roster
+#   context() -> context manager the worker runs in (the Flask app context)
+class Scanner:
+    def __init__(self, wait_for_trigger, capture, on_match, context=None, poll_interval=0.5):
+        self._wait_for_trigger = wait_for_trigger
+        self._capture = capture
+        self._on_match = on_match
+        self._context = context
+        self._poll_interval = poll_interval
+        self._lock = Lock()
+        # held by the thread that is using the button and sensor, a re-armed worker
+        # waits here until the previous one has noticed its stop event
+        self._hardware = Lock()
+        self._stop = Event()
+        self._thread = None
+        self._status = {'state': IDLE, 'course': None}
+        self._session = 0
+
+    def _set(self, session, **fields):
+        with self._lock:
+            if session != self._session:
+                return False
+            self._status.update(fields, updated=time())
+            return True
+
+    def status(self):
+        with self._lock:
+            return dict(self._status)
+
+    # arm the scanner for a course. Re-arming for another course ends the running session.
+    def start(self, course, **info):
+        with self._lock:
+            if self._status['state'] != IDLE and self._status['course'] == course:
+                return False
+            self._session += 1
+            session = self._session
+            self._stop.set()
+            self._stop = Event()
+            self._status = {'state': ARMED, 'course': course, 'session': session, 'scans': 0,
+                            'matched': 0, 'failed': 0, 'result': None, 'last': None, 'started': time(), 'updated': time()}
+            self._status.update(info)
+            self._thread = Thread(target=self._run, args=(session, course, self._stop),
+                                  name='scanner-%s' % course, daemon=True)
+            self._thread.start()
+        return True
+
+    def stop(self):
+        with self._lock:
+            if self._status['state'] == IDLE:
+                return False
+            self._session += 1
+            self._stop.set()
+            self._status = {'state': IDLE, 'course': None, 'updated': time()}
+        return True
+
+    def _run(self, session, course, stop):
+        with self._hardware:
+            self._loop(session, course, stop)
+
+    def _loop(self, session, course, stop):
+        while not stop.is_set():
+            if not self._wait_for_trigger(self._poll_interval) or stop.is_set():
+                continue
+            self._set(session, state=CAPTURING)
+            try:
+                finger_id = self._capture(stop.is_set)
+                student = None
+                if finger_id is not None and not stop.is_set():
+                    if self._context is not None:
+                        with self._context():
+                            student = self._on_match(course, finger_id)
+                    else:
+                        student = self._on_match(course, finger_id)
+            except Exception as e:
+                print("Error:", str(e))
+                student = None
+            if stop.is_set():
+                break
+            with self._lock:
+                if session != self._session:
+                    break
+                status = self._status
+                status['scans'] += 1
+                if student:
+                    status['matched'] += 1
+                    status.update(state=MATCHED, result=MATCHED, last=student)
+                else:
+                    status['failed'] += 1
+                    status.update(state=FAILED, result=FAILED)
+                status['updated'] = time()
+            self._set(session, state=ARMED)
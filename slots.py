@@ -0,0 +1,78 @@
+from threading import Lock
+
+
+# bitmask of the slots in [start, end)
+def span(start, end):
+    if end <= start:
+        return 0
+    return ((1 << end) - 1) & ~((1 << start) - 1)
+
+
+# Free-slot bitmap for the fingerprint sensor's template library: bit n is set when
+# slot n holds, or is reserved for, a template. Slots below `first` are never handed
+# out (fingerprint_id 0 reads as "no fingerprint" elsewhere). The bitmap is small
+# enough to be stored as a single blob and allocate() is a few integer operations.
+#
+# Courses get contiguous ranges of slots (start, count) so a scan only searches its
+# course's part of the library; allocate() and find_run() take the bounds and a
+# mask of slots belonging to other ranges.
+class SlotAllocator:
+    def __init__(self, capacity=0, used=0, first=1):
+        self.first = first
+        self._lock = Lock()
+        self.reset(capacity, used)
+
+    def reset(self, capacity, used=0):
+        if not isinstance(used, int):
+            used = sum(1 << slot for slot in set(used) if 0 <= slot < capacity)
+        with self._lock:
+            self.capacity = capacity
+            self.mask = ((1 << capacity) - 1) & ~((1 << self.first) - 1)
+            self.used = used & ((1 << capacity) - 1)
+
+    # lowest free slot in [start, end) outside `taken`, marked used, or None when there is none
+    def allocate(self, start=0, end=None, taken=0):
+        with self._lock:
+            free = self.mask & ~self.used & ~taken & span(start, self.capacity if end is None else end)
+            if not free:
+                return None
+            lowest = free & -free
+            self.used |= lowest
+            return lowest.bit_length() - 1
+
+    # start of the lowest run of `length` free slots outside `taken`, or None
+    def find_run(self, length, taken=0):
+        if length <= 0:
+            return None
+        free = self.mask & ~self.used & ~taken
+        run = free
+        for shift in range(1, length):
+            run &= free >> shift
+            if not run:
+                return None
+        return (run & -run).bit_length() - 1 if run else None
+
+    def release(self, slot):
+        with self._lock:
+            self.used &= ~(1 << slot)
+
+    def reserve(self, slot):
+        with self._lock:
+            if 0 <= slot < self.capacity:
+                self.used |= 1 << slot
+
+    def is_used(self, slot):
+        return bool(self.used >> slot & 1)
+
+    def free_count(self, start=0, end=None):
+        return bin(self.mask & ~self.used & span(start, self.capacity if end is None else end)).count('1')
+
+    def used_slots(self):
+        return [slot for slot in range(self.capacity) if self.used >> slot & 1]
+
+    def to_bytes(self):
+        return self.used.to_bytes((self.capacity + 7) // 8 or 1, 'little')
+
+    @classmethod
+    def from_bytes(cls, capacity, data, first=1):
+        return cls(capacity, int.from_bytes(data or b'', 'little'), first)
@@ -1,10 +1,40 @@
-// Call the dataTables jQuery plugin
-$(document).ready(function() {
-  $('#dataTable').DataTable();
-});
-$(document).ready(function() {
-  $('#dataTable2').DataTable();
-});
-$(document).ready(function() {
-  $('#dataTable3').DataTable();
-});
+// Call the dataTables jQuery plugin
+// Tables with a data-ajax url are paged, ordered and searched by the server,
+// their Actions column links to data-update / data-delete + the row id.
+function actionLinks(table) {
+  return {
+    targets: 'actions',
+    data: 'id',
+    orderable: false,
+    searchable: false,
+    render: function(id) {
+      var links = '';
+      if (table.data('update')) {
+        links += '<a href="' + table.data('update') + id + '" class="btn btn-outline-info"><i class="fas fa-fw fa-pen"></i></a> ';
+      }
+      if (table.data('delete')) {
+        links += '<a href="' + table.data('delete') + id + '" class="btn btn-outline-danger"><i class="fas fa-fw fa-trash"></i></a>';
+      }
+      return links;
+    }
+  };
+}
+
+$(document).ready(function() {
+  $('#dataTable, #dataTable2, #dataTable3').each(function() {
+    var table = $(this);
+    if (!table.data('ajax')) {
+      table.DataTable();
+      return;
+    }
+    table.DataTable({
+      processing: true,
+      serverSide: true,
+      searchDelay: 400,
+      columnDefs: [
+        actionLinks(table),
+        {targets: '_all', render: $.fn.dataTable.render.text()}
+      ]
+    });
+  });
+});
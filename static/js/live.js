@@ -0,0 +1,74 @@
+// Live attendance: the Server-Sent Events stream named by a table's data-events
+// applied to the tables marked data-live ("history" or "students") and to the
+// course counts marked data-course. A scan updates its row where it is shown;
+// a student added, changed or deleted reloads the current page of a
+// server-side table and drops the student's rows from a table built in the page;
+// a deleted course or teacher reloads the page.
+function liveCounts(event) {
+  $('[data-course="' + event.course_id + '"]').each(function() {
+    $(this).find('.present').text(event.present);
+    $(this).find('.total').text(event.total);
+  });
+}
+
+$(document).ready(function() {
+  var source = $('[data-events]').first();
+  if (!source.length || !window.EventSource) {
+    return;
+  }
+  var stream = new EventSource(source.data('events'));
+
+  stream.addEventListener('present', function(message) {
+    var event = JSON.parse(message.data);
+    $('table[data-live="history"]').each(function() {
+      var table = $(this).DataTable();
+      if ($(this).data('ajax')) {
+        table.rows(function(index, data) { return data.id === event.history_id; }).every(function() {
+          var data = this.data();
+          data.status = event.status;
+          data.date_timein = event.date_timein;
+          this.data(data);
+        });
+        return;
+      }
+      var row = table.row('#history-' + event.history_id);
+      if (row.any()) {
+        var data = row.data();
+        data[4] = event.status;
+        data[5] = event.date_timein;
+        row.data(data);
+      }
+    });
+    liveCounts(event);
+  });
+
+  stream.addEventListener('student', function(message) {
+    var event = JSON.parse(message.data);
+    $('table[data-live]').each(function() {
+      var table = $(this).DataTable();
+      if ($(this).data('ajax')) {
+        // a new student has no attendance rows yet
+        if ($(this).data('live') === 'students' || event.action !== 'added') {
+          table.ajax.reload(null, false);
+        }
+      } else if (event.action === 'deleted') {
+        table.rows('.student-' + event.id).remove().draw(false);
+      }
+    });
+    liveCounts(event);
+  });
+
+  // a course or the teacher was deleted: its cards, links and rows are all over
+  // the page, so it is loaded again
+  stream.addEventListener('course', function() {
+    window.location.reload();
+  });
+  stream.addEventListener('teacher', function() {
+    window.location.reload();
+  });
+
+  // events were missed (the server restarted, or this page was away too long)
+  stream.addEventListener('reset', function() {
+    window.location.reload();
+  });
+});
@@ -0,0 +1,224 @@
+from datetime import datetime
+from threading import Thread, Event, Lock
+from time import monotonic, perf_counter, sleep
+from sqlalchemy import event, text
+
+# SQLite settings for attendance.db on the Pi's SD card.
+#
+# WAL lets the dashboard read while scans are written and turns each commit into
+# an append to the -wal file. synchronous=NORMAL only fsyncs at checkpoints, a
+# power cut can lose the last commits but never corrupts the database.
+# Checkpoints are left to Maintenance instead of the commit that crosses the
+# default 1000 page limit; wal_autocheckpoint stays as an upper bound.
+PRAGMAS = (
+    ('journal_mode', 'WAL'),
+    ('synchronous', 'NORMAL'),
+    ('busy_timeout', 5000),
+    ('wal_autocheckpoint', 10000),
+    ('temp_store', 'MEMORY'),
+)
+
+
+def configure(engine, pragmas=PRAGMAS):
+    @event.listens_for(engine, 'connect')
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas:
+            cursor.execute('PRAGMA %s = %s' % (name, value))
+        cursor.close()
+
+
+# Time every statement run on the engine: observe(verb, seconds) with verb one of
+# select/insert/update/delete/other, so a slow scan can be put on the database
+def instrument(engine, observe):
+    @event.listens_for(engine, 'before_cursor_execute')
+    def started(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('started', []).append(perf_counter())
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def finished(conn, cursor, statement, parameters, context, executemany):
+        seconds = perf_counter() - conn.info['started'].pop()
+        verb = statement.lstrip()[:6].lower()
+        observe(verb if verb in ('select', 'insert', 'update', 'delete') else 'other', seconds)
+
+
+# auto_vacuum can only change with a full VACUUM, done once by createdb/upgradedb
+def enable_incremental_vacuum(engine):
+    with engine.connect() as conn:
+        if conn.execute(text('PRAGMA auto_vacuum')).scalar() == 2:
+            return False
+    with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+        conn.execute(text('PRAGMA auto_vacuum = INCREMENTAL'))
+        conn.execute(text('VACUUM'))
+    return True
+
+
+# Collects writes from the scan path and commits them together, every `interval`
+# seconds or as soon as `max_rows` are waiting, from a single thread. A burst of
+# scans costs one transaction instead of one per student.
+#
+# add(write, done) queues write(session); done(ok) runs after the commit.
+# observe(seconds), when given, gets the time of every batch.
+class GroupCommit:
+    def __init__(self, app, db, interval=0.05, max_rows=32, observe=None):
+        self.app = app
+        self.observe = observe
+        self.db = db
+        self.interval = interval
+        self.max_rows = max_rows
+        self._pending = []
+        self._lock = Lock()
+        self._wakeup = Event()
+        self._thread = None
+        self.commits = 0
+        self.rows = 0
+        self.failed = 0
+        self.commit_seconds = 0.0
+
+    def start(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = Thread(target=self._run, name='group-commit', daemon=True)
+                self._thread.start()
+
+    def add(self, write, done=None):
+        self.start()
+        with self._lock:
+            self._pending.append((write, done))
+            waiting = len(self._pending)
+        # the first write starts the interval, a full buffer ends it
+        if waiting == 1 or waiting >= self.max_rows:
+            self._wakeup.set()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait()
+            self._wakeup.clear()
+            # give the rest of the burst a chance to join this commit
+            deadline = monotonic() + self.interval
+            while monotonic() < deadline and len(self._pending) < self.max_rows:
+                self._wakeup.wait(deadline - monotonic())
+                self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                print("Error:", str(e))
+
+    # commit everything queued so far, on the calling thread
+    def flush(self):
+        with self._lock:
+            batch, self._pending = self._pending, []
+        if not batch:
+            return 0
+        with self.app.app_context():
+            session = self.db.session
+            started = monotonic()
+            failed = 0
+            try:
+                for write, done in batch:
+                    write(session)
+                session.commit()
+                results = [(done, True) for write, done in batch]
+            except Exception as e:
+                print("Error:", str(e))
+                session.rollback()
+                # find the bad write, commit the others one by one
+                results = []
+                for write, done in batch:
+                    try:
+                        write(session)
+                        session.commit()
+                        results.append((done, True))
+                    except Exception as e:
+                        print("Error:", str(e))
+                        session.rollback()
+                        failed += 1
+                        results.append((done, False))
+            seconds = monotonic() - started
+            # flush() also runs on callers' threads, stats() reads all four at once
+            with self._lock:
+                self.commits += 1
+                self.rows += len(batch)
+                self.failed += failed
+                self.commit_seconds += seconds
+            if self.observe is not None:
+                self.observe(seconds)
+        for done, ok in results:
+            if done is not None:
+                done(ok)
+        return len(batch)
+
+    def stats(self):
+        with self._lock:
+            pending, commits, rows, failed, seconds = len(self._pending), self.commits, self.rows, self.failed, self.commit_seconds
+        return {
+            'pending': pending,
+            'commits': commits,
+            'rows': rows,
+            'failed': failed,
+            'rows_per_commit': round(rows / commits, 2) if commits else None,
+            'avg_commit_seconds': round(seconds / commits, 4) if commits else None,
+        }
+
+
+# Periodic checkpoint, ANALYZE and incremental vacuum on a background thread, plus
+# any (function, seconds) jobs passed in. Work is skipped while idle() says the
+# scanner is busy and retried a minute later.
+class Maintenance:
+    def __init__(self, app, db, idle=None, checkpoint_every=300, analyze_every=86400,
+                 vacuum_every=86400, vacuum_pages=256, jobs=()):
+        self.app = app
+        self.db = db
+        self.idle = idle
+        self.jobs = [
+            (self.checkpoint, checkpoint_every),
+            (self.analyze, analyze_every),
+            (self.vacuum, vacuum_every),
+        ] + list(jobs)
+        self.vacuum_pages = vacuum_pages
+        self.last_run = {}
+        self._thread = None
+        self._lock = Lock()
+
+    def start(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = Thread(target=self._run, name='db-maintenance', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        started = monotonic()
+        due = {job: started + every for job, every in self.jobs}
+        while True:
+            sleep(60)
+            if self.idle is not None and not self.idle():
+                continue
+            for job, every in self.jobs:
+                if monotonic() < due[job]:
+                    continue
+                try:
+                    with self.app.app_context():
+                        job()
+                    self.last_run[job.__name__] = datetime.now().isoformat(timespec='seconds')
+                except Exception as e:
+                    print("Error:", str(e))
+                due[job] = monotonic() + every
+
+    def _execute(self, statement):
+        with self.db.engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+            result = conn.execute(text(statement))
+            return result.all() if result.returns_rows else None
+
+    # move the WAL back into the database file and truncate it
+    def checkpoint(self):
+        return self._execute('PRAGMA wal_checkpoint(TRUNCATE)')
+
+    def analyze(self):
+        return self._execute('ANALYZE')
+
+    def vacuum(self):
+        return self._execute('PRAGMA incremental_vacuum(%d)' % self.vacuum_pages)
@@ -0,0 +1,70 @@
+from sqlalchemy import select, func, or_, desc
+
+# Server-side processing for jquery.dataTables (https://datatables.net/manual/server-side).
+# The browser sends the page, ordering and search boxes, the database returns only
+# the rows of that page, so a page costs the same with 50 or 50000 history rows.
+
+
+class Column:
+    def __init__(self, name, expression, searchable=True, orderable=True, format=None):
+        self.name = name
+        self.expression = expression
+        self.searchable = searchable
+        self.orderable = orderable
+        self.format = format
+
+
+def int_arg(args, name, default, low=0, high=None):
+    try:
+        value = int(args.get(name, default))
+    except (TypeError, ValueError):
+        return default
+    value = max(value, low)
+    return min(value, high) if high is not None else value
+
+
+# base is a select() with the joins and fixed filters (e.g. the teacher's courses),
+# key the primary key used as tie breaker so pages never overlap.
+def datatable(session, base, key, columns, args, max_length=100):
+    draw = int_arg(args, 'draw', 0)
+    start = int_arg(args, 'start', 0)
+    length = int_arg(args, 'length', 10, low=-1, high=max_length)
+    if length < 1:
+        length = max_length
+
+    filters = []
+    search = args.get('search[value]', '').strip()
+    if search:
+        filters.append(or_(*[column.expression.contains(search, autoescape=True)
+                             for column in columns if column.searchable]))
+    for i, column in enumerate(columns):
+        value = args.get('columns[%d][search][value]' % i, '').strip()
+        if value and column.searchable:
+            filters.append(column.expression.contains(value, autoescape=True))
+
+    order = []
+    i = 0
+    while 'order[%d][column]' % i in args:
+        index = int_arg(args, 'order[%d][column]' % i, -1, low=-1)
+        if 0 <= index < len(columns) and columns[index].orderable:
+            expression = columns[index].expression
+            order.append(desc(expression) if args.get('order[%d][dir]' % i) == 'desc' else expression)
+        i += 1
+    order.append(key)
+
+    total = session.scalar(select(func.count()).select_from(base.with_only_columns(key).subquery()))
+    filtered_query = base.where(*filters)
+    filtered = total if not filters else \
+        session.scalar(select(func.count()).select_from(filtered_query.with_only_columns(key).subquery()))
+
+    page = filtered_query.with_only_columns(key.label('id'), *[column.expression.label(column.name) for column in columns]) \
+        .order_by(*order).offset(start).limit(length)
+    data = []
+    for row in session.execute(page).mappings():
+        item = {'id': row['id']}
+        for column in columns:
+            value = row[column.name]
+            item[column.name] = column.format(value) if column.format and value is not None else value
+        data.append(item)
+
+    return {'draw': draw, 'recordsTotal': total, 'recordsFiltered': filtered, 'data': data}
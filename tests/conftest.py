@@ -0,0 +1,65 @@
+# The tests run on a desktop: Raspberry Pi libraries that are missing are
+# replaced the way the benchmarks do it, and the hardware tests talk to the
+# simulated devices in drivers/.
+import os
+import sys
+from types import SimpleNamespace
+
+import pytest
+from flask import Flask
+from flask_sqlalchemy import SQLAlchemy
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+
+import hardware_shims  # noqa: E402
+import migrations  # noqa: E402
+from archive import Archive  # noqa: E402
+
+hardware_shims.install()
+
+
+# A Flask app and an empty SQLite database of its own, for the modules that
+# work against app.db; the test declares the tables it needs.
+@pytest.fixture
+def database(tmp_path):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + str(tmp_path / 'test.db')
+    db = SQLAlchemy(app)
+    yield app, db
+    with app.app_context():
+        db.session.remove()
+        db.engine.dispose()
+
+
+# app.py itself, imported once against a database of its own and the simulated
+# hardware. Every test that uses it starts from empty tables.
+@pytest.fixture(scope='session')
+def app_module(tmp_path_factory):
+    os.environ['ATTENDANCE_DATABASE'] = 'sqlite:///' + str(tmp_path_factory.mktemp('app') / 'attendance.db')
+    os.environ['ATTENDANCE_HARDWARE'] = 'simulator'
+    import app
+    return app
+
+
+@pytest.fixture
+def attendance(app_module, tmp_path, monkeypatch):
+    A = app_module
+    # archived terms of this test only, and no background workers: SMS delivery,
+    # maintenance and the startup reconcile run against the test's tables
+    monkeypatch.setattr(A, 'archive', Archive(str(tmp_path / 'archive')))
+    monkeypatch.setattr(A.outbox, 'notify', lambda: None)
+    monkeypatch.setattr(A.outbox, 'start', lambda: None)
+    monkeypatch.setattr(A.maintenance, 'start', lambda: None)
+    monkeypatch.setattr(A, 'startup', SimpleNamespace(ident=0))
+    # the slot bitmap and course ranges are read again from the empty tables
+    monkeypatch.setattr(A, 'slots', None)
+    monkeypatch.setattr(A, 'course_ranges', None)
+    with A.app.app_context():
+        A.db.drop_all()
+        A.db.create_all()
+        migrations.stamp(A.db)
+        A.rosters.clear()
+        yield A
+        A.db.session.remove()
@@ -0,0 +1,335 @@
+import zlib
+from datetime import date
+from time import monotonic, sleep
+from types import SimpleNamespace
+
+import adafruit_fingerprint
+import pytest
+import serial
+from sqlalchemy import event
+
+import drivers
+from drivers.fake_sensor import FakeSensor
+from slots import SlotAllocator
+
+
+def add_course(A, students=3, name='CM1'):
+    db = A.db
+    teacher = A.Teacher(lastname='Cruz', firstname='Ana', gender='F', teacher_id='T-' + name,
+                        username='ana-' + name, password='x')
+    db.session.add(teacher)
+    db.session.flush()
+    course = A.Course(course_name=name, course_code=name, teacher_id=teacher.id)
+    db.session.add(course)
+    db.session.flush()
+    for number in range(students):
+        add_student(A, course, number)
+    db.session.commit()
+    return course
+
+
+def add_student(A, course, number):
+    student = A.Student(fingerprint_id=number + 1, lastname='Student', firstname=str(number),
+                        student_id='%s-%03d' % (course.course_name, number), parent_phone='0917000%04d' % number,
+                        course_id=course.id)
+    A.db.session.add(student)
+    return student
+
+
+# commits that reach the database while the block runs
+class Commits:
+    def __init__(self, engine):
+        self.engine = engine
+        self.count = 0
+
+    def __enter__(self):
+        event.listen(self.engine, 'commit', self.committed)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.engine, 'commit', self.committed)
+
+    def committed(self, connection):
+        self.count += 1
+
+
+def test_open_session_inserts_rows_in_one_commit(attendance):
+    A = attendance
+    course = add_course(A)
+    with Commits(A.db.engine) as commits:
+        session = A.open_session(course)
+    assert commits.count == 1
+    rows = A.AttendanceHistory.query.filter_by(session_id=session.id).all()
+    assert len(rows) == 3
+    assert {row.status for row in rows} == {'Absent'}
+
+
+def test_open_session_again_is_a_no_op(attendance):
+    A = attendance
+    course = add_course(A)
+    first = A.open_session(course)
+    with Commits(A.db.engine) as commits:
+        again = A.open_session(course)
+    assert again.id == first.id
+    assert commits.count == 0
+    assert A.AttendanceSession.query.count() == 1
+    assert A.AttendanceHistory.query.count() == 3
+
+
+def test_open_session_adds_students_enrolled_since(attendance):
+    A = attendance
+    course = add_course(A)
+    A.open_session(course)
+    add_student(A, course, 7)
+    A.db.session.commit()
+    with Commits(A.db.engine) as commits:
+        A.open_session(course)
+    assert commits.count == 1
+    assert A.AttendanceHistory.query.count() == 4
+
+
+class Reader:
+    def __init__(self, course):
+        self.name = 'test'
+        self.scanner = SimpleNamespace(status=lambda: {'course': course.course_code, 'course_id': course.id})
+
+
+def scan(A, course, fingerprint_id):
+    student = A.mark_present(Reader(course), course.course_code, fingerprint_id)
+    A.commits.flush()
+    for _ in range(200):
+        if not A.pending_present:
+            break
+        sleep(0.01)
+    return student
+
+
+# the rollups as counted from the attendance history
+def recount(A):
+    days, terms = {}, {}
+    for row in A.AttendanceHistory.query:
+        present = int(row.status == 'Present')
+        day = (row.session.course_id, row.session.date)
+        total_before, present_before = days.get(day, (0, 0))
+        days[day] = (total_before + 1, present_before + present)
+        term = (row.student_id, A.term_of(row.session.date))
+        sessions, present_before = terms.get(term, (0, 0))
+        terms[term] = (sessions + 1, present_before + present)
+    return days, terms
+
+
+def rollups(A):
+    A.db.session.expire_all()
+    days = {(row.course_id, row.date): (row.total, row.present) for row in A.CourseDayStats.query}
+    terms = {(row.student_id, row.term): (row.sessions, row.present) for row in A.StudentTermStats.query}
+    return days, terms
+
+
+def test_rollups_follow_scans(attendance):
+    A = attendance
+    course = add_course(A, students=3)
+    other = add_course(A, students=2, name='CM2')
+    A.open_session(course)
+    A.open_session(other)
+    assert rollups(A) == recount(A)
+    assert scan(A, course, 1)['present'] == 1
+    scan(A, course, 3)
+    # a second scan of the same student counts once
+    scan(A, course, 3)
+    scan(A, other, 2)
+    assert rollups(A) == recount(A)
+    assert rollups(A)[0][(course.id, date.today())] == (3, 2)
+
+
+def test_rebuild_stats_recounts_the_same_totals(attendance):
+    A = attendance
+    course = add_course(A, students=3)
+    A.open_session(course)
+    scan(A, course, 2)
+    # a student enrolled after the session opened, and a later open
+    add_student(A, course, 5)
+    A.db.session.commit()
+    A.open_session(course)
+    before = rollups(A)
+    assert A.rebuild_stats() == (1, 4)
+    assert rollups(A) == before == recount(A)
+
+
+# sensor slots written by restore_templates
+class Target:
+    def __init__(self):
+        self.slots = {}
+
+    def upload(self, location, data):
+        self.slots[location] = data
+        return adafruit_fingerprint.OK
+
+
+def backed_up(A, students=3):
+    course = add_course(A, students=students)
+    for student in A.Student.query:
+        A.backup_template(student, b'template %d' % student.fingerprint_id)
+    A.db.session.commit()
+    return course
+
+
+def test_damaged_backup_is_rejected(attendance):
+    A = attendance
+    backed_up(A, students=2)
+    first, second = A.FingerprintTemplate.query.order_by(A.FingerprintTemplate.student_id)
+    assert A.template_data(first) == b'template 1'
+    second.data = zlib.compress(b'template 9')
+    with pytest.raises(ValueError, match='checksum'):
+        A.template_data(second)
+    second.data = b'not zlib'
+    with pytest.raises(ValueError):
+        A.template_data(second)
+
+
+def test_restore_skips_damaged_backups(attendance):
+    A = attendance
+    backed_up(A)
+    row = A.FingerprintTemplate.query.join(A.Student).filter(A.Student.fingerprint_id == 2).one()
+    row.data = row.data[:-4]
+    A.db.session.commit()
+    target = Target()
+    result = A.restore_templates(target)
+    assert (result['restored'], result['failed'], result['corrupt']) == (2, 0, 1)
+    assert target.slots == {1: b'template 1', 3: b'template 3'}
+
+
+def test_restore_onto_a_new_sensor(attendance):
+    if not hasattr(adafruit_fingerprint, 'Adafruit_Fingerprint'):
+        pytest.skip('needs adafruit-circuitpython-fingerprint')
+    A = attendance
+    add_course(A, students=3)
+    old, new = FakeSensor(library_size=40), FakeSensor(library_size=40)
+    try:
+        engines = []
+        for sensor in (old, new):
+            uart = serial.Serial(sensor.port, baudrate=57600, timeout=1)
+            engines.append(drivers.CaptureEngine(drivers.connect(uart, (57600,))))
+        for student in A.Student.query:
+            old.enroll(student.fingerprint_id, student.student_id)
+            A.backup_template(student, engines[0].download(student.fingerprint_id))
+        A.db.session.commit()
+        result = A.restore_templates(engines[1])
+        assert (result['restored'], result['corrupt']) == (3, 0)
+        assert new.library == old.library
+    finally:
+        old.close()
+        new.close()
+
+
+def test_attendance_with_every_reader_busy(attendance, monkeypatch):
+    A = attendance
+    course = add_course(A)
+    busy = SimpleNamespace(assign=lambda code, name=None: None, get=lambda name=None: SimpleNamespace(name='door'),
+                           serving=lambda code: None)
+    monkeypatch.setattr(A, 'readers', busy)
+    client = A.app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(course.teacher_id)
+    response = client.get('/attendance/%s' % course.course_code)
+    assert response.status_code == 302 and response.location.endswith('/dashboard')
+    page = client.get('/dashboard')
+    assert b'Every fingerprint reader is taking attendance' in page.data
+    # the message is not kept in the page cache
+    assert b'Every fingerprint reader' not in client.get('/dashboard').data
+
+
+def wait_for(condition, seconds=15):
+    deadline = monotonic() + seconds
+    while monotonic() < deadline:
+        if condition():
+            return True
+        sleep(0.05)
+    return False
+
+
+# the whole path on the simulated hardware: a student is enrolled through the
+# web form, scans at the door reader and is marked present with an SMS queued
+def test_simulator_enroll_scan_and_mark_present(attendance):
+    if not hasattr(adafruit_fingerprint, 'Adafruit_Fingerprint'):
+        pytest.skip('needs adafruit-circuitpython-fingerprint')
+    A = attendance
+    course = add_course(A, students=0)
+    client = A.app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(course.teacher_id)
+    reader = A.readers.primary
+    sensor = A.simulator.sensor(reader.port)
+
+    # the finger goes down twice while the form is enrolling
+    sensor.touch('alice', seconds=0.8, delay=0.3)
+    sensor.touch('alice', seconds=0.8, delay=1.8)
+    response = client.post('/students/add', data={'student_id': 'S-1', 'lastname': 'Reyes', 'firstname': 'Alice',
+                                                  'course_id': course.id, 'parentphone': '09170000001'})
+    assert response.status_code == 302
+    student = A.Student.query.filter_by(student_id='S-1').one()
+    assert sensor.library.get(student.fingerprint_id) is not None
+    assert A.db.session.get(A.FingerprintTemplate, student.id) is not None
+
+    assert client.get('/attendance/%s' % course.course_code).status_code == 200
+    try:
+        assert reader.scanner.status()['course'] == course.course_code
+        client.post('/simulator/touch', data={'reader': reader.name, 'person': 'alice'})
+
+        def present():
+            A.db.session.expire_all()
+            return A.AttendanceHistory.query.filter_by(student_id=student.id, status='Present').count() == 1
+        assert wait_for(present)
+        assert wait_for(lambda: A.SmsOutbox.query.count() == 1)
+    finally:
+        client.post('/scanner/stop', query_string={'reader': reader.name})
+
+
+def test_move_to_a_course_without_free_slots_is_refused(attendance, monkeypatch):
+    A = attendance
+    course = add_course(A, students=3)
+    other = add_course(A, students=0, name='CM2')
+    # slots 1-3 of a 4-slot library hold the three students
+    monkeypatch.setattr(A, 'slots', SlotAllocator(4, [1, 2, 3]))
+    student = A.Student.query.filter_by(fingerprint_id=1).one()
+    client = A.app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(course.teacher_id)
+    response = client.post('/students/update/%d' % student.id, data={
+        'studentid': student.student_id, 'lastname': 'Moved', 'firstname': student.firstname,
+        'course_id': other.id, 'parentphone': student.parent_phone})
+    assert response.status_code == 302 and response.location.endswith('/students/update/%d' % student.id)
+    A.db.session.expire_all()
+    student = A.db.session.get(A.Student, student.id)
+    assert (student.course_id, student.fingerprint_id, student.lastname) == (course.id, 1, 'Student')
+    assert A.FingerprintRange.query.count() == 0
+    assert b'No fingerprint slot is free' in client.get('/students/update/%d' % student.id).data
+
+
+def test_cached_page_is_gzipped_once(attendance, monkeypatch):
+    A = attendance
+    course = add_course(A)
+    A.pages.clear()
+    calls = []
+
+    def gzip_bytes(data, level=9):
+        calls.append(level)
+        return real(data, level)
+    real = A.gzip_bytes
+    monkeypatch.setattr(A, 'gzip_bytes', gzip_bytes)
+    client = A.app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(course.teacher_id)
+    first = client.get('/dashboard', headers={'Accept-Encoding': 'gzip'})
+    second = client.get('/dashboard', headers={'Accept-Encoding': 'gzip'})
+    assert first.headers['Content-Encoding'] == second.headers['Content-Encoding'] == 'gzip'
+    assert first.data == second.data
+    assert len(calls) == 1
+    assert b'CM1' in client.get('/dashboard').data
+
+
+@pytest.mark.parametrize('path', ['/static/dist/missing.css', '/static/dist/../../app.py',
+                                  '/static/dist/%2e%2e/%2e%2e/app.py', '/static/../app.py'])
+def test_missing_static_file_is_a_404(attendance, path):
+    response = attendance.app.test_client().get(path)
+    assert response.status_code == 404
+    assert 'Location' not in response.headers
@@ -0,0 +1,72 @@
+import gzip
+import os
+from datetime import datetime, date
+
+import pytest
+
+from archive import Archive
+
+
+def row(id, course_id=4, teacher_id=8, status='Present', day=date(2024, 2, 1), timein=datetime(2024, 2, 1, 8, 5)):
+    return {'id': id, 'student_pk': 10 + id, 'student_id': '100%d' % id, 'student_name': 'Student, "%d"' % id,
+            'course_id': course_id, 'course': 'CM1', 'teacher_id': teacher_id, 'course_teacher': 'Ana Reyes',
+            'status': status, 'date': day, 'date_timein': timein, 'extra': 'ignored'}
+
+
+def test_store_and_read_back(tmp_path):
+    archive = Archive(str(tmp_path / 'archive'))
+    assert archive.terms() == []
+    assert list(archive.rows('2024-1')) == []
+    assert archive.store('2024-1', [row(1), row(2, course_id=None, teacher_id=None, timein=None)]) == 2
+    first, second = archive.rows('2024-1')
+    assert first['student_name'] == 'Student, "1"'
+    assert first['id'] == 1 and first['course_id'] == 4 and first['date_timein'] == datetime(2024, 2, 1, 8, 5)
+    assert 'extra' not in first
+    assert second['course_id'] is None and second['teacher_id'] is None and second['date_timein'] is None
+    assert archive.terms() == ['2024-1']
+
+
+def test_store_again_appends_a_member(tmp_path):
+    archive = Archive(str(tmp_path))
+    archive.store('2024-1', [row(1)])
+    archive.store('2024-1', [row(2)])
+    assert archive.ids('2024-1') == {1, 2}
+    # one header, written with the first member
+    with gzip.open(archive.path('2024-1'), 'rt') as f:
+        assert f.read().count('student_pk') == 1
+
+
+def test_read_filters(tmp_path):
+    archive = Archive(str(tmp_path))
+    archive.store('2024-1', [row(1), row(2, status='Absent'), row(3, course_id=5, teacher_id=9)])
+    archive.store('2024-2', [row(4, day=date(2024, 9, 1))])
+    assert [r['id'] for r in archive.read()] == [1, 2, 3, 4]
+    assert [r['id'] for r in archive.read(terms=['2024-2'])] == [4]
+    assert [r['id'] for r in archive.read(teacher_id=9)] == [3]
+    assert [r['id'] for r in archive.read(course_id=4, status='Absent')] == [2]
+    assert [r['id'] for r in archive.read(start=date(2024, 3, 1))] == [4]
+    assert [r['id'] for r in archive.read(end=date(2024, 3, 1))] == [1, 2, 3]
+
+
+def test_terms_ignore_other_files(tmp_path):
+    archive = Archive(str(tmp_path))
+    archive.store('2024-1', [row(1)])
+    (tmp_path / 'notes.txt').write_text('x')
+    (tmp_path / 'attendance-2024-2.csv').write_text('x')
+    assert archive.terms() == ['2024-1']
+    assert set(archive.sizes()) == {'2024-1'}
+    assert archive.sizes()['2024-1'] > 0
+
+
+def test_failed_store_leaves_the_term_as_it_was(tmp_path):
+    archive = Archive(str(tmp_path))
+    archive.store('2024-1', [row(1)])
+    before = open(archive.path('2024-1'), 'rb').read()
+
+    def rows():
+        yield row(2)
+        raise OSError('database is locked')
+    with pytest.raises(OSError):
+        archive.store('2024-1', rows())
+    assert open(archive.path('2024-1'), 'rb').read() == before
+    assert sorted(os.listdir(tmp_path)) == ['attendance-2024-1.csv.gz']
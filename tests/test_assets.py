@@ -0,0 +1,129 @@
+import gzip
+import json
+import os
+
+import pytest
+
+import assets
+from assets import Assets
+
+
+def test_minify_js_keeps_lines_and_licences():
+    text = '/*! MIT */\n  var a = 1;\n\n  // a comment\n/* block\n   comment */\nvar b = "http://x";\n//# sourceMappingURL=x.map\n'
+    assert assets.minify('a.js', text) == '/*! MIT */\nvar a = 1;\nvar b = "http://x";'
+
+
+def test_minify_css():
+    text = '/* head */\n.a ,  .b {\n  color : red ;\n}\n/*! licence */'
+    assert assets.minify('a.css', text) == '.a,.b{color:red;}/*! licence */'
+
+
+def test_minified_sources_are_left_alone():
+    assert assets.minify('x.min.js', ' a  =  1 \n/*# sourceMappingURL=x.map */') == 'a  =  1'
+
+
+def test_subset_icons():
+    css = '.fa-user:before{content:"\\f007"}.fa-bomb:before{content:"\\f1e2"}.fa{display:inline-block}'
+    assert assets.subset_icons(css, {'user'}) == '.fa-user:before{content:"\\f007"}.fa{display:inline-block}'
+
+
+def test_used_icons(tmp_path):
+    (tmp_path / 'page.html').write_text('<i class="fas fa-user"></i>')
+    (tmp_path / 'live.js').write_text("icon.addClass('fa-check')")
+    (tmp_path / 'vendor.min.js').write_text("'fa-bomb'")
+    assert assets.used_icons([str(tmp_path)]) == {'user', 'check'}
+
+
+def test_fingerprinted_and_gzip_are_stable():
+    assert assets.fingerprinted('app.css', b'x') == assets.fingerprinted('app.css', b'x')
+    assert assets.fingerprinted('app.css', b'x') != assets.fingerprinted('app.css', b'y')
+    assert assets.fingerprinted('app.css', b'x').endswith('.css')
+    assert assets.gzip_bytes(b'data') == assets.gzip_bytes(b'data')
+    assert gzip.decompress(assets.gzip_bytes(b'data')) == b'data'
+
+
+@pytest.fixture
+def site(tmp_path, monkeypatch):
+    static = tmp_path / 'static'
+    templates = tmp_path / 'templates'
+    (static / 'css').mkdir(parents=True)
+    (static / 'fonts').mkdir()
+    (static / 'js').mkdir()
+    templates.mkdir()
+    (static / 'css' / 'icons.css').write_text(
+        '.fa-user:before{content:"\\f007"}.fa-bomb:before{content:"\\f1e2"}'
+        '@font-face{src:url(../fonts/fa.woff2?v=5) format("woff2"),url("data:x")}')
+    (static / 'fonts' / 'fa.woff2').write_bytes(b'font')
+    (static / 'js' / 'a.js').write_text('// a\nvar a = 1;\n')
+    (static / 'js' / 'b.js').write_text('var b = 2;\n')
+    (templates / 'base.html').write_text('<i class="fa-user"></i>')
+    monkeypatch.setattr(assets, 'BUNDLES', {'app.css': ['css/icons.css'], 'core.js': ['js/a.js', 'js/b.js']})
+    monkeypatch.setattr(assets, 'FONTAWESOME', 'css/icons.css')
+    return str(static), str(templates)
+
+
+def test_build(site):
+    static, templates = site
+    manifest = assets.build(static, templates)
+    dist = os.path.join(static, 'dist')
+    [script] = manifest['bundles']['core.js']
+    with open(os.path.join(static, script)) as f:
+        assert f.read() == 'var a = 1;;\nvar b = 2;'
+    assert os.path.exists(os.path.join(static, script + '.gz'))
+    [style] = manifest['bundles']['app.css']
+    with open(os.path.join(static, style)) as f:
+        css = f.read()
+    font = manifest['files']['fonts/fa.woff2']
+    assert 'fa-bomb' not in css and 'fa-user' in css
+    assert 'url(%s?v=5)' % font in css and 'url("data:x")' in css
+    # fonts are compressed already
+    assert os.path.exists(os.path.join(dist, font))
+    assert not os.path.exists(os.path.join(dist, font + '.gz'))
+    with open(os.path.join(dist, 'manifest.json')) as f:
+        assert json.load(f) == manifest
+
+
+def test_rebuild_replaces_old_files(site):
+    static, templates = site
+    first = assets.build(static, templates)
+    with open(os.path.join(static, 'js', 'b.js'), 'w') as f:
+        f.write('var b = 3;\n')
+    second = assets.build(static, templates)
+    assert first['bundles']['core.js'] != second['bundles']['core.js']
+    assert not os.path.exists(os.path.join(static, first['bundles']['core.js'][0]))
+
+
+def test_files_fall_back_to_sources(site):
+    static, templates = site
+    files = Assets(static)
+    assert files.manifest() is None
+    assert files.stamp() is None
+    assert files.files('core.js') == ['js/a.js', 'js/b.js']
+    assets.build(static, templates)
+    assert files.files('core.js')[0].startswith('dist/core.')
+    assert files.files('core.js', bundled=False) == ['js/a.js', 'js/b.js']
+    assert files.is_built(files.files('core.js')[0])
+    assert not files.is_built('js/a.js')
+    assert files.stamp() is not None
+
+
+def test_manifest_reloaded_after_a_build(site):
+    static, templates = site
+    files = Assets(static)
+    assets.build(static, templates)
+    first = files.files('core.js')
+    with open(os.path.join(static, 'js', 'b.js'), 'w') as f:
+        f.write('var b = 3;\n')
+    assets.build(static, templates)
+    os.utime(files.path, (0, 12345))
+    assert files.files('core.js') != first
+
+
+def test_broken_manifest_serves_sources(site, capsys):
+    static, templates = site
+    os.makedirs(os.path.join(static, 'dist'))
+    with open(os.path.join(static, 'dist', 'manifest.json'), 'w') as f:
+        f.write('{')
+    files = Assets(static)
+    assert files.files('app.css') == ['css/icons.css']
+    assert 'Error:' in capsys.readouterr().out
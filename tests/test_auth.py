@@ -0,0 +1,103 @@
+from types import SimpleNamespace
+
+import auth
+from auth import Identity, IdentityCache, PasswordPolicy
+
+FAST = 'pbkdf2:sha256:1000'
+
+
+def teacher(id):
+    return SimpleNamespace(id=id, username='t%d' % id, teacher_id='T%d' % id, lastname='Reyes', firstname='Ana',
+                           middlename='', gender='F')
+
+
+def test_identity_copies_the_teacher():
+    identity = Identity(teacher(8))
+    assert identity.get_id() == '8'
+    assert identity.fullname == 'Ana Reyes'
+    assert identity.is_authenticated
+
+
+def test_cache_hits_until_invalidated():
+    loads = []
+
+    def load(user_id):
+        loads.append(user_id)
+        return Identity(teacher(user_id))
+    cache = IdentityCache(load)
+    first = cache.get(1)
+    assert cache.get(1) is first
+    cache.invalidate(1)
+    assert cache.get(1) is not first
+    cache.get(2)
+    cache.invalidate()
+    cache.get(2)
+    assert loads == [1, 1, 2, 2]
+    assert cache.stats() == {'entries': 1, 'hits': 1, 'misses': 4}
+
+
+def test_cache_expires(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(auth, 'monotonic', lambda: now[0])
+    cache = IdentityCache(lambda user_id: Identity(teacher(user_id)), ttl=10)
+    first = cache.get(1)
+    now[0] += 9
+    assert cache.get(1) is first
+    now[0] += 2
+    assert cache.get(1) is not first
+
+
+def test_cache_drops_least_recently_used():
+    cache = IdentityCache(lambda user_id: Identity(teacher(user_id)), max_size=2)
+    one = cache.get(1)
+    cache.get(2)
+    cache.get(1)
+    cache.get(3)
+    assert cache.stats()['entries'] == 2
+    assert cache.get(1) is one
+    assert cache.stats()['misses'] == 3
+
+
+def test_unknown_user_is_not_cached():
+    loads = []
+    cache = IdentityCache(lambda user_id: loads.append(user_id))
+    assert cache.get(5) is None
+    assert cache.get(5) is None
+    assert loads == [5, 5]
+    assert cache.stats()['entries'] == 0
+
+
+def test_verify():
+    policy = PasswordPolicy(method=FAST)
+    stored = policy.hash('secret')
+    assert stored.startswith(FAST + '$')
+    assert policy.verify(stored, 'secret') == (True, None)
+    assert policy.verify(stored, 'wrong') == (False, None)
+
+
+def test_verify_rehashes_other_methods():
+    old = PasswordPolicy(method='pbkdf2:sha256:2000').hash('secret')
+    matches, new = PasswordPolicy(method=FAST).verify(old, 'secret')
+    assert matches
+    assert new.startswith(FAST + '$')
+    assert PasswordPolicy(method=FAST).verify(old, 'wrong') == (False, None)
+
+
+def test_calibrated_method_is_kept(tmp_path, monkeypatch):
+    path = tmp_path / 'password_method'
+    monkeypatch.setattr(auth, 'benchmark_iterations', lambda seconds, minimum: 120000)
+    assert PasswordPolicy(cache_path=str(path)).method == 'pbkdf2:sha256:120000'
+    assert path.read_text() == 'pbkdf2:sha256:120000\n'
+    monkeypatch.setattr(auth, 'benchmark_iterations', lambda seconds, minimum: 1 / 0)
+    assert PasswordPolicy(cache_path=str(path)).method == 'pbkdf2:sha256:120000'
+
+
+def test_unwritable_cache_still_calibrates(tmp_path, monkeypatch):
+    monkeypatch.setattr(auth, 'benchmark_iterations', lambda seconds, minimum: 130000)
+    policy = PasswordPolicy(cache_path=str(tmp_path / 'missing' / 'password_method'))
+    assert policy.method == 'pbkdf2:sha256:130000'
+
+
+def test_benchmark_iterations_minimum():
+    assert auth.benchmark_iterations(0, 100000, sample=1000) == 100000
+    assert auth.benchmark_iterations(0.05, 1000, sample=1000) % 10000 == 0
@@ -0,0 +1,145 @@
+from threading import Event
+from time import sleep
+
+import pytest
+
+from drivers.display import DisplayService, PRIORITY_LOW, PRIORITY_NORMAL, PRIORITY_HIGH
+
+
+# Records the screens drawn. While `gate` is closed the first screen stays on
+# the panel, so the tests can line messages up behind it.
+class FakeLcd:
+    def __init__(self):
+        self.screens = []
+        self.drawing = Event()
+        self.gate = Event()
+
+    def lcd_clear(self):
+        self.screens.append([])
+        self.drawing.set()
+        self.gate.wait(2)
+
+    def lcd_display_string(self, text, line):
+        self.screens[-1].append((line, text))
+
+
+@pytest.fixture
+def lcd():
+    return FakeLcd()
+
+
+def held(lcd, **options):
+    display = DisplayService(lambda: lcd, **options)
+    display.show('busy')
+    assert lcd.drawing.wait(2)
+    return display
+
+
+def shown(lcd):
+    return [screen[0][1] if screen else None for screen in lcd.screens[1:]]
+
+
+def test_show_draws_lines(lcd):
+    lcd.gate.set()
+    display = DisplayService(lambda: lcd)
+    display.show('Welcome', '', 'Scan finger')
+    assert display.wait_idle(2)
+    assert lcd.screens == [[(1, 'Welcome'), (3, 'Scan finger')]]
+    display.clear()
+    assert display.wait_idle(2)
+    assert lcd.screens[-1] == []
+    assert display.shown == 2
+
+
+def test_priority_order(lcd):
+    display = held(lcd)
+    display.show('low', priority=PRIORITY_LOW)
+    display.show('normal 1')
+    display.show('high', priority=PRIORITY_HIGH)
+    display.show('normal 2', priority=PRIORITY_NORMAL)
+    lcd.gate.set()
+    assert display.wait_idle(2)
+    assert shown(lcd) == ['high', 'normal 1', 'normal 2', 'low']
+
+
+def test_same_key_replaces_waiting_message(lcd):
+    display = held(lcd)
+    display.show('3 present', key='count')
+    display.show('other')
+    display.show('4 present', key='count')
+    assert display.pending() == 2
+    lcd.gate.set()
+    assert display.wait_idle(2)
+    assert shown(lcd) == ['other', '4 present']
+    assert display.coalesced == 1
+
+
+def test_expired_message_is_dropped(lcd):
+    display = held(lcd)
+    display.show('stale', ttl=0.01)
+    display.show('fresh', ttl=10)
+    sleep(0.05)
+    lcd.gate.set()
+    assert display.wait_idle(2)
+    assert shown(lcd) == ['fresh']
+    assert display.dropped == 1
+
+
+def test_full_queue_drops_oldest_lowest_priority(lcd):
+    display = held(lcd, max_pending=2)
+    display.show('normal', key='n')
+    display.show('low 1', priority=PRIORITY_LOW)
+    display.show('low 2', priority=PRIORITY_LOW)
+    display.show('high', priority=PRIORITY_HIGH)
+    assert display.pending() == 2
+    lcd.gate.set()
+    assert display.wait_idle(2)
+    assert shown(lcd) == ['high', 'normal']
+    assert display.dropped == 2
+
+
+def test_wait_idle_times_out(lcd):
+    display = held(lcd)
+    assert not display.wait_idle(0.05)
+    lcd.gate.set()
+    assert display.wait_idle(2)
+
+
+def test_lcd_error_is_survived(lcd, capsys):
+    lcd.gate.set()
+    attempts = []
+
+    def factory():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise OSError('Remote I/O error')
+        return lcd
+    display = DisplayService(factory)
+    display.show('first')
+    assert display.wait_idle(2)
+    display.show('second')
+    assert display.wait_idle(2)
+    assert 'Error: Remote I/O error' in capsys.readouterr().out
+    assert lcd.screens == [[(1, 'second')]]
+    assert display.shown == 1
+
+
+def test_buffered_lcd_is_flushed_once_per_screen(lcd):
+    lcd.gate.set()
+    flushed = []
+    lcd.lcd_flush = lambda: flushed.append(len(lcd.screens))
+    display = DisplayService(lambda: lcd)
+    display.show('Name', 'Present')
+    assert display.wait_idle(2)
+    assert flushed == [1]
+
+
+def test_observe_times_render_and_hold(lcd):
+    lcd.gate.set()
+    phases = []
+    display = DisplayService(lambda: lcd, observe=lambda phase, seconds: phases.append((phase, seconds)))
+    display.show('Present', duration=0.01)
+    display.show('Next')
+    assert display.wait_idle(2)
+    assert [phase for phase, seconds in phases] == ['render', 'hold', 'render']
+    assert phases[1][1] == 0.01
@@ -0,0 +1,86 @@
+from threading import Thread
+
+from events import EventBus
+
+
+def test_wait_returns_events_in_scope():
+    bus = EventBus()
+    cursor = bus.cursor()
+    bus.publish('present', {'id': 1}, ['course:4', 'teacher:8'])
+    bus.publish('present', {'id': 2}, ['course:5', 'teacher:9'])
+    bus.publish('student', {'id': 3}, ['course:4', 'teacher:8'])
+    events, cursor = bus.wait(cursor, {'teacher:8'}, 0)
+    assert [(event.name, event.data['id']) for event in events] == [('present', 1), ('student', 3)]
+    assert cursor == 3
+    assert bus.wait(cursor, {'teacher:8'}, 0) == ([], 3)
+
+
+def test_other_scopes_move_the_cursor():
+    bus = EventBus()
+    bus.publish('present', {}, ['course:5'])
+    assert bus.wait(0, {'course:4'}, 0.01) == ([], 1)
+
+
+def test_wait_wakes_on_publish():
+    bus = EventBus()
+    result = []
+    waiter = Thread(target=lambda: result.append(bus.wait(0, {'global'}, 5)))
+    waiter.start()
+    bus.publish('course', {'id': 4}, ['global'])
+    waiter.join(2)
+    assert not waiter.is_alive()
+    assert [event.data for event in result[0][0]] == [{'id': 4}]
+
+
+def test_cursor_from_last_event_id():
+    bus = EventBus(replay=2)
+    for i in range(3):
+        bus.publish('present', {}, ['global'])
+    assert bus.cursor() == 3
+    assert bus.cursor(bus.event_id(3)) == 3
+    # seq 2 and 3 are still in the ring, events after 1 can be replayed
+    assert bus.cursor(bus.event_id(1)) == 1
+    assert bus.cursor(bus.event_id(0)) is None
+    assert bus.cursor(bus.event_id(4)) is None
+    assert bus.cursor('0-1') is None
+    assert bus.cursor('garbage') is None
+    assert bus.cursor('') == 3
+
+
+def test_cursor_of_an_empty_bus():
+    bus = EventBus()
+    assert bus.cursor(bus.event_id(0)) == 0
+    assert bus.cursor(bus.event_id(1)) is None
+
+
+def test_stream_formats_events():
+    bus = EventBus()
+    stream = bus.stream({'course:4'}, keepalive=0, retry=1000)
+    assert next(stream) == 'retry: 1000\n\n'
+    assert bus.stats()['subscribers'] == 1
+    assert next(stream) == ': keepalive\n\n'
+    bus.publish('present', {'history_id': 7, 'status': 'Present'}, ['course:4'])
+    assert next(stream) == 'id: %s\nevent: present\ndata: {"history_id":7,"status":"Present"}\n\n' % bus.event_id(1)
+    stream.close()
+    assert bus.stats() == {'subscribers': 0, 'published': 1, 'buffered': 1}
+
+
+def test_stream_replays_after_last_event_id():
+    bus = EventBus()
+    bus.publish('present', {'id': 1}, ['global'])
+    bus.publish('present', {'id': 2}, ['global'])
+    stream = bus.stream({'global'}, last_event_id=bus.event_id(1), keepalive=0)
+    next(stream)
+    assert '"id":2' in next(stream)
+    stream.close()
+
+
+def test_stream_resets_a_stale_browser():
+    bus = EventBus()
+    bus.publish('present', {}, ['global'])
+    stream = bus.stream({'global'}, last_event_id='0-5', keepalive=0)
+    next(stream)
+    assert next(stream) == 'id: %s\nevent: reset\ndata: {}\n\n' % bus.event_id(1)
+    # carries on from now
+    assert next(stream) == ': keepalive\n\n'
+    stream.close()
@@ -0,0 +1,80 @@
+import csv
+import io
+import zipfile
+from datetime import datetime, date
+from xml.etree import ElementTree
+
+from sqlalchemy import text
+
+import export
+
+SHEET = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+
+
+def read_csv(chunks):
+    data = b''.join(chunks).decode()
+    assert data.startswith('\ufeff')
+    return list(csv.reader(io.StringIO(data[1:])))
+
+
+def read_xlsx(chunks):
+    book = zipfile.ZipFile(io.BytesIO(b''.join(chunks)))
+    assert book.testzip() is None
+    sheet = ElementTree.fromstring(book.read('xl/worksheets/sheet1.xml'))
+    rows = []
+    for row in sheet.iter(SHEET + 'row'):
+        rows.append([''.join(cell.itertext()) for cell in row])
+    return book, rows
+
+
+def test_cell_text():
+    assert export.cell_text(None) == ''
+    assert export.cell_text(datetime(2024, 2, 1, 8, 5, 9, 123)) == '2024-02-01 08:05:09'
+    assert export.cell_text(date(2024, 2, 1)) == '2024-02-01'
+    assert export.cell_text(7) == '7'
+
+
+def test_csv():
+    rows = read_csv(export.csv_stream(['Name', 'Time'], [('Ana, R.', datetime(2024, 2, 1, 8, 0)), ('Ben', None)]))
+    assert rows == [['Name', 'Time'], ['Ana, R.', '2024-02-01 08:00:00'], ['Ben', '']]
+
+
+def test_csv_formula_is_neutralised():
+    rows = read_csv(export.csv_stream(['x'], [('=HYPERLINK("x")',), ('@SUM(A1)',), (-3,), ('-3',)]))
+    assert [row[0] for row in rows[1:]] == ['\'=HYPERLINK("x")', "'@SUM(A1)", '-3', "'-3"]
+
+
+def test_csv_is_chunked():
+    chunks = list(export.csv_stream(['n'], [(i,) for i in range(1000)], chunk=100))
+    assert len(chunks) > 10
+    assert all(len(chunk) < 200 for chunk in chunks)
+    assert len(read_csv(chunks)) == 1001
+
+
+def test_xlsx():
+    book, rows = read_xlsx(export.xlsx_stream(['Name', 'Score'], [('Ana & <Ben>', 3), ('x\x01y', None)], sheet='A "B"'))
+    assert rows == [['Name', 'Score'], ['Ana & <Ben>', '3'], ['xy', '']]
+    assert b'name="A &quot;B&quot;"' in book.read('xl/workbook.xml')
+
+
+def test_xlsx_numbers_and_booleans():
+    row = export.xlsx_row(2, [1.5, True])
+    assert row == '<row r="2"><c><v>1.5</v></c><c t="inlineStr"><is><t xml:space="preserve">True</t></is></c></row>'
+
+
+def test_xlsx_is_chunked():
+    chunks = list(export.xlsx_stream(['n'], (('row %d' % i,) for i in range(20000)), chunk=1024))
+    assert len(chunks) > 2
+    book, rows = read_xlsx(chunks)
+    assert len(rows) == 20001
+    assert rows[-1] == ['row 19999']
+
+
+def test_stream_rows(database):
+    app, db = database
+    with app.app_context():
+        with db.engine.begin() as conn:
+            conn.execute(text('CREATE TABLE t (x INTEGER)'))
+            conn.execute(text('INSERT INTO t VALUES (1), (2), (3)'))
+        rows = export.stream_rows(db.session, text('SELECT x FROM t ORDER BY x'), batch=2)
+        assert [row[0] for row in rows] == [1, 2, 3]
@@ -0,0 +1,178 @@
+import adafruit_fingerprint
+import pytest
+import serial
+
+import drivers
+from drivers.fake_sensor import FakeSensor
+from drivers import fingerprint
+
+
+# get_image of a sensor: NOFINGER for `misses` calls, then OK
+class StubFinger:
+    def __init__(self, misses=None):
+        self.misses = misses
+        self.calls = 0
+
+    def get_image(self):
+        self.calls += 1
+        if self.misses is not None and self.calls > self.misses:
+            return adafruit_fingerprint.OK
+        return adafruit_fingerprint.NOFINGER
+
+    def image_2_tz(self, slot):
+        return adafruit_fingerprint.NOFINGER
+
+
+# stands in for the wake-up event: records how long each pause would be and
+# can report a wake() during the pause
+class Pauses:
+    def __init__(self, woken=()):
+        self.waits = []
+        self.woken = set(woken)
+
+    def set(self):
+        pass
+
+    def clear(self):
+        pass
+
+    def wait(self, interval):
+        self.waits.append(round(interval, 4))
+        return len(self.waits) in self.woken
+
+
+def paced(finger, pauses, **options):
+    capture = drivers.CaptureEngine(finger, fast=0.05, slow=0.4, backoff=2, **options)
+    capture._wakeup = pauses
+    return capture
+
+
+def test_idle_polling_backs_off_to_slow():
+    pauses = Pauses()
+    capture = paced(StubFinger(misses=6), pauses)
+    capture.wake()
+    assert capture.wait_image() == adafruit_fingerprint.OK
+    assert pauses.waits == [0.05, 0.1, 0.2, 0.4, 0.4, 0.4]
+
+
+def test_wakeup_during_pause_polls_fast_again():
+    pauses = Pauses(woken=[3])
+    capture = paced(StubFinger(misses=5), pauses)
+    capture.wake()
+    assert capture.wait_image() == adafruit_fingerprint.OK
+    assert pauses.waits == [0.05, 0.1, 0.2, 0.05, 0.1]
+
+
+def test_polling_starts_slow_when_not_woken():
+    pauses = Pauses()
+    capture = paced(StubFinger(misses=2), pauses)
+    assert capture.wait_image() == adafruit_fingerprint.OK
+    assert pauses.waits == [0.4, 0.4]
+
+
+def test_polling_times_out():
+    capture = drivers.CaptureEngine(StubFinger(), fast=0.01, slow=0.01)
+    assert capture.wait_image(timeout=0.05) == fingerprint.TIMEOUT
+    assert capture.packets['image'] > 1
+
+
+def test_polling_can_be_cancelled():
+    finger = StubFinger()
+    capture = drivers.CaptureEngine(finger, fast=0.01, slow=0.01)
+    assert capture.wait_image(cancelled=lambda: finger.calls >= 3) == fingerprint.CANCELLED
+    assert finger.calls == 3
+
+
+def test_identify_without_finger_does_not_wake():
+    capture = drivers.CaptureEngine(StubFinger(), fast=0.01, slow=0.02)
+    for _ in range(3):
+        assert capture.identify(timeout=0.02) == fingerprint.TIMEOUT
+    assert capture._interval() == capture.slow
+
+
+def test_identify_wakes_once_a_finger_is_read():
+    capture = drivers.CaptureEngine(StubFinger(misses=0), fast=0.01, slow=0.02)
+    assert capture.identify() == adafruit_fingerprint.NOFINGER
+    assert capture._interval() == capture.fast
+
+
+@pytest.fixture
+def open_reader():
+    if not hasattr(adafruit_fingerprint, 'Adafruit_Fingerprint'):
+        pytest.skip('needs adafruit-circuitpython-fingerprint')
+    sensors = []
+
+    def open_reader(**options):
+        sensor = FakeSensor(library_size=40, touch_seconds=0.5, **options)
+        sensors.append(sensor)
+        uart = serial.Serial(sensor.port, baudrate=57600, timeout=1)
+        finger = drivers.connect(uart, (57600,))
+        return sensor, finger, drivers.CaptureEngine(finger)
+    yield open_reader
+    for sensor in sensors:
+        sensor.close()
+
+
+def scan(sensor, capture, person):
+    sensor.touch(person)
+    capture.wake()
+    assert capture.wait_image() == adafruit_fingerprint.OK
+    assert capture.template(1) == adafruit_fingerprint.OK
+
+
+def test_search_finds_template_in_range(open_reader):
+    sensor, finger, capture = open_reader()
+    sensor.enroll(12, 'alice')
+    scan(sensor, capture, 'alice')
+    assert capture.search(10, 5) == adafruit_fingerprint.OK
+    assert finger.finger_id == 12
+
+
+def test_search_outside_range_is_not_found(open_reader):
+    sensor, finger, capture = open_reader()
+    sensor.enroll(12, 'alice')
+    scan(sensor, capture, 'alice')
+    assert capture.search(0, 10) == adafruit_fingerprint.NOTFOUND
+
+
+def test_fast_search_kept_when_supported(open_reader):
+    sensor, finger, capture = open_reader()
+    sensor.enroll(3, 'alice')
+    scan(sensor, capture, 'alice')
+    assert capture.search(0, 10) == adafruit_fingerprint.OK
+    assert capture.fast_search is True
+    assert sensor.commands.get(fingerprint.SEARCH) is None
+
+
+def test_rejected_fast_search_returns_status(open_reader):
+    sensor, finger, capture = open_reader(unsupported=[fingerprint.HISPEED_SEARCH])
+    scan(sensor, capture, 'alice')
+    assert fingerprint.search(finger, 0, 10, fast=True) == adafruit_fingerprint.PACKETRECIEVEERR
+
+
+def test_rejected_fast_search_falls_back(open_reader):
+    sensor, finger, capture = open_reader(unsupported=[fingerprint.HISPEED_SEARCH])
+    sensor.enroll(3, 'alice')
+    scan(sensor, capture, 'alice')
+    assert capture.search(0, 10) == adafruit_fingerprint.OK
+    assert finger.finger_id == 3
+    assert capture.fast_search is False
+    # later scans go straight to the normal search
+    assert capture.search(0, 10) == adafruit_fingerprint.OK
+    assert sensor.commands[fingerprint.HISPEED_SEARCH] == 1
+    assert sensor.commands[fingerprint.SEARCH] == 2
+
+
+def test_garbled_fast_search_reply_falls_back(open_reader, monkeypatch):
+    sensor, finger, capture = open_reader()
+    sensor.enroll(3, 'alice')
+    scan(sensor, capture, 'alice')
+    real = fingerprint.search
+
+    def garbled(finger, start, count, fast=False):
+        if fast:
+            raise RuntimeError('Incorrect packet data')
+        return real(finger, start, count)
+    monkeypatch.setattr(fingerprint, 'search', garbled)
+    assert capture.search(0, 10) == adafruit_fingerprint.OK
+    assert capture.fast_search is False
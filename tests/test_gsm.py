@@ -0,0 +1,131 @@
+from time import sleep
+
+import pytest
+import serial
+
+from drivers.fake_modem import FakeModem
+from drivers.gsm import GsmModem, ModemError, SendUnconfirmed
+
+
+# In-memory port: read() hands out the canned reply a few bytes at a time
+class Port:
+    def __init__(self, reply=b''):
+        self.reply = reply
+        self.written = b''
+        self.is_open = True
+
+    @property
+    def in_waiting(self):
+        return min(len(self.reply), 4)
+
+    def read(self, size):
+        data, self.reply = self.reply[:size], self.reply[size:]
+        return data
+
+    def write(self, data):
+        self.written += data
+
+    def reset_input_buffer(self):
+        pass
+
+    def close(self):
+        self.is_open = False
+
+
+def reading(reply, timeout=0.2, prompt=False):
+    modem = GsmModem(timeout=timeout)
+    modem.serial = Port(reply)
+    return modem.read_response(prompt=prompt)
+
+
+def test_reads_until_ok():
+    assert reading(b'\r\n+CSQ: 20,0\r\n\r\nOK\r\n') == ['+CSQ: 20,0']
+    assert reading(b'AT\r\r\nOK\r\n') == ['AT\r']
+
+
+@pytest.mark.parametrize('result', [b'ERROR', b'+CME ERROR: 10', b'+CMS ERROR: 500'])
+def test_error_result_raises(result):
+    with pytest.raises(ModemError) as error:
+        reading(b'\r\n' + result + b'\r\n')
+    assert str(error.value) == result.decode()
+
+
+def test_reads_until_prompt():
+    assert reading(b'\r\n> ', prompt=True) == ['']
+    # without prompt=True the '>' is not an answer
+    with pytest.raises(ModemError):
+        reading(b'\r\n> ', timeout=0.05)
+
+
+def test_silence_times_out():
+    with pytest.raises(ModemError) as error:
+        reading(b'\r\n+CSQ: 20,0\r\n', timeout=0.05)
+    assert str(error.value).startswith('timeout')
+
+
+@pytest.fixture
+def fake():
+    fake = FakeModem(reply_delay=0, send_delay=0.01, fail_numbers=['09990000000'])
+    yield fake
+    fake.close()
+
+
+def test_send_returns_reference(fake):
+    modem = GsmModem(fake.port, timeout=1)
+    assert modem.send_sms('09170000000', 'present') == 1
+    assert modem.send_sms('09170000001', 'absent') == 2
+    assert fake.messages == [('09170000000', 'present'), ('09170000001', 'absent')]
+    modem.close()
+
+
+def test_setup_runs_once_per_port(fake):
+    modem = GsmModem(fake.port, timeout=1)
+    modem.send_sms('09170000000', 'one')
+    modem.send_sms('09170000000', 'two')
+    assert fake.commands.count('AT+CMGF=1') == 1
+    assert fake.commands.count('AT+CSCS="GSM"') == 1
+    assert fake.commands.count('ATE0') == 1
+    assert fake.charset == 'GSM'
+    modem.close()
+
+
+def test_message_error_keeps_port(fake):
+    modem = GsmModem(fake.port, timeout=1)
+    with pytest.raises(ModemError) as error:
+        modem.send_sms('09990000000', 'present')
+    assert not isinstance(error.value, SendUnconfirmed)
+    assert modem.serial is not None and modem.configured
+    assert modem.send_sms('09170000000', 'present') == 1
+    assert fake.commands.count('AT+CMGF=1') == 1
+    modem.close()
+
+
+def test_timeout_reopens_port(fake):
+    fake.send_delay = 0.5
+    modem = GsmModem(fake.port, timeout=1, send_timeout=0.1)
+    # the message went out, only its reply is late
+    with pytest.raises(SendUnconfirmed):
+        modem.send_sms('09170000000', 'slow')
+    assert modem.serial is None and not modem.configured
+    # the late reply lands in the closed port's buffer and is thrown away
+    sleep(0.5)
+    fake.send_delay = 0.01
+    assert modem.send_sms('09170000000', 'again') == 2
+    assert fake.commands.count('AT+CMGF=1') == 2
+    modem.close()
+
+
+def test_serial_error_reopens_port(fake, monkeypatch):
+    modem = GsmModem(fake.port, timeout=1)
+    modem.send_sms('09170000000', 'one')
+
+    def unplugged(data):
+        raise serial.SerialException('device reports readiness to read but returned no data')
+    monkeypatch.setattr(modem.serial, 'write', unplugged)
+    with pytest.raises(serial.SerialException):
+        modem.send_sms('09170000000', 'two')
+    assert modem.serial is None
+    assert modem.send_sms('09170000000', 'three') == 2
+    assert fake.commands.count('AT+CMGF=1') == 2
+    assert fake.commands.count('AT+CSCS="GSM"') == 2
+    modem.close()
@@ -0,0 +1,109 @@
+import json
+import os
+import subprocess
+import sys
+from threading import Thread, Event
+
+import pytest
+
+from drivers.hardware import Hardware, Lazy
+
+
+class Device:
+    def __init__(self):
+        self.port = '/dev/ttyAMA0'
+        self.items = [1, 2, 3]
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+
+def test_nothing_is_built_until_used():
+    built = []
+    hardware = Hardware()
+    device = hardware.add('sensor', lambda: built.append(1) or Device())
+    assert built == []
+    assert not hardware.created('sensor')
+    assert repr(device) == '<Lazy sensor (not created)>'
+    assert hardware.status() == {'sensor': {'created': False, 'seconds': None}}
+
+
+def test_first_use_builds_once():
+    built = []
+    hardware = Hardware()
+    device = hardware.add('sensor', lambda: built.append(1) or Device())
+    assert device.port == '/dev/ttyAMA0'
+    assert list(device) == [1, 2, 3]
+    assert len(device) == 3
+    assert hardware.get('sensor') is hardware.get('sensor')
+    assert built == [1]
+    assert hardware.created('sensor')
+    assert hardware.status()['sensor']['seconds'] is not None
+
+
+def test_concurrent_first_use_builds_once():
+    built = []
+    started = Event()
+
+    def factory():
+        built.append(1)
+        started.wait(1)
+        return Device()
+    device = Lazy('sensor', factory)
+    threads = [Thread(target=lambda: device.port) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    started.set()
+    for thread in threads:
+        thread.join()
+    assert built == [1]
+
+
+def test_failed_build_is_tried_again():
+    attempts = []
+
+    def factory():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise OSError('could not open port /dev/ttyAMA0')
+        return Device()
+    device = Lazy('sensor', factory)
+    with pytest.raises(OSError):
+        device.port
+    assert device.port == '/dev/ttyAMA0'
+    assert len(attempts) == 2
+
+
+# A fresh interpreter imports app.py on the simulator and reports what exists.
+# It then gets every device it can open without the sensor library twice.
+CHILD = r'''
+import json, os, sys
+sys.path.insert(0, os.path.join(os.getcwd(), 'benchmarks'))
+import hardware_shims
+hardware_shims.install()
+import app
+report = {'status': app.hardware.status(), 'stats': app.simulator.stats(), 'same': {}}
+names = ['gpio', 'modem']
+if hasattr(sys.modules['adafruit_fingerprint'], 'Adafruit_Fingerprint'):
+    names.append('readers')
+for name in names:
+    report['same'][name] = app.hardware.get(name) is app.hardware.get(name)
+report['sensors'] = len(app.simulator.sensors)
+report['expected_sensors'] = len(app.readers) if 'readers' in names else 0
+print(json.dumps(report))
+'''
+
+
+def test_app_import_opens_nothing_and_builds_each_device_once(tmp_path):
+    root = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+    env = dict(os.environ, ATTENDANCE_HARDWARE='simulator', ATTENDANCE_DATABASE='sqlite:///' + str(tmp_path / 'app.db'))
+    output = subprocess.run([sys.executable, '-c', CHILD], cwd=root, env=env, capture_output=True, text=True, check=True)
+    report = json.loads(output.stdout.strip().splitlines()[-1])
+    assert not any(device['created'] for device in report['status'].values())
+    assert report['stats'] == {'sensors': {}, 'lcd': None, 'buttons': None, 'sms': None}
+    assert all(report['same'].values())
+    # one fake sensor per reader, opened once
+    assert report['sensors'] == report['expected_sensors']
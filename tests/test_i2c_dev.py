@@ -0,0 +1,132 @@
+import pytest
+
+from drivers.i2c_dev import BufferedLcd, CustomCharacters, En, Rs, LCD_SETDDRAMADDR, LCD_RETURNHOME
+
+
+# Collects the bytes the PCF8574 backpack would latch, however they were sent
+class FakeBus:
+    def __init__(self):
+        self.data = bytearray()
+        self.transactions = 0
+
+    def write_byte(self, addr, value):
+        self.data.append(value)
+        self.transactions += 1
+
+    def write_i2c_block_data(self, addr, cmd, values):
+        self.data.append(cmd)
+        self.data.extend(values)
+        self.transactions += 1
+
+    # (byte, mode) pairs the controller received: a nibble is latched on every
+    # byte with the enable bit set
+    def sent(self):
+        nibbles = [(value & 0xF0, value & Rs) for value in self.data if value & En]
+        self.data = bytearray()
+        return [(high | low >> 4, mode) for (high, mode), (low, _) in zip(nibbles[::2], nibbles[1::2])]
+
+
+def chars(text):
+    return [(ord(char), Rs) for char in text]
+
+
+@pytest.fixture
+def bus():
+    return FakeBus()
+
+
+@pytest.fixture
+def lcd(bus):
+    lcd = BufferedLcd(addr=0x27, bus=bus)
+    bus.sent()
+    return lcd
+
+
+def test_drawing_waits_for_flush(lcd, bus):
+    lcd.lcd_display_string('Hi', 1)
+    assert bus.sent() == []
+    assert lcd.lcd_flush() == 3
+    assert bus.sent() == [(LCD_SETDDRAMADDR | 0x00, 0)] + chars('Hi')
+
+
+def test_unchanged_frame_sends_nothing(lcd, bus):
+    lcd.lcd_display_string('Hi', 1)
+    lcd.lcd_flush()
+    bus.sent()
+    transactions = bus.transactions
+    lcd.lcd_clear()
+    lcd.lcd_display_string('Hi', 1)
+    assert lcd.lcd_flush() == 0
+    assert bus.transactions == transactions
+
+
+def test_only_changed_cells_are_sent(lcd, bus):
+    lcd.lcd_display_string('Present: 3', 2)
+    lcd.lcd_flush()
+    bus.sent()
+    lcd.lcd_display_string('Present: 4', 2)
+    lcd.lcd_flush()
+    assert bus.sent() == [(LCD_SETDDRAMADDR | 0x49, 0)] + chars('4')
+
+
+def test_cursor_move_skipped_when_already_there(lcd, bus):
+    lcd.lcd_display_string('ab', 1)
+    lcd.lcd_flush()
+    bus.sent()
+    lcd.lcd_display_string('abc', 1)
+    lcd.lcd_flush()
+    # the cursor was left after 'b'
+    assert bus.sent() == chars('c')
+
+
+def test_short_gaps_are_rewritten(lcd, bus):
+    lcd.lcd_display_string('abcdefghij', 3)
+    lcd.lcd_flush()
+    bus.sent()
+    lcd.lcd_display_string('aXcXefghiZ', 3)
+    lcd.lcd_flush()
+    # one address for 'XcX', a second one for the far away 'Z'
+    assert bus.sent() == [(LCD_SETDDRAMADDR | 0x15, 0)] + chars('XcX') + [(LCD_SETDDRAMADDR | 0x1D, 0)] + chars('Z')
+
+
+def test_clear_blanks_only_what_was_drawn(lcd, bus):
+    lcd.lcd_display_string('ab', 4)
+    lcd.lcd_flush()
+    bus.sent()
+    lcd.lcd_clear()
+    lcd.lcd_flush()
+    assert bus.sent() == [(LCD_SETDDRAMADDR | 0x54, 0)] + chars('  ')
+
+
+def test_autoflush(bus):
+    lcd = BufferedLcd(addr=0x27, bus=bus, autoflush=True)
+    bus.sent()
+    lcd.lcd_display_string('A', 1)
+    assert bus.sent() == [(LCD_SETDDRAMADDR, 0)] + chars('A')
+
+
+def test_line_is_cut_at_the_row_end(lcd, bus):
+    lcd.lcd_display_string('x' * 30, 3)
+    lcd.lcd_flush()
+    sent = bus.sent()
+    # line 3 starts at column 20 of row 0, only 20 cells are left
+    assert sent[0] == (LCD_SETDDRAMADDR | 0x14, 0)
+    assert len(sent) == 21
+
+
+def test_direct_command_forgets_the_cursor(lcd, bus):
+    lcd.lcd_display_string('ab', 1)
+    lcd.lcd_flush()
+    lcd.lcd_write(LCD_RETURNHOME)
+    bus.sent()
+    lcd.lcd_display_string('abc', 1)
+    lcd.lcd_flush()
+    assert bus.sent() == [(LCD_SETDDRAMADDR | 0x02, 0)] + chars('c')
+
+
+def test_custom_characters_loaded_once(lcd, bus):
+    characters = CustomCharacters(lcd)
+    characters.load_custom_characters_data()
+    assert len(bus.sent()) == 65
+    characters.load_custom_characters_data()
+    assert bus.sent() == []
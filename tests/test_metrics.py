@@ -0,0 +1,84 @@
+import pytest
+
+from metrics import Metrics, label_text, quantile
+
+
+def test_quantile():
+    assert quantile([], 0.5) is None
+    assert quantile([3, 1, 2], 0.5) == 2
+    assert quantile([1, 2, 3, 4], 0.95) == 4
+
+
+def test_label_text_escapes():
+    assert label_text(()) == ''
+    assert label_text((('a', 'x'), ('b', 'say "hi"\n\\'))) == '{a="x",b="say \\"hi\\"\\n\\\\"}'
+
+
+def test_histogram_render():
+    metrics = Metrics(buckets=(0.1, 1))
+    metrics.describe('stage_seconds', 'Time per stage.')
+    metrics.observe('stage_seconds', 0.05, stage='search')
+    metrics.observe('stage_seconds', 0.1, stage='search')
+    metrics.observe('stage_seconds', 5, stage='search')
+    lines = metrics.render().splitlines()
+    assert lines == [
+        '# HELP stage_seconds Time per stage.',
+        '# TYPE stage_seconds histogram',
+        'stage_seconds_bucket{stage="search",le="0.1"} 2',
+        'stage_seconds_bucket{stage="search",le="1.0"} 2',
+        'stage_seconds_bucket{stage="search",le="+Inf"} 3',
+        'stage_seconds_sum{stage="search"} 5.15',
+        'stage_seconds_count{stage="search"} 3',
+    ]
+
+
+def test_counters_and_one_type_line_per_name():
+    metrics = Metrics()
+    metrics.inc('scans_total', result='matched')
+    metrics.inc('scans_total', 2, result='matched')
+    metrics.inc('scans_total', result='failed')
+    text = metrics.render()
+    assert text.count('# TYPE scans_total counter') == 1
+    assert 'scans_total{result="matched"} 3' in text
+    assert 'scans_total{result="failed"} 1' in text
+    assert '# HELP' not in text
+
+
+def test_labels_are_order_independent():
+    metrics = Metrics()
+    metrics.observe('x', 1, a=1, b=2)
+    metrics.observe('x', 1, b=2, a=1)
+    assert metrics.summary() == [('x', {'a': 1, 'b': 2}, 2, 1, 1)]
+
+
+def test_timer_records_on_error():
+    metrics = Metrics()
+    with pytest.raises(ValueError):
+        with metrics.timer('stage_seconds', stage='db'):
+            raise ValueError('locked')
+    assert metrics.summary('stage_seconds')[0][2] == 1
+
+
+def test_recorder():
+    metrics = Metrics()
+    record = metrics.recorder('command_seconds', 'command', reader='door')
+    record('search', 0.2)
+    assert metrics.summary() == [('command_seconds', {'command': 'search', 'reader': 'door'}, 1, 0.2, 0.2)]
+
+
+def test_summary_window_and_filter():
+    metrics = Metrics(window=4)
+    for value in (9, 9, 1, 2, 3, 4):
+        metrics.observe('a', value)
+    metrics.observe('b', 1)
+    rows = metrics.summary('a')
+    assert rows == [('a', {}, 6, 3, 4)]
+
+
+def test_reset():
+    metrics = Metrics()
+    metrics.observe('a', 1)
+    metrics.inc('b')
+    metrics.reset()
+    assert metrics.render() == '\n'
+    assert metrics.summary() == []
@@ -0,0 +1,209 @@
+import os
+import shutil
+from datetime import datetime
+
+import pytest
+from sqlalchemy import text
+
+import migrations
+
+LEGACY = """
+CREATE TABLE teacher (id INTEGER PRIMARY KEY, firstname TEXT, lastname TEXT);
+CREATE TABLE course (id INTEGER PRIMARY KEY, course_name TEXT, course_code TEXT, course_description TEXT,
+                     course_units INTEGER, course_teacher TEXT, date_added DATETIME);
+CREATE TABLE student (id INTEGER PRIMARY KEY, fingerprint_id INTEGER, lastname TEXT, firstname TEXT, middlename TEXT,
+                      student_id TEXT, parent_phone TEXT, course_name TEXT, teacher_name TEXT, date_added DATETIME);
+CREATE TABLE attendacehistory (id INTEGER PRIMARY KEY, student_id TEXT, course TEXT, course_teacher TEXT,
+                               status TEXT, date_timein DATETIME);
+INSERT INTO teacher VALUES (1, 'Ana', 'Reyes'), (2, 'Ben', 'Cruz');
+INSERT INTO course VALUES (1, 'Math', 'M1', '', 3, 'Ana Reyes', '2024-01-01'),
+                          (2, 'Math', 'M2', '', 3, 'Ben Cruz', '2024-01-01'),
+                          (3, 'Art', 'A1', '', 3, 'Nobody Here', '2024-01-01');
+INSERT INTO student VALUES (1, 1, 'Lim', 'Carl', '', '1001', '0917', 'Math', 'Ben Cruz', '2024-01-01'),
+                           (2, 2, 'Tan', 'Dina', '', '1002', '0917', 'Art', 'Nobody Here', '2024-01-01'),
+                           (3, 3, 'Go', 'Eli', '', '1003', '0917', 'History', 'Ana Reyes', '2024-01-01');
+INSERT INTO attendacehistory VALUES (1, '1001', 'Math', 'Ben Cruz', 'Absent', '2024-02-01 08:00:00'),
+                                    (2, '1001', 'Math', 'Ben Cruz', 'Present', '2024-02-01 08:05:00'),
+                                    (3, '1002', 'Art', 'Nobody Here', 'Present', '2024-02-01 09:00:00'),
+                                    (4, '1003', 'History', 'Ana Reyes', 'Present', '2024-02-01 10:00:00'),
+                                    (5, '9999', 'Math', 'Ana Reyes', 'Present', '2024-02-01 08:00:00');
+"""
+
+# the tables as the shipped instance/attendance.db has them: the student number of
+# a history row sits in an INTEGER column
+REAL = """
+CREATE TABLE teacher (id INTEGER NOT NULL, lastname VARCHAR(255) NOT NULL, firstname VARCHAR(255) NOT NULL,
+                      PRIMARY KEY (id));
+CREATE TABLE course (id INTEGER NOT NULL, course_name VARCHAR(255) NOT NULL, course_code VARCHAR(255) NOT NULL,
+                     course_description TEXT, course_units INTEGER, course_teacher VARCHAR(255), date_added DATETIME,
+                     PRIMARY KEY (id));
+CREATE TABLE student (id INTEGER NOT NULL, fingerprint_id INTEGER NOT NULL, lastname VARCHAR(255) NOT NULL,
+                      firstname VARCHAR(255) NOT NULL, middlename VARCHAR(255), student_id VARCHAR(255) NOT NULL,
+                      parent_phone VARCHAR(255) NOT NULL, teacher_name VARCHAR(255) NOT NULL,
+                      course_name VARCHAR(255) NOT NULL, date_added DATETIME, PRIMARY KEY (id), UNIQUE (student_id));
+CREATE TABLE attendacehistory (id INTEGER NOT NULL, student_id INTEGER NOT NULL, student_name VARCHAR(1000) NOT NULL,
+                               course VARCHAR(255) NOT NULL, course_teacher VARCHAR(255) NOT NULL, status VARCHAR(255),
+                               date_timein DATETIME, PRIMARY KEY (id), FOREIGN KEY(student_id) REFERENCES student (id));
+INSERT INTO teacher VALUES (1, 'Reyes', 'Ana');
+INSERT INTO course VALUES (1, 'Math', 'M1', '', 3, 'Ana Reyes', '2024-01-01');
+INSERT INTO student VALUES (1, 1, 'Lim', 'Carl', '', '00123', '0917', 'Ana Reyes', 'Math', '2024-01-01'),
+                           (2, 2, 'Tan', 'Dina', '', 'A-7', '0917', 'Ana Reyes', 'Math', '2024-01-01');
+INSERT INTO attendacehistory VALUES (1, '00123', 'Carl Lim', 'Math', 'Ana Reyes', 'Absent', '2024-02-01 08:00:00'),
+                                    (2, '00123', 'Carl Lim', 'Math', 'Ana Reyes', 'Absent', '2024-02-01 08:00:00'),
+                                    (3, '00123', 'Carl Lim', 'Math', 'Ana Reyes', 'Present', '2024-02-01 08:07:00'),
+                                    (4, '00123', 'Carl Lim', 'Math', 'Ana Reyes', 'Present', '2024-02-01 08:09:00'),
+                                    (5, 'A-7', 'Dina Tan', 'Math', 'Ana Reyes', 'Absent', '2024-02-01 08:00:00'),
+                                    (6, 'A-7', 'Dina Tan', 'Math', 'Ana Reyes', 'Absent', '2024-02-02 08:00:00');
+"""
+
+SHIPPED = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'instance', 'attendance.db')
+
+
+@pytest.fixture
+def schema(database):
+    app, db = database
+
+    class Teacher(db.Model):
+        __tablename__ = 'teacher'
+        id = db.Column(db.Integer, primary_key=True)
+        firstname = db.Column(db.String(255))
+        lastname = db.Column(db.String(255))
+
+    class Course(db.Model):
+        __tablename__ = 'course'
+        id = db.Column(db.Integer, primary_key=True)
+        course_name = db.Column(db.String(255), nullable=False)
+        course_code = db.Column(db.String(255), nullable=False)
+        course_description = db.Column(db.Text)
+        course_units = db.Column(db.Integer)
+        teacher_id = db.Column(db.Integer, db.ForeignKey('teacher.id'))
+        date_added = db.Column(db.DateTime, default=datetime.now)
+
+    class Student(db.Model):
+        __tablename__ = 'student'
+        id = db.Column(db.Integer, primary_key=True)
+        fingerprint_id = db.Column(db.Integer, nullable=False)
+        lastname = db.Column(db.String(255), nullable=False)
+        firstname = db.Column(db.String(255), nullable=False)
+        middlename = db.Column(db.String(255))
+        student_id = db.Column(db.String(255), unique=True, nullable=False)
+        parent_phone = db.Column(db.String(255), nullable=False)
+        course_id = db.Column(db.Integer, db.ForeignKey('course.id'), nullable=False)
+        date_added = db.Column(db.DateTime, default=datetime.now)
+
+    class AttendanceSession(db.Model):
+        __tablename__ = 'attendancesession'
+        __table_args__ = (db.UniqueConstraint('course_id', 'date'),)
+        id = db.Column(db.Integer, primary_key=True)
+        course_id = db.Column(db.Integer, db.ForeignKey('course.id'), nullable=False)
+        date = db.Column(db.Date, nullable=False)
+        opened_at = db.Column(db.DateTime, nullable=False, default=datetime.now)
+
+    class AttendanceHistory(db.Model):
+        __tablename__ = 'attendacehistory'
+        __table_args__ = (db.UniqueConstraint('session_id', 'student_id'),)
+        id = db.Column(db.Integer, primary_key=True)
+        session_id = db.Column(db.Integer, db.ForeignKey('attendancesession.id'), nullable=False)
+        student_id = db.Column(db.Integer, db.ForeignKey('student.id'), nullable=False)
+        status = db.Column(db.String(16), default='Absent')
+        date_timein = db.Column(db.DateTime, default=datetime.now)
+
+    with app.app_context():
+        yield db
+
+
+def legacy(db, script=LEGACY):
+    with db.engine.begin() as conn:
+        for statement in script.split(';'):
+            if statement.strip():
+                conn.execute(text(statement))
+
+
+def query(db, sql):
+    with db.engine.connect() as conn:
+        return conn.execute(text(sql)).fetchall()
+
+
+def test_upgrades_legacy_database(schema):
+    legacy(schema)
+    applied = migrations.upgrade(schema)
+    assert [(version, name) for version, name, counts in applied] == [(1, 'integer_keys')]
+    counts = applied[0][2]
+    assert counts['history rows before'] == 5
+    assert counts['unmapped students'] == 1
+    with schema.engine.connect() as conn:
+        assert migrations.schema_version(conn) == migrations.LATEST
+        assert 'course_teacher' not in migrations.table_columns(conn, 'course')
+    # teachers by name, a name nobody has is no teacher
+    assert query(schema, 'SELECT id, teacher_id FROM course ORDER BY id') == [(1, 1), (2, 2), (3, None)]
+    # the course of the same name taught by the student's teacher
+    assert query(schema, 'SELECT id, course_id FROM student ORDER BY id') == [(1, 2), (2, 3)]
+    assert query(schema, 'SELECT id FROM student_unmapped') == [(3,)]
+
+
+def test_history_collapses_per_session(schema):
+    legacy(schema)
+    migrations.upgrade(schema)
+    rows = query(schema, 'SELECT student_id, status, date_timein FROM attendacehistory ORDER BY student_id')
+    # the two scans of the re-opened session are one row, Present wins
+    assert [(row[0], row[1]) for row in rows] == [(1, 'Present'), (2, 'Present')]
+    assert str(rows[0][2]).startswith('2024-02-01 08:05')
+    assert query(schema, 'SELECT COUNT(*) FROM attendancesession') == [(2,)]
+    assert query(schema, 'SELECT id FROM attendacehistory_unmapped ORDER BY id') == [(4,), (5,)]
+    # the other scan is kept aside, not dropped
+    assert query(schema, 'SELECT id, status, kept_id FROM attendacehistory_duplicates') == [(1, 'Absent', 2)]
+
+
+def test_real_schema_keeps_every_row(schema):
+    legacy(schema, REAL)
+    counts = migrations.upgrade(schema)[0][2]
+    # 00123 was stored as 123 in the INTEGER column, A-7 as text: both find their student
+    rows = query(schema, 'SELECT id, student_id, status FROM attendacehistory ORDER BY id')
+    assert [(row[0], row[1], row[2]) for row in rows] == [(3, 1, 'Present'), (5, 2, 'Absent'), (6, 2, 'Absent')]
+    assert query(schema, 'SELECT id, kept_id FROM attendacehistory_duplicates ORDER BY id') == [(1, 3), (2, 3), (4, 3)]
+    assert counts['duplicate history rows'] == 3
+    assert counts['unmapped history rows'] == 0
+    assert counts['history rows before'] == counts['history rows after'] + counts['duplicate history rows']
+
+
+@pytest.mark.skipif(not os.path.exists(SHIPPED), reason='no shipped database')
+def test_shipped_database_keeps_every_row(schema, tmp_path):
+    shutil.copy(SHIPPED, tmp_path / 'test.db')
+    counts = migrations.upgrade(schema)[0][2]
+    assert counts['history rows before'] == 108
+    assert counts['duplicate history rows'] > 0
+    assert counts['history rows before'] == counts['history rows after'] + counts['duplicate history rows'] + \
+        counts['unmapped history rows']
+
+
+def test_upgrade_twice_does_nothing(schema):
+    legacy(schema)
+    migrations.upgrade(schema)
+    assert migrations.upgrade(schema) == []
+
+
+def test_new_database_is_stamped(schema):
+    schema.create_all()
+    migrations.stamp(schema)
+    assert migrations.upgrade(schema) == []
+    with schema.engine.connect() as conn:
+        assert migrations.schema_version(conn) == migrations.LATEST
+
+
+def test_unstamped_new_schema_is_left_alone(schema):
+    schema.create_all()
+    assert migrations.upgrade(schema) == [(1, 'integer_keys', {})]
+
+
+def test_failed_migration_rolls_back(schema, monkeypatch):
+    legacy(schema)
+
+    def broken(conn, db):
+        conn.execute(text('ALTER TABLE course RENAME TO course_old'))
+        raise RuntimeError('disk full')
+    monkeypatch.setattr(migrations, 'MIGRATIONS', [(1, broken)])
+    with pytest.raises(RuntimeError):
+        migrations.upgrade(schema)
+    with schema.engine.connect() as conn:
+        assert migrations.schema_version(conn) == 0
+        assert 'course_teacher' in migrations.table_columns(conn, 'course')
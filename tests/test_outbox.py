@@ -0,0 +1,174 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from outbox import OutboxWorker
+
+
+@pytest.fixture
+def outbox(database):
+    app, db = database
+
+    class Sms(db.Model):
+        id = db.Column(db.Integer, primary_key=True)
+        phone = db.Column(db.String(255), nullable=False)
+        body = db.Column(db.Text, nullable=False)
+        status = db.Column(db.String(32), default='pending')
+        attempts = db.Column(db.Integer, default=0)
+        next_attempt = db.Column(db.DateTime, default=datetime.now)
+        created = db.Column(db.DateTime, default=datetime.now)
+        sent_at = db.Column(db.DateTime)
+        last_error = db.Column(db.String(255))
+
+    with app.app_context():
+        db.create_all()
+        yield app, db, Sms
+
+
+class Modem:
+    def __init__(self, fail=()):
+        self.fail = set(fail)
+        self.sent = []
+
+    def send(self, phone, body):
+        if phone in self.fail:
+            raise IOError('no carrier')
+        self.sent.append((phone, body))
+
+
+def queue(db, Sms, *phones):
+    for phone in phones:
+        db.session.add(Sms(phone=phone, body='present'))
+    db.session.commit()
+
+
+def test_sends_in_order(outbox):
+    app, db, Sms = outbox
+    modem = Modem()
+    worker = OutboxWorker(app, db, Sms, modem.send, batch=10)
+    queue(db, Sms, '1', '2', '3')
+    assert not worker._deliver_batch()
+    assert [phone for phone, body in modem.sent] == ['1', '2', '3']
+    assert {sms.status for sms in Sms.query} == {'sent'}
+    stats = worker.stats()
+    assert stats['sent'] == 3 and stats['pending'] == 0
+    assert stats['avg_send_seconds'] is not None
+
+
+def test_full_batch_asks_for_more(outbox):
+    app, db, Sms = outbox
+    modem = Modem()
+    worker = OutboxWorker(app, db, Sms, modem.send, batch=2)
+    queue(db, Sms, '1', '2', '3')
+    assert worker._deliver_batch()
+    assert not worker._deliver_batch()
+    assert len(modem.sent) == 3
+
+
+def test_failure_backs_off(outbox):
+    app, db, Sms = outbox
+    worker = OutboxWorker(app, db, Sms, Modem(fail=['1']).send, backoff=15)
+    queue(db, Sms, '1')
+    before = datetime.now()
+    worker._deliver_batch()
+    sms = Sms.query.one()
+    assert sms.status == 'pending'
+    assert sms.attempts == 1
+    assert sms.last_error == 'no carrier'
+    assert sms.next_attempt >= before + timedelta(seconds=15)
+    assert worker.retried == 1
+    # not due yet
+    worker._deliver_batch()
+    assert Sms.query.one().attempts == 1
+
+
+def test_backoff_is_capped(outbox):
+    app, db, Sms = outbox
+    worker = OutboxWorker(app, db, Sms, Modem(fail=['1']).send, backoff=15, max_backoff=60)
+    queue(db, Sms, '1')
+    sms = Sms.query.one()
+    sms.attempts = 6
+    db.session.commit()
+    worker._deliver_batch()
+    assert Sms.query.one().next_attempt <= datetime.now() + timedelta(seconds=61)
+
+
+def test_gives_up_after_max_attempts(outbox):
+    app, db, Sms = outbox
+    modem = Modem(fail=['1'])
+    worker = OutboxWorker(app, db, Sms, modem.send, max_attempts=2)
+    queue(db, Sms, '1', '2')
+    sms = Sms.query.filter_by(phone='1').one()
+    sms.attempts = 1
+    db.session.commit()
+    worker._deliver_batch()
+    assert Sms.query.filter_by(phone='1').one().status == 'failed'
+    # one bad number does not hold up the others
+    assert modem.sent == [('2', 'present')]
+    assert worker.stats()['failed'] == 1
+
+
+def test_notify_delivers_from_the_worker(outbox):
+    app, db, Sms = outbox
+    modem = Modem()
+    worker = OutboxWorker(app, db, Sms, modem.send, interval=60)
+    queue(db, Sms, '1')
+    worker.notify()
+    for _ in range(200):
+        if modem.sent:
+            break
+        worker._thread.join(0.01)
+    assert modem.sent == [('1', 'present')]
+
+
+def test_lost_modem_reply_is_not_sent_again(outbox):
+    app, db, Sms = outbox
+    sent = []
+
+    def send(phone, body):
+        sent.append(phone)
+        raise TimeoutError('no +CMGS reply')
+    worker = OutboxWorker(app, db, Sms, send, backoff=0, unconfirmed=(TimeoutError,))
+    queue(db, Sms, '1')
+    worker._deliver_batch()
+    worker._deliver_batch()
+    assert sent == ['1']
+    sms = Sms.query.one()
+    assert sms.status == 'sending'
+    assert sms.last_error == 'no +CMGS reply'
+    assert worker.stats()['unconfirmed'] == 1
+
+
+def test_lost_commit_after_send_is_not_sent_again(outbox, monkeypatch):
+    app, db, Sms = outbox
+    modem = Modem()
+    worker = OutboxWorker(app, db, Sms, modem.send)
+    queue(db, Sms, '1')
+    commit = db.session.commit
+    commits = []
+
+    def lost():
+        # the commit that records the message as sent
+        commits.append(True)
+        if len(commits) == 2:
+            raise OSError('disk I/O error')
+        commit()
+    monkeypatch.setattr(db.session, 'commit', lost)
+    with pytest.raises(OSError):
+        worker._deliver_batch()
+    db.session.rollback()
+    worker._deliver_batch()
+    assert modem.sent == [('1', 'present')]
+    assert Sms.query.one().status == 'sending'
+
+
+def test_failed_send_is_retried(outbox):
+    app, db, Sms = outbox
+    modem = Modem(fail=['1'])
+    worker = OutboxWorker(app, db, Sms, modem.send, backoff=0)
+    queue(db, Sms, '1')
+    worker._deliver_batch()
+    modem.fail.clear()
+    worker._deliver_batch()
+    assert modem.sent == [('1', 'present')]
+    assert Sms.query.one().status == 'sent'
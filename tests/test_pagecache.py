@@ -0,0 +1,64 @@
+from pagecache import PageCache, page_etag
+
+
+def test_etag_follows_versions():
+    key = ('dashboard', 8, ())
+    etag = page_etag(key, {'course:4': 1, 'students': 3})
+    assert etag == page_etag(key, {'students': 3, 'course:4': 1})
+    assert len(etag) == 20
+    assert etag != page_etag(key, {'course:4': 2, 'students': 3})
+    assert etag != page_etag(('dashboard', 9, ()), {'course:4': 1, 'students': 3})
+
+
+def test_get_and_put():
+    pages = PageCache()
+    assert pages.get('a') is None
+    pages.put('a', b'<html>')
+    assert pages.get('a') == b'<html>'
+    assert pages.stats() == {'entries': 1, 'hits': 1, 'misses': 1, 'not_modified': 0}
+
+
+def test_least_recently_used_goes_first():
+    pages = PageCache(max_entries=2)
+    pages.put('a', b'a')
+    pages.put('b', b'b')
+    pages.get('a')
+    pages.put('c', b'c')
+    assert pages.get('b') is None
+    assert pages.get('a') == b'a'
+    assert pages.get('c') == b'c'
+
+
+def test_put_again_replaces():
+    pages = PageCache(max_entries=2)
+    pages.put('a', b'old')
+    pages.put('b', b'b')
+    pages.put('a', b'new')
+    pages.put('c', b'c')
+    assert pages.get('a') == b'new'
+    assert pages.get('b') is None
+
+
+def test_clear():
+    pages = PageCache()
+    pages.put('a', b'a')
+    pages.clear()
+    assert pages.get('a') is None
+    assert pages.stats()['entries'] == 0
+
+
+def test_compressed_once_per_entry():
+    pages = PageCache()
+    pages.put('a', b'<html>')
+    calls = []
+
+    def compress():
+        calls.append(1)
+        return b'gz'
+    assert pages.compressed('a', compress) == b'gz'
+    assert pages.compressed('a', compress) == b'gz'
+    assert len(calls) == 1
+    # a page no longer cached is compressed but not kept
+    assert pages.compressed('b', compress) == b'gz'
+    assert pages.get('b') is None
+    assert len(calls) == 2
@@ -0,0 +1,71 @@
+import pytest
+
+from readers import Reader, ReaderRegistry
+from scanner import Scanner
+
+
+class Capture:
+    def stats(self):
+        return {'searches': 0}
+
+
+def reader(name, button=None):
+    result = Reader(name, '/dev/%s' % name, Capture(), button=button, link=(115200, 256))
+    result.scanner = Scanner(lambda timeout: False, lambda cancelled: None, lambda course, finger_id: None, poll_interval=0.01)
+    return result
+
+
+@pytest.fixture
+def registry():
+    registry = ReaderRegistry([reader('door'), reader('back', button=16)])
+    yield registry
+    for each in registry:
+        each.scanner.stop()
+
+
+def test_primary_is_first(registry):
+    assert registry.primary.name == 'door'
+    assert registry.get().name == 'door'
+    assert registry.get('back').name == 'back'
+    assert registry.get('window') is None
+    assert [each.name for each in registry] == ['door', 'back']
+    assert len(registry) == 2
+
+
+def test_assign_prefers_the_reader_serving_the_course(registry):
+    registry.get('back').scanner.start('CM1')
+    assert registry.serving('CM1').name == 'back'
+    assert registry.assign('CM1', 'door').name == 'back'
+
+
+def test_assign_first_idle_reader(registry):
+    assert registry.assign('CM1').name == 'door'
+    registry.get('door').scanner.start('CM1')
+    assert registry.assign('CM2').name == 'back'
+    registry.get('back').scanner.start('CM2')
+    assert not registry.idle()
+
+
+def test_assign_leaves_busy_readers_alone(registry):
+    registry.get('door').scanner.start('CM1')
+    registry.get('back').scanner.start('CM2')
+    assert registry.assign('CM3') is None
+    assert registry.get('door').scanner.status()['course'] == 'CM1'
+    assert registry.get('back').scanner.status()['course'] == 'CM2'
+
+
+def test_assign_by_name(registry):
+    assert registry.assign('CM1', 'back').name == 'back'
+    assert registry.assign('CM1', 'window') is None
+    assert registry.serving('CM1') is None
+    assert registry.idle()
+
+
+def test_status(registry):
+    registry.get('back').scanner.start('CM1')
+    status = registry.status()
+    assert set(status) == {'door', 'back'}
+    back = status['back']
+    assert back['reader'] == 'back' and back['port'] == '/dev/back'
+    assert back['course'] == 'CM1'
+    assert back['sensor'] == {'searches': 0, 'baudrate': 115200, 'packet_size': 256}
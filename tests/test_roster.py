@@ -0,0 +1,97 @@
+from threading import Thread
+
+from roster import RosterEntry, RosterIndex, RosterCache
+
+
+def entry(fingerprint_id, history_id=None):
+    return RosterEntry(0, fingerprint_id, 'S%d' % fingerprint_id, 'Student %d' % fingerprint_id,
+                       '09170000000', 'CM1', 'Teacher', history_id=history_id)
+
+
+def test_lookup_by_fingerprint():
+    roster = RosterIndex('CM1', [entry(1), entry(2)])
+    assert roster.lookup(2).student_id == 'S2'
+    assert roster.lookup(9) is None
+    assert roster.total == 2
+
+
+def test_mark_once():
+    roster = RosterIndex('CM1', [entry(1), entry(2)])
+    first = roster.lookup(1)
+    assert roster.mark(first)
+    assert not roster.mark(first)
+    assert roster.is_present(first)
+    assert not roster.is_present(roster.lookup(2))
+    assert roster.count_present() == 1
+    assert not roster.all_present()
+    assert roster.mark(roster.lookup(2))
+    assert roster.all_present()
+
+
+def test_add_present():
+    roster = RosterIndex('CM1', [entry(1)])
+    late = roster.add(entry(2), present=True)
+    assert roster.is_present(late)
+    assert roster.count_present() == 1
+    assert not roster.mark(late)
+
+
+def test_empty_roster_is_all_present():
+    roster = RosterIndex('CM1')
+    assert roster.total == 0
+    assert roster.count_present() == 0
+    assert roster.all_present()
+
+
+def test_missing_rows():
+    roster = RosterIndex('CM1', [entry(1, history_id=10), entry(2)])
+    assert [e.fingerprint_id for e in roster.missing_rows()] == [2]
+
+
+def test_concurrent_marks_win_once():
+    roster = RosterIndex('CM1', [entry(1)])
+    target = roster.lookup(1)
+    wins = []
+    threads = [Thread(target=lambda: wins.append(roster.mark(target))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert wins.count(True) == 1
+
+
+def test_cache_builds_once():
+    cache = RosterCache()
+    built = []
+
+    def build(course):
+        built.append(course)
+        return RosterIndex(course)
+    first = cache.get('CM1', build)
+    assert cache.get('CM1', build) is first
+    assert built == ['CM1']
+    assert cache.get('CM2') is None
+
+
+def test_cache_invalidate():
+    cache = RosterCache()
+    first = cache.get('CM1', RosterIndex)
+    other = cache.get('CM2', RosterIndex)
+    cache.invalidate('CM1')
+    assert cache.get('CM1') is None
+    assert cache.get('CM2') is other
+    assert cache.get('CM1', RosterIndex) is not first
+    cache.clear()
+    assert cache.get('CM2') is None
+
+
+def test_cache_drops_roster_invalidated_during_build():
+    cache = RosterCache()
+
+    def build(course):
+        # the course's students change while the roster is read
+        cache.invalidate(course)
+        return RosterIndex(course)
+    roster = cache.get('CM1', build)
+    assert roster is not None
+    assert cache.get('CM1') is None
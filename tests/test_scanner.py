@@ -0,0 +1,132 @@
+import queue
+from contextlib import contextmanager
+from time import monotonic, sleep
+
+from scanner import Scanner, IDLE, ARMED, MATCHED, FAILED
+
+
+def wait_for(predicate, timeout=2):
+    deadline = monotonic() + timeout
+    while monotonic() < deadline:
+        if predicate():
+            return True
+        sleep(0.01)
+    return False
+
+
+class Rig:
+    def __init__(self, fingers=(), on_match=None, context=None):
+        self.presses = queue.Queue()
+        self.fingers = list(fingers)
+        self.matches = []
+        self.on_match = on_match or self.match
+        self.scanner = Scanner(self.wait_for_trigger, self.capture, self.on_match, context=context, poll_interval=0.02)
+
+    def wait_for_trigger(self, timeout):
+        try:
+            return self.presses.get(timeout=timeout)
+        except queue.Empty:
+            return False
+
+    def capture(self, cancelled):
+        return self.fingers.pop(0) if self.fingers else None
+
+    def match(self, course, finger_id):
+        self.matches.append((course, finger_id))
+        return {'finger_id': finger_id}
+
+    def press(self):
+        self.presses.put(True)
+
+
+def test_start_arms_with_info():
+    rig = Rig()
+    assert rig.scanner.start('CM1', course_id=4, total=30)
+    status = rig.scanner.status()
+    assert status['state'] == ARMED
+    assert status['course'] == 'CM1'
+    assert status['course_id'] == 4 and status['total'] == 30
+    # the same course again is a no-op
+    assert not rig.scanner.start('CM1')
+    rig.scanner.stop()
+
+
+def test_match_is_counted_and_rearmed():
+    rig = Rig(fingers=[7])
+    rig.scanner.start('CM1')
+    rig.press()
+    assert wait_for(lambda: rig.scanner.status()['matched'] == 1)
+    assert wait_for(lambda: rig.scanner.status()['state'] == ARMED)
+    status = rig.scanner.status()
+    assert status['result'] == MATCHED
+    assert status['last'] == {'finger_id': 7}
+    assert rig.matches == [('CM1', 7)]
+    rig.scanner.stop()
+
+
+def test_no_finger_counts_as_failed():
+    rig = Rig(fingers=[None])
+    rig.scanner.start('CM1')
+    rig.press()
+    assert wait_for(lambda: rig.scanner.status()['failed'] == 1)
+    assert rig.scanner.status()['result'] == FAILED
+    assert rig.matches == []
+    rig.scanner.stop()
+
+
+def test_error_in_on_match_keeps_worker_running():
+    calls = []
+
+    def on_match(course, finger_id):
+        calls.append(finger_id)
+        if len(calls) == 1:
+            raise RuntimeError('database is locked')
+        return {'finger_id': finger_id}
+    rig = Rig(fingers=[1, 2], on_match=on_match)
+    rig.scanner.start('CM1')
+    rig.press()
+    assert wait_for(lambda: rig.scanner.status()['failed'] == 1)
+    rig.press()
+    assert wait_for(lambda: rig.scanner.status()['matched'] == 1)
+    assert calls == [1, 2]
+    rig.scanner.stop()
+
+
+def test_on_match_runs_in_context():
+    entered = []
+
+    @contextmanager
+    def context():
+        entered.append('enter')
+        yield
+        entered.append('exit')
+    rig = Rig(fingers=[3], context=context)
+    rig.scanner.start('CM1')
+    rig.press()
+    assert wait_for(lambda: rig.scanner.status()['matched'] == 1)
+    assert entered == ['enter', 'exit']
+    rig.scanner.stop()
+
+
+def test_stop_goes_idle_and_ends_worker():
+    rig = Rig()
+    rig.scanner.start('CM1')
+    thread = rig.scanner._thread
+    assert rig.scanner.stop()
+    assert rig.scanner.status()['state'] == IDLE
+    assert not rig.scanner.stop()
+    thread.join(1)
+    assert not thread.is_alive()
+
+
+def test_rearming_for_another_course_replaces_worker():
+    rig = Rig(fingers=[5])
+    rig.scanner.start('CM1')
+    first = rig.scanner._thread
+    assert rig.scanner.start('CM2')
+    first.join(1)
+    assert not first.is_alive()
+    rig.press()
+    assert wait_for(lambda: rig.scanner.status()['matched'] == 1)
+    assert rig.matches == [('CM2', 5)]
+    rig.scanner.stop()
@@ -0,0 +1,75 @@
+from threading import Thread
+
+from slots import SlotAllocator, span
+
+
+def test_span():
+    assert span(0, 3) == 0b111
+    assert span(2, 4) == 0b1100
+    assert span(4, 4) == 0
+    assert span(5, 2) == 0
+
+
+def test_allocate_lowest_skipping_first():
+    slots = SlotAllocator(4)
+    assert [slots.allocate() for _ in range(4)] == [1, 2, 3, None]
+    assert slots.free_count() == 0
+    slots.release(2)
+    assert slots.allocate() == 2
+
+
+def test_allocate_within_range_and_outside_taken():
+    slots = SlotAllocator(16)
+    assert slots.allocate(8, 12) == 8
+    assert slots.allocate(8, 12, taken=span(9, 11)) == 11
+    assert slots.allocate(8, 12, taken=span(8, 12)) is None
+    assert slots.free_count(8, 12) == 2
+
+
+def test_reset_from_slot_list():
+    slots = SlotAllocator(8, [1, 3, 3, 42, -1])
+    assert slots.used_slots() == [1, 3]
+    slots.reset(2, 0b1111)
+    assert slots.used_slots() == [0, 1]
+    assert slots.allocate() is None
+
+
+def test_reserve_and_is_used():
+    slots = SlotAllocator(8)
+    slots.reserve(5)
+    slots.reserve(99)
+    assert slots.is_used(5)
+    assert not slots.is_used(4)
+    assert slots.used_slots() == [5]
+
+
+def test_find_run():
+    slots = SlotAllocator(16, [3, 7])
+    assert slots.find_run(2) == 1
+    assert slots.find_run(3) == 4
+    assert slots.find_run(4) == 8
+    assert slots.find_run(4, taken=span(8, 10)) == 10
+    assert slots.find_run(9) is None
+    assert slots.find_run(0) is None
+    # a run is only found, not taken
+    assert slots.used_slots() == [3, 7]
+
+
+def test_bytes_round_trip():
+    slots = SlotAllocator(12, [1, 9, 11])
+    data = slots.to_bytes()
+    assert len(data) == 2
+    assert SlotAllocator.from_bytes(12, data).used_slots() == [1, 9, 11]
+    assert SlotAllocator.from_bytes(12, None).used_slots() == []
+    assert SlotAllocator(0).to_bytes() == b'\x00'
+
+
+def test_concurrent_allocations_are_distinct():
+    slots = SlotAllocator(201)
+    got = []
+    threads = [Thread(target=lambda: got.extend(slots.allocate() for _ in range(25))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sorted(got) == list(range(1, 201))
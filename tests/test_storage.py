@@ -0,0 +1,153 @@
+from threading import Event, Thread
+
+import pytest
+from sqlalchemy import text
+
+import storage
+
+
+@pytest.fixture
+def scans(database):
+    app, db = database
+
+    class Scan(db.Model):
+        id = db.Column(db.Integer, primary_key=True)
+        student = db.Column(db.String(32), unique=True, nullable=False)
+
+    with app.app_context():
+        db.create_all()
+        yield app, db, Scan
+
+
+def insert(Scan, student):
+    return lambda session: session.add(Scan(student=student))
+
+
+def students(Scan):
+    return sorted(scan.student for scan in Scan.query)
+
+
+def test_flush_commits_batch_once(scans):
+    app, db, Scan = scans
+    timings = []
+    commits = storage.GroupCommit(app, db, observe=timings.append)
+    results = []
+    for student in ('a', 'b', 'c'):
+        commits._pending.append((insert(Scan, student), results.append))
+    assert commits.flush() == 3
+    assert students(Scan) == ['a', 'b', 'c']
+    assert results == [True, True, True]
+    assert len(timings) == 1
+    stats = commits.stats()
+    assert stats['commits'] == 1 and stats['rows'] == 3 and stats['rows_per_commit'] == 3
+
+
+def test_flush_empty(scans):
+    app, db, Scan = scans
+    commits = storage.GroupCommit(app, db)
+    assert commits.flush() == 0
+    assert commits.stats()['commits'] == 0
+    assert commits.stats()['rows_per_commit'] is None
+
+
+def test_bad_write_fails_alone(scans):
+    app, db, Scan = scans
+    commits = storage.GroupCommit(app, db)
+    results = []
+    commits._pending.append((insert(Scan, 'a'), lambda ok: results.append(('a', ok))))
+    # violates the unique constraint on the first try
+    commits._pending.append((insert(Scan, 'a'), lambda ok: results.append(('again', ok))))
+    commits._pending.append((insert(Scan, 'b'), None))
+    assert commits.flush() == 3
+    assert students(Scan) == ['a', 'b']
+    assert results == [('a', True), ('again', False)]
+    assert commits.stats()['failed'] == 1
+
+
+def test_raising_write_fails_alone(scans):
+    app, db, Scan = scans
+    commits = storage.GroupCommit(app, db)
+    results = []
+
+    def broken(session):
+        raise ValueError('bad row')
+    commits._pending.append((broken, results.append))
+    commits._pending.append((insert(Scan, 'a'), results.append))
+    commits.flush()
+    assert results == [False, True]
+    assert students(Scan) == ['a']
+
+
+def test_add_commits_from_the_worker(scans):
+    app, db, Scan = scans
+    commits = storage.GroupCommit(app, db, interval=0.01)
+    done = Event()
+    commits.add(insert(Scan, 'a'), lambda ok: done.set())
+    assert done.wait(2)
+    assert students(Scan) == ['a']
+
+
+def test_full_buffer_commits_without_waiting(scans):
+    app, db, Scan = scans
+    commits = storage.GroupCommit(app, db, interval=30, max_rows=2)
+    done = Event()
+    commits.add(insert(Scan, 'a'))
+    commits.add(insert(Scan, 'b'), lambda ok: done.set())
+    assert done.wait(2)
+    assert students(Scan) == ['a', 'b']
+
+
+def test_flushes_from_several_threads_add_up(scans):
+    app, db, Scan = scans
+    commits = storage.GroupCommit(app, db)
+
+    def scan(reader):
+        for number in range(25):
+            with commits._lock:
+                commits._pending.append((insert(Scan, '%d-%d' % (reader, number)), None))
+            commits.flush()
+    threads = [Thread(target=scan, args=(reader,)) for reader in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    stats = commits.stats()
+    assert stats['rows'] == 100 == len(students(Scan))
+    assert stats['pending'] == 0 and stats['failed'] == 0
+
+
+def test_configure_sets_pragmas(database):
+    app, db = database
+    with app.app_context():
+        storage.configure(db.engine)
+        with db.engine.connect() as conn:
+            assert conn.execute(text('PRAGMA journal_mode')).scalar() == 'wal'
+            assert conn.execute(text('PRAGMA synchronous')).scalar() == 1
+            assert conn.execute(text('PRAGMA busy_timeout')).scalar() == 5000
+
+
+def test_instrument_times_by_verb(database):
+    app, db = database
+    seen = []
+    with app.app_context():
+        storage.instrument(db.engine, lambda verb, seconds: seen.append(verb))
+        with db.engine.begin() as conn:
+            conn.execute(text('CREATE TABLE t (x INTEGER)'))
+            conn.execute(text('INSERT INTO t VALUES (1)'))
+            conn.execute(text('SELECT x FROM t'))
+    assert seen[-3:] == ['other', 'insert', 'select']
+
+
+def test_incremental_vacuum_enabled_once(database):
+    app, db = database
+    with app.app_context():
+        assert storage.enable_incremental_vacuum(db.engine)
+        assert not storage.enable_incremental_vacuum(db.engine)
+
+
+def test_maintenance_jobs(scans):
+    app, db, Scan = scans
+    maintenance = storage.Maintenance(app, db)
+    assert maintenance.checkpoint() is not None
+    assert maintenance.analyze() is None
+    maintenance.vacuum()
@@ -0,0 +1,92 @@
+import pytest
+from sqlalchemy import select
+
+from tables import Column, datatable, int_arg
+
+
+@pytest.fixture
+def people(database):
+    app, db = database
+
+    class Person(db.Model):
+        id = db.Column(db.Integer, primary_key=True)
+        name = db.Column(db.String(32))
+        city = db.Column(db.String(32))
+        score = db.Column(db.Integer)
+
+    with app.app_context():
+        db.create_all()
+        rows = [('Ana', 'Cebu', 3), ('Ben', 'Davao', 1), ('Carl', 'Cebu', 2), ('Dina', 'Iloilo', None), ('50%_off', 'Cebu', 5)]
+        for name, city, score in rows:
+            db.session.add(Person(name=name, city=city, score=score))
+        db.session.commit()
+        columns = [
+            Column('name', Person.name),
+            Column('city', Person.city),
+            Column('score', Person.score, searchable=False, format=lambda value: '%d pts' % value),
+        ]
+        yield db.session, select(Person), Person.id, columns
+
+
+def run(people, args):
+    session, base, key, columns = people
+    return datatable(session, base, key, columns, args)
+
+
+def test_first_page(people):
+    result = run(people, {'draw': '3', 'start': '0', 'length': '2'})
+    assert result['draw'] == 3
+    assert result['recordsTotal'] == 5 and result['recordsFiltered'] == 5
+    assert [row['name'] for row in result['data']] == ['Ana', 'Ben']
+    assert result['data'][0] == {'id': 1, 'name': 'Ana', 'city': 'Cebu', 'score': '3 pts'}
+
+
+def test_format_skips_null(people):
+    result = run(people, {'start': '3', 'length': '1'})
+    assert result['data'][0]['name'] == 'Dina'
+    assert result['data'][0]['score'] is None
+
+
+def test_global_search(people):
+    result = run(people, {'search[value]': ' cebu '})
+    assert result['recordsTotal'] == 5
+    assert result['recordsFiltered'] == 3
+    assert [row['name'] for row in result['data']] == ['Ana', 'Carl', '50%_off']
+
+
+def test_search_is_escaped(people):
+    assert [row['name'] for row in run(people, {'search[value]': '%_'})['data']] == ['50%_off']
+    assert run(people, {'search[value]': '_a'})['recordsFiltered'] == 0
+
+
+def test_column_search_ignores_unsearchable(people):
+    result = run(people, {'columns[1][search][value]': 'Cebu', 'columns[2][search][value]': '3'})
+    assert result['recordsFiltered'] == 3
+
+
+def test_order_with_key_tiebreak(people):
+    result = run(people, {'order[0][column]': '1', 'order[0][dir]': 'desc'})
+    assert [row['name'] for row in result['data']] == ['Dina', 'Ben', 'Ana', 'Carl', '50%_off']
+
+
+def test_bad_order_is_ignored(people):
+    result = run(people, {'order[0][column]': '9', 'order[1][column]': 'x', 'order[2][column]': '-1'})
+    assert [row['id'] for row in result['data']] == [1, 2, 3, 4, 5]
+
+
+def test_bad_paging_falls_back(people):
+    result = run(people, {'draw': 'x', 'start': '-4', 'length': 'all'})
+    assert result['draw'] == 0
+    assert len(result['data']) == 5
+    # -1 is "all" in DataTables, capped at max_length
+    session, base, key, columns = people
+    assert len(datatable(session, base, key, columns, {'length': '-1'}, max_length=2)['data']) == 2
+    assert len(datatable(session, base, key, columns, {'length': '500'}, max_length=4)['data']) == 4
+
+
+def test_int_arg():
+    assert int_arg({'n': '7'}, 'n', 1) == 7
+    assert int_arg({}, 'n', 1) == 1
+    assert int_arg({'n': None}, 'n', 1) == 1
+    assert int_arg({'n': '-3'}, 'n', 1) == 0
+    assert int_arg({'n': '90'}, 'n', 1, high=50) == 50